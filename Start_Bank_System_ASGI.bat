@@ -0,0 +1,18 @@
+@echo off
+echo ======================================================
+echo      STARTING BANK RISK MANAGEMENT SYSTEM (ASGI)
+echo ======================================================
+echo.
+echo Initializing System...
+call venv\Scripts\activate
+
+echo.
+echo System is running with async dashboard, reports and exports!
+echo Access the dashboard at: http://localhost:8080
+echo.
+echo (Keep this window open while using the software)
+echo.
+
+uvicorn bank_risk_system.asgi:application --host 0.0.0.0 --port 8080
+
+pause
\ No newline at end of file
@@ -12,5 +12,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bank_risk_system.settings')
+os.environ.setdefault('RISKS_ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
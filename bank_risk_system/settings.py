@@ -47,12 +47,16 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    # gzip/brotli for dynamic responses (static files are served precompressed above)
+    'risks.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # ?_profile for superusers; last, so every other middleware has run its process_view
+    'risks.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'bank_risk_system.urls'
@@ -74,6 +78,23 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'bank_risk_system.wsgi.application'
 
+# ASGI profile: asgi.py turns this on so the dashboard, board explanation,
+# official report and CSV export are served by the async views.
+RISKS_ASYNC_VIEWS = os.environ.get("RISKS_ASYNC_VIEWS", "False") == "True"
+
+# Cleared registers are archived here as compressed columnar .rcol files
+RISKS_ARCHIVE_DIR = BASE_DIR / 'archives'
+
+# responses smaller than this go out uncompressed (streams are always compressed)
+RISKS_COMPRESS_MIN_BYTES = 1024
+RISKS_COMPRESS_GZIP_LEVEL = 6
+RISKS_COMPRESS_BROTLI_QUALITY = 5
+# random padding per compressed response against BREACH (0 turns it off)
+RISKS_COMPRESS_MAX_RANDOM_BYTES = 100
+
+# ?_profile traces kept for /profiles/ (older ones are deleted as new ones arrive)
+RISKS_PROFILE_KEEP = 50
+
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
@@ -82,6 +103,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # WAL lets the dashboard keep reading while a purge or ingest writes
+        'OPTIONS': {
+            'init_command': 'PRAGMA journal_mode=WAL;',
+        },
     }
 }
 
@@ -127,6 +152,30 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 LOGIN_REDIRECT_URL = '/'
 # When a user logs out, send them back to the login page
 LOGOUT_REDIRECT_URL = '/accounts/login/'
+
+# A local-memory cache is private to each worker process. Pointing this at a
+# shared backend (Redis, memcached) also caches sessions and users, below, and
+# the admin's register counts (risks/counts.py).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bank-risk-system',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# With a shared cache, sessions are read from the cache and written through to
+# the database, and users and their permissions are cached until they change
+# (risks/auth.py). A local-memory cache is per process, so a logout or a revoked
+# permission would not reach the other workers: sessions and users then come
+# from the database on every request.
+if CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+    AUTHENTICATION_BACKENDS = ['django.contrib.auth.backends.ModelBackend']
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    AUTHENTICATION_BACKENDS = ['risks.auth.CachedModelBackend']
+
 # SECURITY SETTINGS
 # Log out user after 15 minutes of inactivity
 SESSION_COOKIE_AGE = 900 
@@ -1,13 +1,18 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from risks import views  # <--- IF THIS IS MISSING, IT WILL FAIL
+from risks import async_views
+
+# Async official report under the ASGI profile (see RISKS_ASYNC_VIEWS)
+read_views = async_views if settings.RISKS_ASYNC_VIEWS else views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('accounts/', include('django.contrib.auth.urls')),
     
     # --- THIS IS THE LINE YOUR COMPUTER IS MISSING ---
-    path('official-report/', views.official_report, name='official_report'),
+    path('official-report/', read_views.official_report, name='official_report'),
     # -------------------------------------------------
 
     path('', include('risks.urls')),
@@ -1,6 +1,12 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.db.models import Q
 from django.utils.html import format_html
-from .models import RiskAssessment, AISettings
+from . import bulk
+from .counts import CachedCountPaginator, cached_value_counts
+from .models import Department, KRIObservation, RiskAssessment, AISettings
+from .search import filter_matching
 
 
 # ========= AI SETTINGS ADMIN =========
@@ -9,7 +15,119 @@ class AISettingsAdmin(admin.ModelAdmin):
     list_display = ("enable_ai", "updated_at")
 
 
+# ========= DEPARTMENT ADMIN =========
+@admin.register(Department)
+class DepartmentAdmin(admin.ModelAdmin):
+    list_display = ("name", "default_owner", "default_coordinator", "updated_at")
+    search_fields = ("name", "aliases")
+
+    def save_model(self, request, obj, form, change):
+        old_name = form.initial.get("name") if change else None
+        super().save_model(request, obj, form, change)
+        if old_name and old_name != obj.name:
+            # keep matching the old spelling and move the register to the new one
+            if old_name not in obj.alias_list():
+                obj.aliases = "\n".join([*obj.alias_list(), old_name])
+                obj.save(update_fields=["aliases", "updated_at"])
+            bulk.set_field(obj.risks.all(), "area_name", obj.name, request.user)
+            obj.kri_observations.update(area_name=obj.name)
+
+
+# ========= KRI OBSERVATION ADMIN =========
+@admin.register(KRIObservation)
+class KRIObservationAdmin(admin.ModelAdmin):
+    list_display = ("area_name", "kri", "reporting_period", "period_start", "occurrence", "is_percentage", "recorded_at")
+    list_filter = ("department",)
+    search_fields = ("area_name", "kri")
+    date_hierarchy = "period_start"
+
+
+# ========= CACHED LIST FILTERS =========
+class CachedValuesListFilter(admin.SimpleListFilter):
+    """
+    Sidebar filter whose choices (with row counts) come from one cached
+    GROUP BY instead of a SELECT DISTINCT on every changelist load.
+    """
+    field_name = None
+
+    def lookups(self, request, model_admin):
+        return [(value, f"{value} ({rows:,})") for value, rows in cached_value_counts(self.field_name)]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.field_name: self.value()})
+        return queryset
+
+
+class AreaListFilter(CachedValuesListFilter):
+    title = "area name"
+    parameter_name = field_name = "area_name"
+
+
+class InherentRatingListFilter(CachedValuesListFilter):
+    title = "inherent rating"
+    parameter_name = field_name = "inherent_rating"
+
+
+class ResidualRatingListFilter(CachedValuesListFilter):
+    title = "residual rating"
+    parameter_name = field_name = "residual_rating"
+
+
+class RiskOwnerListFilter(CachedValuesListFilter):
+    title = "risk owner"
+    parameter_name = field_name = "risk_owner"
+
+
+# ========= BULK ACTIONS =========
+class RiskBulkActionForm(helpers.ActionForm):
+    value = forms.CharField(
+        required=False,
+        label="New value",
+        widget=forms.TextInput(attrs={"placeholder": "owner / coordinator / controls / area"}),
+    )
+
+
+def _set_field_action(field_name, label):
+    def action(modeladmin, request, queryset):
+        value = request.POST.get("value", "").strip()
+        if not value and field_name != "controls":
+            modeladmin.message_user(request, f"Enter the new {label} in 'New value' first.", messages.WARNING)
+            return
+        updated = bulk.set_field(queryset, field_name, value, request.user)
+        modeladmin.message_user(request, f"Set {label} on {updated} risk(s).", messages.SUCCESS)
+
+    action.__name__ = f"set_{field_name}"
+    return admin.action(description=f"Set {label} of selected risks")(action)
+
+
+@admin.action(description="Approve selected draft risks")
+def approve_selected(modeladmin, request, queryset):
+    updated = bulk.approve_risks(queryset, request.user)
+    modeladmin.message_user(request, f"Approved {updated} draft risk(s).", messages.SUCCESS)
+
+
+@admin.action(description="Re-rate selected risks from their probability/impact")
+def rerate_selected(modeladmin, request, queryset):
+    updated = bulk.rerate_risks(queryset, request.user)
+    modeladmin.message_user(request, f"Re-rated {updated} risk(s).", messages.SUCCESS)
+
+
 # ========= RISK ASSESSMENT ADMIN =========
+RATING_COLORS = {
+    'Critical': '#d32f2f',
+    'Severe': '#f57c00',
+    'Moderate': '#fbc02d',
+    'Sustainable': '#388e3c',
+}
+BADGE_HTML = (
+    '<div style="background-color:{}; color:white; padding:5px 10px; border-radius:4px; '
+    'font-weight:bold; text-align:center; width:100px;">{}</div>'
+)
+# ratings are a closed set, so the badges are rendered once at import
+RATING_BADGES = {rating: format_html(BADGE_HTML, color, rating) for rating, color in RATING_COLORS.items()}
+
+
 @admin.register(RiskAssessment)
 class RiskAssessmentAdmin(admin.ModelAdmin):
     list_display = (
@@ -25,10 +143,26 @@ class RiskAssessmentAdmin(admin.ModelAdmin):
 
     )
 
-    list_filter = ('area_name', 'inherent_rating', 'residual_rating', 'risk_owner')
+    list_filter = (AreaListFilter, InherentRatingListFilter, ResidualRatingListFilter, RiskOwnerListFilter)
     search_fields = ('reference_id', 'description', 'area_name', 'risk_owner')
     readonly_fields = ('inherent_rating', 'residual_rating', 'created_at', 'updated_at', 'updated_by')
 
+    # high-volume mode: join updated_by, cached totals, no live facets
+    list_select_related = ('updated_by',)
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+
+    action_form = RiskBulkActionForm
+    actions = (
+        _set_field_action("risk_owner", "risk owner"),
+        _set_field_action("risk_coordinator_name", "risk coordinator"),
+        _set_field_action("controls", "controls"),
+        _set_field_action("area_name", "area"),
+        approve_selected,
+        rerate_selected,
+    )
+
     fieldsets = (
         ('Risk Identification', {
     'fields': (
@@ -64,20 +198,27 @@ class RiskAssessmentAdmin(admin.ModelAdmin):
         obj.updated_by = request.user
         super().save_model(request, obj, form, change)
 
+    def get_search_results(self, request, queryset, search_term):
+        # narratives go through the full-text index; short identifier
+        # columns are matched by prefix so they can use their indexes
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+
+        matches = filter_matching(RiskAssessment.objects.all(), term).values("pk")
+        return queryset.filter(
+            Q(pk__in=matches)
+            | Q(reference_id__istartswith=term)
+            | Q(area_name__istartswith=term)
+            | Q(risk_owner__istartswith=term)
+        ), False
+
     # ====== COLORED BADGES ======
     def color_badge(self, rating):
-        colors = {
-            'Critical': '#d32f2f',
-            'Severe': '#f57c00',
-            'Moderate': '#fbc02d',
-            'Sustainable': '#388e3c',
-        }
-        color = colors.get(rating, '#777')
-        return format_html(
-            '<div style="background-color:{}; color:white; padding:5px 10px; border-radius:4px; '
-            'font-weight:bold; text-align:center; width:100px;">{}</div>',
-            color, rating
-        )
+        badge = RATING_BADGES.get(rating)
+        if badge is None:
+            badge = format_html(BADGE_HTML, '#777', rating)
+        return badge
 
     def inherent_rating_colored(self, obj):
         return self.color_badge(obj.inherent_rating)
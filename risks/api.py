@@ -0,0 +1,326 @@
+"""
+JSON API.
+
+The read endpoints take the same area / filter (all, draft, approved) / q
+parameters as the HTML views and answer from values() projections or
+GROUP BY aggregates, without the template layer. /api/risks/bulk/ is the
+batch write endpoint for external systems.
+"""
+import base64
+import json
+from functools import wraps
+
+from django.contrib.auth import authenticate
+from django.db.models import BooleanField, Case, Count, IntegerField, Value, When
+from django.http import JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .bulk import upsert_risk_records
+from .conditional import register_conditional
+from .heatmap import heatmap_matrices
+from .models import IMPACTS, PROBABILITIES, RiskAssessment
+from .snapshots import RATING_SCALE, RATINGS
+from .themes import rank_themes
+from .views import filter_register
+
+
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+
+RISK_FIELDS = [
+    "id",
+    "reference_id",
+    "area_name",
+    "reporting_period",
+    "description",
+    "caused_by",
+    "consequences",
+    "risk_owner",
+    "risk_coordinator_name",
+    "controls",
+    "control_owner",
+    "inherent_probability",
+    "inherent_impact",
+    "inherent_rating",
+    "residual_probability",
+    "residual_impact",
+    "residual_rating",
+    "created_at",
+    "updated_at",
+]
+
+
+def api_login_required(view):
+    """login_required for JSON clients: 401 instead of a redirect to the login page."""
+    @wraps(view)
+    def inner(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Authentication required."}, status=401)
+        return view(request, *args, **kwargs)
+    return inner
+
+
+def _filtered(request, default_filter="all"):
+    return filter_register(
+        RiskAssessment.objects.all(),
+        request.GET.get("area", "").strip(),
+        request.GET.get("filter", default_filter).strip(),
+        request.GET.get("q", "").strip(),
+    )
+
+
+def _is_draft():
+    return Case(
+        When(description__startswith="[DRAFT]", then=Value(True)),
+        default=Value(False),
+        output_field=BooleanField(),
+    )
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return int(base64.urlsafe_b64decode(padded.encode()).decode())
+
+
+# ========= API_RISKS_START =========
+@api_login_required
+@register_conditional()
+def api_risks(request):
+    """Risks in id order, one page per request; pass `cursor` from the previous page."""
+    try:
+        limit = min(max(int(request.GET.get("limit", API_PAGE_SIZE)), 1), API_MAX_PAGE_SIZE)
+        after = decode_cursor(request.GET["cursor"]) if request.GET.get("cursor") else 0
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "Invalid limit or cursor."}, status=400)
+
+    rows = list(
+        _filtered(request)
+        .filter(pk__gt=after)
+        .order_by("pk")
+        .annotate(is_draft=_is_draft())
+        .values(*RISK_FIELDS, "is_draft")[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    for row in rows:
+        row["status"] = "draft" if row.pop("is_draft") else "approved"
+
+    return JsonResponse({
+        "results": rows,
+        "next_cursor": encode_cursor(rows[-1]["id"]) if has_more else None,
+    })
+# ========= API_RISKS_END =========
+
+
+# ========= API_AGGREGATES_START =========
+def matrix_counts(queryset, risk_type):
+    """Same shape as views.get_matrix_counts, counted by the database."""
+    matrix = {p: {i: 0 for i in IMPACTS} for p in PROBABILITIES}
+    prob, impact = f"{risk_type}_probability", f"{risk_type}_impact"
+    for row in queryset.values(prob, impact).annotate(n=Count("pk")).order_by():
+        if row[prob] in matrix and row[impact] in matrix[row[prob]]:
+            matrix[row[prob]][row[impact]] = row["n"]
+    return matrix
+
+
+def rating_metrics(queryset):
+    """Rating counts and inherent->residual movement from one GROUP BY."""
+    inherent = {r: 0 for r in RATINGS}
+    residual = {r: 0 for r in RATINGS}
+    movement = {"improved": 0, "unchanged": 0, "worsened": 0}
+    total = 0
+
+    for row in queryset.values("inherent_rating", "residual_rating").annotate(n=Count("pk")).order_by():
+        n = row["n"]
+        total += n
+        if row["inherent_rating"] in inherent:
+            inherent[row["inherent_rating"]] += n
+        if row["residual_rating"] in residual:
+            residual[row["residual_rating"]] += n
+        before = RATING_SCALE.get(row["inherent_rating"], 0)
+        after = RATING_SCALE.get(row["residual_rating"], 0)
+        if after < before:
+            movement["improved"] += n
+        elif after == before:
+            movement["unchanged"] += n
+        else:
+            movement["worsened"] += n
+
+    return {"total": total, "inherent_counts": inherent, "residual_counts": residual, **movement}
+
+
+def _severity(field):
+    return Case(
+        *[When(**{field: rating}, then=Value(pos)) for pos, rating in enumerate(RATINGS)],
+        default=Value(9),
+        output_field=IntegerField(),
+    )
+
+
+@api_login_required
+@register_conditional()
+def api_matrices(request):
+    if request.GET.get("q", "").strip():
+        risks = _filtered(request)
+        matrices = {
+            "inherent_matrix": matrix_counts(risks, "inherent"),
+            "residual_matrix": matrix_counts(risks, "residual"),
+        }
+    else:
+        counts = heatmap_matrices(request.GET.get("area", "").strip(), request.GET.get("filter", "all").strip())
+        matrices = {"inherent_matrix": counts["inherent_matrix"], "residual_matrix": counts["residual_matrix"]}
+    return JsonResponse({"probabilities": PROBABILITIES, "impacts": IMPACTS, **matrices})
+
+
+@api_login_required
+@register_conditional()
+def api_ratings(request):
+    metrics = rating_metrics(_filtered(request))
+    return JsonResponse({
+        "total": metrics["total"],
+        "inherent_counts": metrics["inherent_counts"],
+        "residual_counts": metrics["residual_counts"],
+    })
+
+
+@api_login_required
+@register_conditional()
+def api_board(request):
+    """Board explanation metrics (defaults to approved risks, like the board page)."""
+    risks = _filtered(request, default_filter="approved")
+    metrics = rating_metrics(risks)
+
+    sample = (
+        risks.annotate(_residual=_severity("residual_rating"), _inherent=_severity("inherent_rating"))
+        .order_by("_residual", "_inherent", "reference_id")
+        .values("reference_id", "area_name", "description", "inherent_rating", "residual_rating")[:5]
+    )
+
+    return JsonResponse({
+        "area": request.GET.get("area", "").strip(),
+        **metrics,
+        "top_themes": [{"theme": theme, "risks": count} for theme, count in rank_themes(risks)],
+        "sample_risks": list(sample),
+    })
+# ========= API_AGGREGATES_END =========
+
+
+# ========= API_BULK_UPSERT_START =========
+BULK_MAX_BYTES = 32 * 1024 * 1024
+BULK_MAX_RECORDS = 20000
+
+
+def _basic_auth_user(request):
+    """
+    (sent, user) for an `Authorization: Basic` header; user is None when the
+    header is missing or the credentials are wrong.
+    """
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    if not header.lower().startswith("basic "):
+        return False, None
+    try:
+        username, _sep, password = base64.b64decode(header[6:].strip()).decode("utf-8").partition(":")
+    except (ValueError, UnicodeDecodeError):
+        return True, None
+    return True, authenticate(request, username=username, password=password)
+
+
+class BulkTooLarge(ValueError):
+    """The body is over BULK_MAX_BYTES or holds more than BULK_MAX_RECORDS records."""
+
+
+def _read_records(request):
+    """
+    Records from an NDJSON body (one object per line) or a JSON array.
+    Reads at most BULK_MAX_BYTES whatever the Content-Length says (a chunked
+    body has none) and stops at the first record over BULK_MAX_RECORDS.
+    """
+    too_long = BulkTooLarge(f"Request body over {BULK_MAX_BYTES} bytes.")
+    too_many = BulkTooLarge(f"At most {BULK_MAX_RECORDS} records per request.")
+    content_type = request.content_type or ""
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        records = []
+        remaining = BULK_MAX_BYTES
+        number = 0
+        # read the stream line by line instead of request.body, which is
+        # capped by DATA_UPLOAD_MAX_MEMORY_SIZE
+        while line := request.readline(remaining + 1):
+            remaining -= len(line)
+            if remaining < 0:
+                raise too_long
+            number += 1
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                raise ValueError(f"Line {number} is not valid JSON.")
+            if len(records) > BULK_MAX_RECORDS:
+                raise too_many
+        return records
+
+    body = request.read(BULK_MAX_BYTES + 1)
+    if len(body) > BULK_MAX_BYTES:
+        raise too_long
+    payload = json.loads(body)
+    if isinstance(payload, dict):
+        payload = payload.get("risks")
+    if not isinstance(payload, list):
+        raise ValueError('Expected a JSON array of risks (or {"risks": [...]}).')
+    if len(payload) > BULK_MAX_RECORDS:
+        raise too_many
+    return payload
+
+
+@csrf_exempt
+@require_POST
+def api_risks_bulk(request):
+    """
+    Create or update risks keyed by reference_id. Authenticate with HTTP
+    Basic, or with the session plus the CSRF token like any form post.
+    """
+    sent_basic, user = _basic_auth_user(request)
+    if sent_basic and user is None:
+        response = JsonResponse({"error": "Invalid credentials."}, status=401)
+        response["WWW-Authenticate"] = 'Basic realm="risk-register"'
+        return response
+    if user is None:
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Authentication required."}, status=401)
+        # session clients are still held to the CSRF check
+        rejected = CsrfViewMiddleware(lambda req: None).process_view(request, None, (), {})
+        if rejected is not None:
+            return JsonResponse({"error": "CSRF verification failed."}, status=403)
+        user = request.user
+
+    if not (user.has_perm("risks.add_riskassessment") and user.has_perm("risks.change_riskassessment")):
+        return JsonResponse({"error": "Permission denied."}, status=403)
+
+    try:
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        length = 0
+    if length > BULK_MAX_BYTES:
+        return JsonResponse({"error": f"Request body over {BULK_MAX_BYTES} bytes."}, status=413)
+
+    try:
+        records = _read_records(request)
+    except BulkTooLarge as exc:
+        return JsonResponse({"error": str(exc)}, status=413)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    results = upsert_risk_records(records, user=user)
+
+    summary = {"created": 0, "updated": 0, "unchanged": 0, "error": 0}
+    for result in results:
+        summary[result["status"]] += 1
+    return JsonResponse({"summary": summary, "results": results}, status=200)
+# ========= API_BULK_UPSERT_END =========
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class RisksConfig(AppConfig):
     name = 'risks'
+
+    def ready(self):
+        from . import auth, signals  # noqa: F401
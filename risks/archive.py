@@ -0,0 +1,247 @@
+"""
+Compressed columnar archive of cleared registers.
+
+File layout (*.rcol):
+
+    b"RCOL1\n"                magic
+    uint32 little-endian      length of the JSON header
+    JSON header               period, closed_at, row count and one entry per
+                              column with its offset/length in the data area
+    data area                 one block per column, 8-byte aligned
+
+Low-cardinality columns (areas, owners, ratings, ...) are dictionary
+encoded: the header holds the distinct values and the block is a raw
+little-endian array of codes, left uncompressed so a reader can memory-map
+the file and count straight from it. Free-text columns are zlib-compressed
+newline-separated JSON strings and are only decompressed when asked for.
+"""
+import json
+import mmap
+import re
+import struct
+import sys
+import zlib
+from array import array
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import BooleanField, Case, Value, When
+
+from .models import RiskAssessment
+
+
+MAGIC = b"RCOL1\n"
+
+DICT_COLUMNS = [
+    "status",
+    "area_name",
+    "reporting_period",
+    "risk_owner",
+    "risk_coordinator_name",
+    "control_owner",
+    "inherent_probability",
+    "inherent_impact",
+    "inherent_rating",
+    "residual_probability",
+    "residual_impact",
+    "residual_rating",
+]
+TEXT_COLUMNS = [
+    "reference_id",
+    "description",
+    "caused_by",
+    "consequences",
+    "controls",
+]
+
+
+def archive_dir():
+    return Path(getattr(settings, "RISKS_ARCHIVE_DIR", settings.BASE_DIR / "archives"))
+
+
+def _code_typecode(size):
+    if size <= 0xFF:
+        return "B"
+    if size <= 0xFFFF:
+        return "H"
+    return "I"
+
+
+# ========= ARCHIVE_WRITER_START =========
+def write_register_archive(period, closed_at, queryset=None):
+    """
+    Stream the register (or `queryset`) into a new .rcol file and return its
+    path, or None when there is nothing to archive.
+    """
+    if queryset is None:
+        queryset = RiskAssessment.objects.all()
+
+    rows = (
+        queryset.order_by("pk")
+        .annotate(is_draft=Case(
+            When(description__startswith="[DRAFT]", then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ))
+        .values("is_draft", *[c for c in DICT_COLUMNS if c != "status"], *TEXT_COLUMNS)
+    )
+
+    dictionaries = {c: {} for c in DICT_COLUMNS}
+    codes = {c: array("I") for c in DICT_COLUMNS}
+    compressors = {c: zlib.compressobj(6) for c in TEXT_COLUMNS}
+    compressed = {c: [] for c in TEXT_COLUMNS}
+
+    count = 0
+    for row in rows.iterator(chunk_size=2000):
+        row["status"] = "draft" if row.pop("is_draft") else "approved"
+        for column in DICT_COLUMNS:
+            value = row[column] or ""
+            lookup = dictionaries[column]
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(lookup)
+            codes[column].append(code)
+        for column in TEXT_COLUMNS:
+            chunk = compressors[column].compress((json.dumps(row[column] or "") + "\n").encode("utf-8"))
+            if chunk:
+                compressed[column].append(chunk)
+        count += 1
+
+    if not count:
+        return None
+
+    blocks = []
+    header_columns = []
+    for column in DICT_COLUMNS:
+        typecode = _code_typecode(len(dictionaries[column]))
+        packed = array(typecode, codes[column])
+        if sys.byteorder == "big":
+            packed.byteswap()
+        blocks.append(packed.tobytes())
+        header_columns.append({
+            "name": column,
+            "kind": "dict",
+            "typecode": typecode,
+            "dictionary": list(dictionaries[column]),
+        })
+    for column in TEXT_COLUMNS:
+        compressed[column].append(compressors[column].flush())
+        blocks.append(b"".join(compressed[column]))
+        header_columns.append({"name": column, "kind": "text", "codec": "zlib"})
+
+    offset = 0
+    for meta, block in zip(header_columns, blocks):
+        meta["offset"] = offset
+        meta["length"] = len(block)
+        offset += len(block) + (-len(block) % 8)
+
+    header = json.dumps({
+        "period": period,
+        "closed_at": closed_at.isoformat(),
+        "rows": count,
+        "columns": header_columns,
+    }).encode("utf-8")
+    # keep the data area 8-byte aligned so code arrays can be cast in place
+    header += b" " * (-(len(MAGIC) + 4 + len(header)) % 8)
+
+    directory = archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", period).strip("-") or "register"
+    path = directory / f"register_{closed_at:%Y%m%d-%H%M%S}_{slug}.rcol"
+
+    with open(path, "wb") as fh:
+        fh.write(MAGIC)
+        fh.write(struct.pack("<I", len(header)))
+        fh.write(header)
+        for block in blocks:
+            fh.write(block)
+            fh.write(b"\0" * (-len(block) % 8))
+    return path
+# ========= ARCHIVE_WRITER_END =========
+
+
+# ========= ARCHIVE_READER_START =========
+class RegisterArchive:
+    """Memory-mapped reader for one .rcol file."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a register archive")
+
+        (header_len,) = struct.unpack_from("<I", self._map, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(bytes(self._map[start:start + header_len]))
+        self._data_start = start + header_len
+        self.columns = {c["name"]: c for c in self.header["columns"]}
+
+    @property
+    def period(self):
+        return self.header["period"]
+
+    @property
+    def rows(self):
+        return self.header["rows"]
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _block(self, meta):
+        start = self._data_start + meta["offset"]
+        return memoryview(self._map)[start:start + meta["length"]]
+
+    def codes(self, column):
+        """Raw dictionary codes for `column`, read in place from the mapping."""
+        meta = self.columns[column]
+        view = self._block(meta)
+        if sys.byteorder == "big" and meta["typecode"] != "B":
+            swapped = array(meta["typecode"], view.tobytes())
+            swapped.byteswap()
+            return swapped
+        return view.cast(meta["typecode"])
+
+    def dictionary(self, column):
+        return self.columns[column]["dictionary"]
+
+    def text(self, column):
+        """Decompress and return one free-text column as a list."""
+        raw = zlib.decompress(self._block(self.columns[column]))
+        return [json.loads(line) for line in raw.decode("utf-8").splitlines()]
+
+    def counts(self, by=("area_name", "residual_rating"), period=None):
+        """
+        Count rows grouped by dictionary columns, e.g. area x rating. With
+        `period`, only rows whose reporting_period matches are counted,
+        unless the whole archive was closed under that period label.
+        """
+        code_columns = [self.codes(c) for c in by]
+        keys = zip(*code_columns)
+
+        if period is not None and period != self.period:
+            wanted = self.dictionary("reporting_period")
+            if period not in wanted:
+                return Counter()
+            target = wanted.index(period)
+            keys = (k for k, p in zip(keys, self.codes("reporting_period")) if p == target)
+
+        dictionaries = [self.dictionary(c) for c in by]
+        return Counter({
+            tuple(d[code] for d, code in zip(dictionaries, key)): n
+            for key, n in Counter(keys).items()
+        })
+
+
+def list_archives():
+    return sorted(archive_dir().glob("*.rcol"))
+# ========= ARCHIVE_READER_END =========
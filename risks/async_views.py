@@ -0,0 +1,282 @@
+"""
+Async variants of the read-heavy pages, used when the app is served through
+bank_risk_system.asgi (RISKS_ASYNC_VIEWS=True). They return the same
+templates and context as the sync views in views.py, but query through the
+async ORM so a slow report or export does not pin a worker thread.
+
+dashboard_events is ASGI-only: it holds a Server-Sent Events stream open
+and pushes heatmap changes to the dashboard.
+"""
+import asyncio
+import csv
+import hashlib
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.shortcuts import render
+from django.utils import timezone
+
+from . import live
+from .api import matrix_counts, rating_metrics
+from .models import RiskAssessment, ReportConfiguration, ReportSnapshot
+from .conditional import register_conditional, register_fingerprint, register_state
+from .heatmap import heatmap_matrices
+from .reports import astream_report, report_queryset, report_shell, report_version, snapshot_rows
+from .snapshots import period_trends
+from .themes import rank_themes
+from .views import (
+    CSV_FIELDS,
+    CSV_HEADER,
+    IMPACTS,
+    PROBABILITIES,
+    XLSX_RATING_COLUMNS,
+    XLSX_WIDTHS,
+    _build_board_narrative,
+    available_areas_queryset,
+    filter_register,
+    get_matrix_counts,
+    xlsx_response,
+)
+from .xlsx import XlsxStream, aregister_sheets
+
+
+class _Echo:
+    """File-like object whose write() hands the formatted CSV line straight back."""
+
+    def write(self, value):
+        return value
+
+
+# --- DASHBOARD ---
+@login_required
+@register_conditional(csrf=True)
+async def dashboard(request):
+    user = await request.auser()
+
+    selected_area = request.GET.get("area", "").strip()
+    filter_type = request.GET.get("filter", "all").strip()
+    query = request.GET.get("q", "").strip()
+
+    available_areas = [a async for a in available_areas_queryset()]
+    risks = filter_register(
+        RiskAssessment.objects.all().order_by('reference_id'), selected_area, filter_type, query
+    )
+    risk_list = [r async for r in risks]
+
+    if query:
+        # search matches are not materialised per heatmap cell
+        counts = {
+            'total_risks': len(risk_list),
+            'critical_risks': sum(1 for r in risk_list if r.residual_rating == 'Critical'),
+            'inherent_matrix': get_matrix_counts(risk_list, 'inherent'),
+            'residual_matrix': get_matrix_counts(risk_list, 'residual'),
+        }
+    else:
+        counts = await sync_to_async(heatmap_matrices)(selected_area, filter_type)
+
+    context = {
+        'risks': risk_list,
+        **counts,
+        'user': user,
+        'probabilities': PROBABILITIES,
+        'impacts': IMPACTS,
+        'available_areas': available_areas,
+        'selected_area': selected_area,
+        'filter_type': filter_type,
+        'query': query,
+        'period_trends': await sync_to_async(period_trends)(selected_area, filter_type),
+        'live_updates': True,
+    }
+    return render(request, 'risks/dashboard.html', context)
+
+
+# --- EXPORT CSV ---
+async def _csv_lines(queryset):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    # values() rather than values_list(): its iterable is lazy, so every chunk
+    # is fetched through the async ORM instead of on the event loop
+    async for row in queryset.values(*CSV_FIELDS).aiterator(chunk_size=2000):
+        yield writer.writerow([row[f] for f in CSV_FIELDS])
+
+
+@login_required
+@register_conditional()
+async def export_risks_csv(request):
+    response = StreamingHttpResponse(
+        _csv_lines(RiskAssessment.objects.all().order_by('-created_at')),
+        content_type='text/csv',
+    )
+    response['Content-Disposition'] = 'attachment; filename="risk_register.csv"'
+    return response
+
+
+# --- EXPORT XLSX ---
+async def _xlsx_rows(queryset):
+    async for row in queryset.values(*CSV_FIELDS).aiterator(chunk_size=2000):
+        yield tuple(row[f] for f in CSV_FIELDS)
+
+
+@login_required
+@register_conditional()
+async def export_risks_xlsx(request):
+    stream = XlsxStream(CSV_HEADER, rating_columns=XLSX_RATING_COLUMNS, widths=XLSX_WIDTHS)
+    return xlsx_response(
+        aregister_sheets(_xlsx_rows(report_queryset()), stream, area_column=CSV_FIELDS.index('area_name'))
+    )
+
+
+# --- OFFICIAL REPORT ---
+@login_required
+@register_conditional(csrf=True)
+async def official_report(request):
+    user = await request.auser()
+    if not user.is_superuser and not await user.ahas_perm('risks.view_reportconfiguration'):
+        return HttpResponseForbidden("<h1>Access Denied</h1><p>You do not have permission to view this official document.</p>")
+
+    config, created = await ReportConfiguration.objects.aget_or_create(id=1)
+
+    if request.method == "POST" and user.is_superuser:
+        new_summary = request.POST.get('executive_summary')
+        if new_summary:
+            config.executive_summary = new_summary
+            await config.asave()
+
+    version = await sync_to_async(report_version)(config)
+    snapshot = await ReportSnapshot.objects.filter(version=version).afirst()
+    context = {
+        'config': config,
+        'generated_at': snapshot.created_at if snapshot else timezone.now(),
+        'generated_by': user.username,
+        'is_admin': user.is_superuser
+    }
+    head, tail = report_shell(request, context)
+    if snapshot:
+        response = HttpResponse(head + snapshot_rows(snapshot) + tail)
+    else:
+        response = StreamingHttpResponse(astream_report(head, tail, version, config.executive_summary))
+    return response
+
+
+# --- BOARD EXPLANATION ---
+@login_required
+@register_conditional()
+async def board_explanation(request):
+    selected_area = request.GET.get("area", "").strip()
+    filter_type = request.GET.get("filter", "approved").strip()
+
+    available_areas = [a async for a in available_areas_queryset()]
+    risks = filter_register(
+        RiskAssessment.objects.all().order_by("area_name", "reference_id"), selected_area, filter_type
+    )
+    risk_list = [r async for r in risks]
+    themes = await sync_to_async(rank_themes)(risks)
+    narrative = _build_board_narrative(selected_area, risk_list, themes=themes)
+
+    context = {
+        "selected_area": selected_area,
+        "filter_type": filter_type,
+        "available_areas": available_areas,
+        "risks": risk_list,
+        "period_trends": await sync_to_async(period_trends)(selected_area, filter_type),
+        **narrative,
+    }
+    return render(request, "risks/board_explanation.html", context)
+
+
+# --- LIVE DASHBOARD EVENTS ---
+LIVE_POLL_SECONDS = 15
+LIVE_DEBOUNCE_SECONDS = 0.5
+LIVE_STREAM_SECONDS = 300
+LIVE_RETRY_MS = 3000
+
+
+def _live_values(fingerprint, selected_area, filter_type, query):
+    """
+    Heatmap cells ("inherent:High:Low") and counters for one dashboard view,
+    counted once per register version and shared by every stream on that view.
+    """
+    view = hashlib.md5(f"{selected_area}|{filter_type}|{query}".encode("utf-8")).hexdigest()
+    key = f"risks:live:{fingerprint}:{view}"
+    values = cache.get(key)
+    if values is None:
+        if query:
+            risks = filter_register(RiskAssessment.objects.all(), selected_area, filter_type, query)
+            metrics = rating_metrics(risks)
+            counts = {
+                "inherent_matrix": matrix_counts(risks, "inherent"),
+                "residual_matrix": matrix_counts(risks, "residual"),
+                "total_risks": metrics["total"],
+                "critical_risks": metrics["residual_counts"]["Critical"],
+            }
+        else:
+            counts = heatmap_matrices(selected_area, filter_type)
+        values = {"total": counts["total_risks"], "critical": counts["critical_risks"]}
+        for risk_type in ("inherent", "residual"):
+            for prob, row in counts[f"{risk_type}_matrix"].items():
+                for impact, count in row.items():
+                    values[f"{risk_type}:{prob}:{impact}"] = count
+        cache.set(key, values, 60)
+    return values
+
+
+def _sse(event, data, event_id):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+async def _register_events(selected_area, filter_type, query):
+    """
+    First event: every cell and counter. Then, whenever the register changes,
+    only the ones whose value moved. Ends after LIVE_STREAM_SECONDS; the
+    browser reconnects on its own.
+    """
+    waiter = live.hub.subscribe()
+    changed = waiter[1]
+    deadline = time.monotonic() + LIVE_STREAM_SECONDS
+    fingerprint, sent = None, {}
+    try:
+        yield f"retry: {LIVE_RETRY_MS}\n\n"
+        while True:
+            changed.clear()
+            current = register_fingerprint(await sync_to_async(register_state)())
+            if current != fingerprint:
+                fingerprint = current
+                values = await sync_to_async(_live_values)(fingerprint, selected_area, filter_type, query)
+                delta = {key: value for key, value in values.items() if sent.get(key) != value}
+                sent = values
+                if delta:
+                    yield _sse("register", delta, fingerprint[:16])
+            else:
+                yield ": keep-alive\n\n"
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), min(LIVE_POLL_SECONDS, remaining))
+                # let a burst of row-by-row saves settle into one message
+                await asyncio.sleep(LIVE_DEBOUNCE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        live.hub.unsubscribe(waiter)
+
+
+@login_required
+async def dashboard_events(request):
+    """Server-Sent Events for the dashboard heatmaps; same area/filter/q as the page."""
+    response = StreamingHttpResponse(
+        _register_events(
+            request.GET.get("area", "").strip(),
+            request.GET.get("filter", "all").strip(),
+            request.GET.get("q", "").strip(),
+        ),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,106 @@
+"""
+Per-request auth overhead.
+
+Sessions live in the cache with write-through to django_session
+(SESSION_ENGINE = cached_db). CachedModelBackend keeps the logged-in user
+and their permission sets in the cache as well, so a warm page view
+reads neither auth_user nor the permission tables. Everything is keyed
+under an auth version that signals.py bumps whenever a user, group or
+permission assignment changes.
+
+Both need a cache that every worker process shares. With a local-memory
+cache a logout or a revoked permission only reaches the worker that
+handled it, and the others keep serving the old copy for minutes, so
+settings.py turns them on only for a shared cache and check_auth_cache
+warns when they are configured against a per-process one.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core import checks
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+AUTH_CACHE_TIMEOUT = 300
+AUTH_VERSION_KEY = "risks:auth-version"
+CACHED_SESSION_ENGINES = {
+    "django.contrib.sessions.backends.cache",
+    "django.contrib.sessions.backends.cached_db",
+}
+
+
+def auth_version():
+    version = cache.get(AUTH_VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(AUTH_VERSION_KEY, version, None)
+    return version
+
+
+def invalidate_auth_cache():
+    try:
+        cache.incr(AUTH_VERSION_KEY)
+    except ValueError:
+        cache.set(AUTH_VERSION_KEY, 1, None)
+
+
+def _key(kind, user_id):
+    return f"risks:auth:{auth_version()}:{kind}:{user_id}"
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose get_user() and permission sets are served from the cache."""
+
+    def get_user(self, user_id):
+        key = _key("user", user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user, AUTH_CACHE_TIMEOUT)
+        return user
+
+    def _get_permissions(self, user_obj, obj, from_name):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        perm_cache_name = f"_{from_name}_perm_cache"
+        if not hasattr(user_obj, perm_cache_name):
+            key = _key(f"{from_name}-perms", user_obj.pk)
+            perms = cache.get(key)
+            if perms is None:
+                perms = super()._get_permissions(user_obj, obj, from_name)
+                cache.set(key, perms, AUTH_CACHE_TIMEOUT)
+            setattr(user_obj, perm_cache_name, perms)
+        return getattr(user_obj, perm_cache_name)
+
+    # the async views (request.auser(), user.ahas_perm()) go through the same caches
+    async def aget_user(self, user_id):
+        return await sync_to_async(self.get_user)(user_id)
+
+    async def _aget_permissions(self, user_obj, obj, from_name):
+        return await sync_to_async(self._get_permissions)(user_obj, obj, from_name)
+
+
+@checks.register(checks.Tags.caches)
+def check_auth_cache(app_configs, **kwargs):
+    """Cached sessions and users are only consistent across workers with a shared cache."""
+    if not isinstance(caches["default"], LocMemCache):
+        return []
+    cached = []
+    if "risks.auth.CachedModelBackend" in settings.AUTHENTICATION_BACKENDS:
+        cached.append("CachedModelBackend")
+    if settings.SESSION_ENGINE in CACHED_SESSION_ENGINES:
+        cached.append(settings.SESSION_ENGINE)
+    if not cached:
+        return []
+    return [checks.Warning(
+        f"{' and '.join(cached)} use the local-memory cache, which each worker process keeps on its own.",
+        hint=(
+            "With more than one worker, logouts and permission changes reach the other workers only "
+            "when their copies expire. Configure a shared cache (Redis, memcached) or use "
+            "ModelBackend with database sessions."
+        ),
+        id="risks.W001",
+    )]
@@ -0,0 +1,287 @@
+"""
+Set-based edits across many risks.
+
+Each operation runs as set-based SQL inside a transaction (one UPDATE, or
+bulk_create/bulk_update per batch for the record upsert), stamps
+updated_by and updated_at, and sends risks_bulk_changed because these
+paths skip save() and the model signals.
+"""
+from django.db import connection, models, transaction
+from django.db.models import Case, Value, When
+from django.db.models.functions import Substr
+from django.utils import timezone
+
+from .heatmap import record_heatmap_writes, track_heatmap
+from .ingest import DRAFT_PREFIX
+from .models import HEATMAP_FIELDS, Department, RiskAssessment, PROBABILITIES, IMPACTS
+from .signals import risks_bulk_changed
+from .themes import THEME_TEXT_FIELDS, retag_risks
+
+
+# fields staff may overwrite in bulk from the admin
+BULK_TEXT_FIELDS = ["risk_owner", "risk_coordinator_name", "controls", "area_name"]
+
+
+def rating_expression(prefix):
+    """
+    SQL equivalent of RiskAssessment.calculate_rating for the `prefix`
+    ("inherent"/"residual") probability and impact columns. Built from the
+    Python rule so the two cannot drift apart.
+    """
+    whens = []
+    for prob in PROBABILITIES:
+        for impact in IMPACTS:
+            rating = RiskAssessment.calculate_rating(prob, impact)
+            if rating != "Sustainable":
+                whens.append(When(
+                    **{f"{prefix}_probability": prob, f"{prefix}_impact": impact},
+                    then=Value(rating),
+                ))
+    return Case(*whens, default=Value("Sustainable"), output_field=models.CharField())
+
+
+def _bulk_update(queryset, user, **values):
+    with transaction.atomic():
+        ids = list(queryset.values_list("pk", flat=True))
+        if not ids:
+            return 0
+        if HEATMAP_FIELDS.intersection(values):
+            with track_heatmap(ids):
+                updated = queryset.update(updated_by=user, updated_at=timezone.now(), **values)
+        else:
+            updated = queryset.update(updated_by=user, updated_at=timezone.now(), **values)
+        if set(THEME_TEXT_FIELDS).intersection(values):
+            retag_risks(RiskAssessment.objects.filter(pk__in=ids))
+        risks_bulk_changed.send(sender=RiskAssessment, ids=ids)
+    return updated
+
+
+def set_field(queryset, field_name, value, user=None):
+    if field_name not in BULK_TEXT_FIELDS:
+        raise ValueError(f"{field_name} cannot be set in bulk")
+    if field_name == "area_name":
+        department = Department.objects.lookup(value)
+        return _bulk_update(
+            queryset,
+            user,
+            area_name=department["name"] if department else value,
+            department_id=department["id"] if department else None,
+        )
+    return _bulk_update(queryset, user, **{field_name: value})
+
+
+def approve_risks(queryset, user=None):
+    """Strip the draft prefix from every draft in `queryset`."""
+    return _bulk_update(
+        queryset.filter(description__startswith=DRAFT_PREFIX),
+        user,
+        description=Substr("description", len(DRAFT_PREFIX) + 1),
+    )
+
+
+def rerate_risks(queryset, user=None):
+    """Recompute both ratings from the stored probability/impact pairs."""
+    return _bulk_update(
+        queryset,
+        user,
+        inherent_rating=rating_expression("inherent"),
+        residual_rating=rating_expression("residual"),
+    )
+
+
+# ========= RECORD_UPSERT_START =========
+UPSERT_BATCH_SIZE = 1000
+
+# fields an external system may send, keyed by reference_id
+RECORD_FIELDS = [
+    "area_name",
+    "reporting_period",
+    "description",
+    "caused_by",
+    "consequences",
+    "risk_owner",
+    "risk_coordinator_name",
+    "controls",
+    "control_owner",
+    "inherent_probability",
+    "inherent_impact",
+    "residual_probability",
+    "residual_impact",
+]
+CHOICE_FIELDS = {
+    "inherent_probability": {c for c, _label in RiskAssessment.PROBABILITY_CHOICES},
+    "residual_probability": {c for c, _label in RiskAssessment.PROBABILITY_CHOICES},
+    "inherent_impact": {c for c, _label in RiskAssessment.IMPACT_CHOICES},
+    "residual_impact": {c for c, _label in RiskAssessment.IMPACT_CHOICES},
+}
+REQUIRED_ON_CREATE = ["description", "risk_owner", *CHOICE_FIELDS]
+
+
+def _max_lengths():
+    return {
+        name: RiskAssessment._meta.get_field(name).max_length
+        for name in ["reference_id", *RECORD_FIELDS]
+        if RiskAssessment._meta.get_field(name).max_length
+    }
+
+
+def clean_record(record, max_lengths):
+    """Return (reference_id, values, errors) for one incoming record."""
+    if not isinstance(record, dict):
+        return None, {}, {"record": "Expected a JSON object."}
+
+    errors = {}
+    reference_id = str(record.get("reference_id") or "").strip()
+    if not reference_id:
+        errors["reference_id"] = "This field is required."
+    elif len(reference_id) > max_lengths["reference_id"]:
+        errors["reference_id"] = f"At most {max_lengths['reference_id']} characters."
+
+    unknown = set(record) - set(RECORD_FIELDS) - {"reference_id"}
+    if unknown:
+        errors["record"] = f"Unknown field(s): {', '.join(sorted(unknown))}."
+
+    values = {}
+    for field in RECORD_FIELDS:
+        if field not in record:
+            continue
+        value = record[field]
+        if value is None:
+            value = ""
+        if not isinstance(value, str):
+            errors[field] = "Expected a string."
+            continue
+        value = value.strip()
+        if field in CHOICE_FIELDS and value not in CHOICE_FIELDS[field]:
+            errors[field] = f"Must be one of: {', '.join(sorted(CHOICE_FIELDS[field]))}."
+        elif field in max_lengths and len(value) > max_lengths[field]:
+            errors[field] = f"At most {max_lengths[field]} characters."
+        values[field] = value
+    return reference_id, values, errors
+
+
+def _write_updates(risks, field_names):
+    """
+    One parameterised UPDATE per row through executemany. bulk_update()
+    compiles a CASE WHEN per row and field, which dominates the request at
+    a few thousand rows.
+    """
+    fields = [RiskAssessment._meta.get_field(name) for name in field_names]
+    qn = connection.ops.quote_name
+    sql = "UPDATE %s SET %s WHERE %s = %%s" % (
+        qn(RiskAssessment._meta.db_table),
+        ", ".join("%s = %%s" % qn(field.column) for field in fields),
+        qn(RiskAssessment._meta.pk.column),
+    )
+    params = [
+        [field.get_db_prep_save(getattr(risk, field.attname), connection) for field in fields] + [risk.pk]
+        for risk in risks
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def _upsert_batch(batch, user, now, results, departments):
+    """
+    batch: [(index, reference_id, values)] with unique reference ids;
+    departments: {canonical area name: department id}.
+    """
+    with transaction.atomic():
+        existing = RiskAssessment.objects.in_bulk(
+            [ref for _index, ref, _values in batch], field_name="reference_id"
+        )
+
+        to_create, to_update, update_fields = [], [], set()
+        for index, reference_id, values in batch:
+            risk = existing.get(reference_id)
+            if risk is None:
+                missing = [f for f in REQUIRED_ON_CREATE if not values.get(f)]
+                if missing:
+                    results[index] = {
+                        "reference_id": reference_id,
+                        "status": "error",
+                        "errors": {f: "Required for a new risk." for f in missing},
+                    }
+                    continue
+                risk = RiskAssessment(reference_id=reference_id, updated_by=user, **values)
+                risk.department_id = departments.get(risk.area_name)
+                risk.apply_ratings()
+                risk.apply_keyword_tags()
+                to_create.append(risk)
+                results[index] = {"reference_id": reference_id, "status": "created"}
+                continue
+
+            changed = [f for f, v in values.items() if getattr(risk, f) != v]
+            if not changed:
+                results[index] = {"reference_id": reference_id, "status": "unchanged"}
+                continue
+            for field in changed:
+                setattr(risk, field, values[field])
+            if "area_name" in changed:
+                risk.department_id = departments.get(risk.area_name)
+                changed.append("department")
+            risk.apply_ratings()
+            risk.apply_keyword_tags()
+            risk.updated_by = user
+            risk.updated_at = now
+            update_fields.update(changed)
+            to_update.append(risk)
+            results[index] = {"reference_id": reference_id, "status": "updated"}
+
+        RiskAssessment.objects.bulk_create(to_create, batch_size=500)
+        if to_update:
+            _write_updates(to_update, sorted(update_fields) + ["inherent_rating", "residual_rating", "keyword_tags", "updated_by", "updated_at"])
+        record_heatmap_writes(created=to_create, updated=to_update)
+
+        if any(risk.pk is None for risk in to_create):
+            # backends that cannot return ids from a bulk insert
+            created_ids = list(RiskAssessment.objects.filter(
+                reference_id__in=[risk.reference_id for risk in to_create]
+            ).values_list("pk", flat=True))
+        else:
+            created_ids = [risk.pk for risk in to_create]
+        changed_ids = created_ids + [risk.pk for risk in to_update]
+        if changed_ids:
+            risks_bulk_changed.send(sender=RiskAssessment, ids=changed_ids)
+
+
+def upsert_risk_records(records, user=None, batch_size=UPSERT_BATCH_SIZE):
+    """
+    Create or update risks keyed by reference_id. Valid records are written
+    `batch_size` at a time, one transaction per batch; invalid ones are
+    reported and skipped. Returns one result dict per input record, in order.
+    """
+    max_lengths = _max_lengths()
+    results = [None] * len(records)
+    now = timezone.now()
+
+    seen = set()
+    batch = []
+    departments, canonical = {}, {}
+    for index, record in enumerate(records):
+        reference_id, values, errors = clean_record(record, max_lengths)
+        if not errors and reference_id in seen:
+            errors = {"reference_id": "Duplicate reference_id in this request."}
+        if errors:
+            results[index] = {"reference_id": reference_id, "status": "error", "errors": errors}
+            continue
+        if "area_name" in values:
+            area = values["area_name"]
+            if area not in canonical:
+                department = Department.objects.lookup(area)
+                canonical[area] = department["name"] if department else area
+                if department:
+                    departments[department["name"]] = department["id"]
+            values["area_name"] = canonical[area]
+        seen.add(reference_id)
+        batch.append((index, reference_id, values))
+        if len(batch) >= batch_size:
+            _upsert_batch(batch, user, now, results, departments)
+            batch = []
+    if batch:
+        _upsert_batch(batch, user, now, results, departments)
+
+    for index, result in enumerate(results):
+        result["index"] = index
+    return results
+# ========= RECORD_UPSERT_END =========
@@ -0,0 +1,245 @@
+"""
+On-the-fly response compression.
+
+CompressionMiddleware compresses dynamic responses (pages, CSV and JSON)
+with Brotli when the `brotli` package is installed and the client accepts
+it, otherwise with gzip. Static files never reach it: WhiteNoise answers
+them first, with its own precompressed copies.
+
+Streaming responses (the official report, the exports) are compressed as
+one continuous stream rather than chunk by chunk. Output is flushed to the
+client every STREAM_FLUSH_BYTES of input, so the page still arrives
+progressively while the small per-row chunks share one compression window.
+Server-sent events are never compressed because every event must reach
+the browser as soon as it is written.
+
+Pages carry the CSRF token next to reflected input (the search box), so
+every compressed body is padded with up to RISKS_COMPRESS_MAX_RANDOM_BYTES
+random bytes against BREACH, as Django's GZipMiddleware does: in the gzip
+header's file name field, or as a Brotli metadata block, which decoders
+skip.
+"""
+import re
+import secrets
+import struct
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = {
+    "text/html",
+    "text/csv",
+    "text/plain",
+    "text/css",
+    "text/javascript",
+    "application/javascript",
+    "application/json",
+    "application/x-ndjson",
+    "application/xml",
+    "image/svg+xml",
+}
+STREAM_FLUSH_BYTES = 64 * 1024
+
+_ENCODING_RE = re.compile(r"^\s*([^\s;]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?")
+
+
+def min_bytes():
+    return getattr(settings, "RISKS_COMPRESS_MIN_BYTES", 1024)
+
+
+def gzip_level():
+    return getattr(settings, "RISKS_COMPRESS_GZIP_LEVEL", 6)
+
+
+def brotli_quality():
+    return getattr(settings, "RISKS_COMPRESS_BROTLI_QUALITY", 5)
+
+
+def max_random_bytes():
+    return getattr(settings, "RISKS_COMPRESS_MAX_RANDOM_BYTES", 100)
+
+
+def _padding_length():
+    limit = max_random_bytes()
+    return secrets.randbelow(limit) if limit else 0
+
+
+def accepted_encodings(header):
+    """Codings in an Accept-Encoding header with a non-zero q-value, "*" included."""
+    accepted = set()
+    for part in (header or "").split(","):
+        match = _ENCODING_RE.match(part)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2)) if match.group(2) is not None else 1.0
+        except ValueError:
+            continue
+        if quality > 0:
+            accepted.add(match.group(1).lower())
+    return accepted
+
+
+def choose_encoding(header):
+    """"br", "gzip" or None for an Accept-Encoding header."""
+    accepted = accepted_encodings(header)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+# ---- compressors: compress(data) -> bytes, flush() -> bytes, finish() -> bytes ----
+class _Gzip:
+    """Raw deflate in a hand-written gzip wrapper, so the header can carry the padding."""
+
+    def __init__(self):
+        self._z = zlib.compressobj(gzip_level(), zlib.DEFLATED, -zlib.MAX_WBITS)
+        self._crc = 0
+        self._size = 0
+        padding = _padding_length()
+        # magic, deflate, FNAME flag when padded, mtime 0, no extra flags, OS unknown
+        self._head = b"\x1f\x8b\x08" + (b"\x08" if padding else b"\x00") + b"\x00\x00\x00\x00\x00\xff"
+        if padding:
+            self._head += b"a" * padding + b"\x00"
+
+    def _out(self, data):
+        head, self._head = self._head, b""
+        return head + data
+
+    def compress(self, data):
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        return self._out(self._z.compress(data))
+
+    def flush(self):
+        return self._out(self._z.flush(zlib.Z_SYNC_FLUSH))
+
+    def finish(self):
+        return self._out(self._z.flush(zlib.Z_FINISH) + struct.pack("<II", self._crc, self._size & 0xFFFFFFFF))
+
+
+def brotli_metadata_block(length):
+    """
+    An empty-content Brotli meta-block carrying `length` (at most 256) bytes
+    of metadata (RFC 7932, 9.2); it must start on a byte boundary.
+    """
+    if not length:
+        # ISLAST=0, MNIBBLES=0 (coded 3), reserved=0, MSKIPBYTES=0
+        return b"\x06"
+    header = (3 << 1) | (1 << 4) | ((length - 1) << 6)
+    return header.to_bytes(2, "little") + b"\x00" * length
+
+
+class _Brotli:
+    def __init__(self):
+        self._b = brotli.Compressor(quality=brotli_quality())
+        # flushing the empty stream leaves it byte-aligned for the padding block
+        padding = min(_padding_length(), 256)
+        self._head = self._b.flush() + brotli_metadata_block(padding) if padding else b""
+
+    def _out(self, data):
+        head, self._head = self._head, b""
+        return head + data
+
+    def compress(self, data):
+        return self._out(self._b.process(data))
+
+    def flush(self):
+        return self._out(self._b.flush())
+
+    def finish(self):
+        return self._out(self._b.finish())
+
+
+COMPRESSORS = {"gzip": _Gzip, "br": _Brotli}
+
+
+def compress_bytes(data, encoding):
+    compressor = COMPRESSORS[encoding]()
+    return compressor.compress(data) + compressor.finish()
+
+
+def compress_stream(chunks, encoding):
+    compressor = COMPRESSORS[encoding]()
+    pending = 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        out = compressor.compress(chunk)
+        pending += len(chunk)
+        if pending >= STREAM_FLUSH_BYTES:
+            out += compressor.flush()
+            pending = 0
+        if out:
+            yield out
+    yield compressor.finish()
+
+
+async def acompress_stream(chunks, encoding):
+    compressor = COMPRESSORS[encoding]()
+    pending = 0
+    async for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        out = compressor.compress(chunk)
+        pending += len(chunk)
+        if pending >= STREAM_FLUSH_BYTES:
+            out += compressor.flush()
+            pending = 0
+        if out:
+            yield out
+    yield compressor.finish()
+
+
+def is_compressible(response):
+    if response.has_header("Content-Encoding"):
+        return False
+    if "no-transform" in response.get("Cache-Control", ""):
+        return False
+    content_type = response.get("Content-Type", "").split(";", 1)[0].strip().lower()
+    return content_type in COMPRESSIBLE_TYPES
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Brotli/gzip for dynamic responses; goes directly below WhiteNoise."""
+
+    def process_response(self, request, response):
+        if not is_compressible(response):
+            return response
+        if not response.streaming and len(response.content) < min_bytes():
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING"))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(response.streaming_content, encoding)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response.headers["Content-Length"]
+        else:
+            compressed = compress_bytes(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        # the compressed body is a different representation: the ETag becomes weak
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,113 @@
+"""
+Conditional GET for the read views.
+
+Every read page and export is a function of the register, the report
+configuration and the closed cycles (for the trend panels). A cheap
+fingerprint of those answers If-None-Match with 304 before the view runs.
+
+Last-Modified is sent as well, but deleting a row moves no timestamp, so
+the 304 decision is made on the ETag alone. A page carrying a flash message
+(django.contrib.messages) is always rendered and never cached.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.messages import get_messages
+from django.db.models import Count, Max
+from django.middleware.csrf import get_token
+from django.utils.cache import add_never_cache_headers, get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .models import RegisterCycle, ReportConfiguration, RiskAssessment
+
+
+def register_state():
+    """Row count, newest id and change times of everything the read views render."""
+    state = RiskAssessment.objects.aggregate(
+        rows=Count("pk"), last_id=Max("pk"), last_change=Max("updated_at")
+    )
+    state["config_change"] = (
+        ReportConfiguration.objects.filter(pk=1).values_list("updated_at", flat=True).first()
+    )
+    state["last_cycle"] = RegisterCycle.objects.aggregate(closed=Max("closed_at"))["closed"]
+    return state
+
+
+def register_fingerprint(state):
+    raw = "|".join(str(state[key]) for key in sorted(state))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def register_last_modified(state):
+    stamps = [state[key] for key in ("last_change", "config_change", "last_cycle") if state[key]]
+    return max(stamps) if stamps else None
+
+
+def page_etag(request, user, state, csrf=False):
+    """
+    ETag for one rendering of a page: the register fingerprint plus what the
+    page varies on (path + query string, the viewing user, and with `csrf` the
+    CSRF secret embedded in its forms).
+    """
+    parts = [register_fingerprint(state), request.get_full_path(), str(user.pk), str(user.is_staff), str(user.is_superuser)]
+    if csrf:
+        # make sure the cookie exists now, not only once the form renders
+        get_token(request)
+        parts.append(request.META.get("CSRF_COOKIE", ""))
+    return '"%s"' % hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:32]
+
+
+def has_messages(request):
+    """True when a flash message is waiting to be shown (without consuming it)."""
+    return len(get_messages(request)) > 0
+
+
+def _finish(request, response, etag, last_modified, flashed=False):
+    if flashed:
+        # the message shows once; a cached copy would replay it
+        add_never_cache_headers(response)
+        return response
+    if request.method in ("GET", "HEAD") and response.status_code in (200, 304):
+        response.headers.setdefault("ETag", etag)
+        if last_modified and not response.has_header("Last-Modified"):
+            response.headers["Last-Modified"] = http_date(last_modified.timestamp())
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def register_conditional(csrf=False):
+    """
+    Decorator for read views (sync or async) that answers If-None-Match
+    with 304 while the register is unchanged. Goes under @login_required.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def inner(request, *args, **kwargs):
+                if request.method not in ("GET", "HEAD"):
+                    return await view(request, *args, **kwargs)
+                user = await request.auser()
+                state = await sync_to_async(register_state)()
+                flashed = await sync_to_async(has_messages)(request)
+                etag = page_etag(request, user, state, csrf)
+                last_modified = register_last_modified(state)
+                response = None if flashed else get_conditional_response(request, etag=etag)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _finish(request, response, etag, last_modified, flashed)
+        else:
+            @wraps(view)
+            def inner(request, *args, **kwargs):
+                if request.method not in ("GET", "HEAD"):
+                    return view(request, *args, **kwargs)
+                state = register_state()
+                flashed = has_messages(request)
+                etag = page_etag(request, request.user, state, csrf)
+                last_modified = register_last_modified(state)
+                response = None if flashed else get_conditional_response(request, etag=etag)
+                if response is None:
+                    response = view(request, *args, **kwargs)
+                return _finish(request, response, etag, last_modified, flashed)
+        return inner
+    return decorator
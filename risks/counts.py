@@ -0,0 +1,108 @@
+"""
+Cached register counts for the admin changelist.
+
+Totals and filter facets are cached under a register version number that
+signals.py bumps whenever the register changes, so invalidation is a single
+cache write however many querysets were counted.
+
+The version only reaches other workers through a shared cache. With the
+per-process local-memory cache a write in one worker would leave the
+others' counts stale, so nothing is cached there (as with sessions and
+users in auth.py).
+"""
+import hashlib
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Count
+from django.utils.functional import cached_property
+
+from .models import RiskAssessment
+
+
+COUNT_TIMEOUT = 300
+VERSION_KEY = "risks:register-version"
+
+
+def counts_cached():
+    return not isinstance(caches["default"], LocMemCache)
+
+
+def register_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(VERSION_KEY, version, None)
+    return version
+
+
+def invalidate_register_counts():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def _estimated_table_rows():
+    """Planner row estimate for the whole table, where the backend keeps one."""
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+            [RiskAssessment._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return row[0] if row and row[0] >= 0 else None
+
+
+def cached_count(queryset):
+    """COUNT(*) of `queryset`, computed once per register version."""
+    if not counts_cached():
+        count = _estimated_table_rows() if not queryset.query.where else None
+        return queryset.count() if count is None else count
+
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.md5(f"{sql}|{params}".encode("utf-8")).hexdigest()
+    key = f"risks:count:{register_version()}:{digest}"
+
+    count = cache.get(key)
+    if count is None:
+        if not queryset.query.where:
+            count = _estimated_table_rows()
+        if count is None:
+            count = queryset.count()
+        cache.set(key, count, COUNT_TIMEOUT)
+    return count
+
+
+def cached_value_counts(field_name):
+    """[(value, rows)] for one column across the register, for filter sidebars."""
+    if not counts_cached():
+        return _value_counts(field_name)
+    key = f"risks:facets:{register_version()}:{field_name}"
+    counts = cache.get(key)
+    if counts is None:
+        counts = _value_counts(field_name)
+        cache.set(key, counts, COUNT_TIMEOUT)
+    return counts
+
+
+def _value_counts(field_name):
+    return list(
+        RiskAssessment.objects.exclude(**{f"{field_name}__isnull": True})
+        .exclude(**{field_name: ""})
+        .values_list(field_name)
+        .annotate(rows=Count("pk"))
+        .order_by(field_name)
+    )
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator whose total comes from cached_count instead of a fresh COUNT(*)."""
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list)
@@ -0,0 +1,53 @@
+"""
+Department naming and seed defaults.
+
+Kept free of model imports (like kri.py): the Department manager in
+models.py uses these to match free-text area names and to seed a new
+department's owner and controls the first time its name is seen. After
+that, owners and controls come from the stored Department row.
+"""
+
+
+def normalise_area(name):
+    """Key used to match area names and aliases: lower case, single spaces."""
+    return " ".join(str(name or "").lower().split())
+
+
+def derive_owner(area_name):
+    a = (area_name or "").strip().lower()
+
+    if "microfinance" in a:
+        return "Head of Microfinance"
+    if "credit" in a:
+        return "Head of Credit"
+    if "finance" in a:
+        return "Head of Finance"
+    if a == "it" or " ict" in f" {a} " or " it " in f" {a} " or "information technology" in a:
+        return "Head of IT"
+    if "operations" in a or "teller" in a or "customer service" in a:
+        return "Head of Operations"
+    if "compliance" in a:
+        return "Compliance Officer"
+    if "audit" in a:
+        return "Internal Auditor"
+    if "treasury" in a:
+        return "Treasury Manager"
+    if "hr" in a or "human resource" in a:
+        return "Head of HR"
+    if "legal" in a:
+        return "Legal Officer"
+
+    return "Department Head"
+
+
+def derive_controls(area_name):
+    a = (area_name or "").lower()
+    if "teller" in a or "customer service" in a or "operations" in a:
+        return "Maker-checker, daily call-over, cash limits, CCTV monitoring, ID verification"
+    if "credit" in a or "microfinance" in a:
+        return "Approval workflow controls, KYC verification, monitoring visits, collections follow-up"
+    if "it" in a or "ict" in a:
+        return "Access control, system monitoring, change management, alerting, backups"
+    if "compliance" in a or "aml" in a:
+        return "Transaction monitoring, reporting controls, periodic compliance review"
+    return "Standard Controls"
@@ -0,0 +1,152 @@
+"""
+Materialised heatmap counters.
+
+HeatmapCell holds one counter per (area, draft/approved, inherent/residual,
+probability, impact). RiskAssessment.save() and the post_delete signal move
+single risks between cells; the bulk paths wrap their writes in
+track_heatmap() or call record_heatmap_writes(), and the register purge
+uncounts each chunk before deleting it. The dashboard matrices are then summed from at most a
+few hundred counter rows instead of the register.
+"""
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Case, CharField, Count, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import HeatmapCell, IMPACTS, PROBABILITIES, RiskAssessment
+
+
+TRACK_CHUNK_SIZE = 5000
+
+
+def _status():
+    return Case(
+        When(description__startswith="[DRAFT]", then=Value("draft")),
+        default=Value("approved"),
+        output_field=CharField(),
+    )
+
+
+def count_cells(queryset):
+    """Counter of cell key -> risks, grouped by the database (two queries)."""
+    counts = Counter()
+    rows = queryset.annotate(_area=Coalesce("area_name", Value("")), _status=_status())
+    for matrix in ("inherent", "residual"):
+        prob, impact = f"{matrix}_probability", f"{matrix}_impact"
+        for row in rows.values("_area", "_status", prob, impact).annotate(n=Count("pk")).order_by():
+            counts[(row["_area"], row["_status"], matrix, row[prob], row[impact])] += row["n"]
+    return counts
+
+
+def _count_ids(ids):
+    counts = Counter()
+    for start in range(0, len(ids), TRACK_CHUNK_SIZE):
+        counts.update(count_cells(RiskAssessment.objects.filter(pk__in=ids[start:start + TRACK_CHUNK_SIZE])))
+    return counts
+
+
+@contextmanager
+def track_heatmap(ids):
+    """
+    For set-based writes (QuerySet.update) to the risks in `ids`: count their
+    cells before and after the block and apply the difference.
+    """
+    ids = list(ids)
+    with transaction.atomic():
+        before = _count_ids(ids)
+        yield
+        deltas = _count_ids(ids)
+        deltas.subtract(before)
+        HeatmapCell.objects.apply_deltas(deltas)
+
+
+def record_heatmap_writes(created=(), updated=()):
+    """
+    For bulk_create/bulk_update: `created` risks count into their cells,
+    `updated` ones (loaded from the database, then modified) move out of the
+    cells they were loaded with.
+    """
+    deltas = Counter()
+    for risk in created:
+        deltas.update(risk.heatmap_cells())
+    for risk in updated:
+        deltas.update(risk.heatmap_cells())
+        deltas.subtract(risk._loaded_cells)
+        risk._loaded_cells = risk.heatmap_cells()
+    HeatmapCell.objects.apply_deltas(deltas)
+
+
+def uncount_risks(queryset):
+    """Take the risks in `queryset` out of their cells; call before deleting them in bulk."""
+    deltas = Counter()
+    deltas.subtract(count_cells(queryset))
+    HeatmapCell.objects.apply_deltas(deltas)
+
+
+def _cell_filter(selected_area, filter_type):
+    cells = HeatmapCell.objects.filter(count__gt=0)
+    if selected_area:
+        cells = cells.filter(area_name=selected_area)
+    if filter_type in ("draft", "approved"):
+        cells = cells.filter(status=filter_type)
+    return cells
+
+
+def heatmap_matrices(selected_area="", filter_type="all"):
+    """
+    Inherent/residual matrices plus the total and residual-critical counts
+    for the dashboard's area and draft/approved filters, in one query.
+    """
+    inherent = {p: {i: 0 for i in IMPACTS} for p in PROBABILITIES}
+    residual = {p: {i: 0 for i in IMPACTS} for p in PROBABILITIES}
+    total = critical = 0
+
+    rows = (
+        _cell_filter(selected_area, filter_type)
+        .values("matrix", "probability", "impact")
+        .annotate(n=Sum("count"))
+        .order_by()
+    )
+    for row in rows:
+        matrix = inherent if row["matrix"] == "inherent" else residual
+        if row["probability"] in matrix and row["impact"] in matrix[row["probability"]]:
+            matrix[row["probability"]][row["impact"]] += row["n"]
+        if row["matrix"] == "inherent":
+            total += row["n"]
+        elif RiskAssessment.calculate_rating(row["probability"], row["impact"]) == "Critical":
+            critical += row["n"]
+
+    return {
+        "inherent_matrix": inherent,
+        "residual_matrix": residual,
+        "total_risks": total,
+        "critical_risks": critical,
+    }
+
+
+def rebuild_heatmap():
+    """Recount every cell from the register. Returns the number of cells written."""
+    counts = count_cells(RiskAssessment.objects.all())
+    with transaction.atomic():
+        HeatmapCell.objects.all().delete()
+        HeatmapCell.objects.bulk_create(
+            [HeatmapCell(count=n, **dict(zip(HeatmapCell.KEY_FIELDS, key))) for key, n in counts.items()],
+            batch_size=500,
+        )
+    return len(counts)
+
+
+def verify_heatmap():
+    """Cells whose stored counter disagrees with the register: {key: (stored, actual)}."""
+    actual = count_cells(RiskAssessment.objects.all())
+    stored = {
+        tuple(row[f] for f in HeatmapCell.KEY_FIELDS): row["count"]
+        for row in HeatmapCell.objects.values(*HeatmapCell.KEY_FIELDS, "count")
+    }
+    return {
+        key: (stored.get(key, 0), actual.get(key, 0))
+        for key in set(stored) | set(actual)
+        if stored.get(key, 0) != actual.get(key, 0)
+    }
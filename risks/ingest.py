@@ -0,0 +1,200 @@
+import hashlib
+import re
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .heatmap import record_heatmap_writes
+from .kri import COORDINATOR_MAP
+from .models import Department, RiskAssessment
+from .observations import record_kri_observations
+from .signals import risks_bulk_changed
+
+
+DRAFT_PREFIX = "[DRAFT] "
+
+# Fields refreshed when a KRI row is re-submitted. Owner, coordinator and
+# controls are left alone so manual edits made after the first ingest survive.
+UPSERT_FIELDS = [
+    "description",
+    "caused_by",
+    "consequences",
+    "inherent_probability",
+    "inherent_impact",
+    "residual_probability",
+    "residual_impact",
+]
+
+
+# ========= FINGERPRINT_START =========
+def normalize_text(value):
+    return re.sub(r"\s+", " ", str(value or "").strip().lower())
+
+
+def make_fingerprint(area_name, reporting_period, kri_text):
+    """Stable hash of (area, reporting period, KRI text) used to spot re-submissions."""
+    raw = "|".join([
+        normalize_text(area_name),
+        normalize_text(reporting_period),
+        normalize_text(kri_text),
+    ])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+# ========= FINGERPRINT_END =========
+
+
+# ========= BULK_REFERENCE_IDS_START =========
+def allocate_reference_ids(base_refs):
+    """
+    A free reference ID for each base ID: the base itself, else base-1,
+    base-2, ... The taken IDs are loaded once per RISK-<AREA> prefix.
+    """
+    taken = set()
+    for prefix in {ref.rsplit("-", 1)[0] for ref in base_refs}:
+        taken.update(
+            RiskAssessment.objects.filter(reference_id__startswith=prefix)
+            .values_list("reference_id", flat=True)
+        )
+
+    allocated = []
+    for base_ref in base_refs:
+        ref = base_ref
+        bump = 1
+        while ref in taken:
+            ref = f"{base_ref}-{bump}"
+            bump += 1
+        taken.add(ref)
+        allocated.append(ref)
+    return allocated
+# ========= BULK_REFERENCE_IDS_END =========
+
+
+# ========= UPSERT_START =========
+def upsert_ingested_risks(rows, user=None, observations=()):
+    """
+    Insert or refresh ingested KRI rows keyed by their fingerprint.
+
+    Each row is a dict of RiskAssessment field values plus "base_ref" (the
+    RISK-<AREA>-NNN stem) and "kri_text" (the text that identifies the KRI).
+    `observations` (kri.kri_observation dicts) go to the KRI history.
+    Returns {"inserted": n, "updated": n, "skipped": n}.
+
+    Two identical reports submitted at once can both miss each other's rows
+    and collide on the unique fingerprint or reference_id. The loser is
+    retried once; by then the winner's rows exist, so it takes the update path.
+    """
+    try:
+        return _upsert_ingested_risks(rows, user, observations)
+    except IntegrityError:
+        return _upsert_ingested_risks(rows, user, observations)
+
+
+def _upsert_ingested_risks(rows, user, observations):
+    summary = {"inserted": 0, "updated": 0, "skipped": 0}
+    default_coordinator = COORDINATOR_MAP["__default__"]
+
+    departments = {}
+    prepared = {}
+    for row in rows:
+        row = dict(row)
+        base_ref = row.pop("base_ref")
+        kri_text = row.pop("kri_text")
+
+        area = row.get("area_name")
+        if area not in departments:
+            departments[area] = Department.objects.lookup(area)
+        department = departments[area]
+        if department:
+            row["area_name"] = department["name"]
+            row["department_id"] = department["id"]
+            if department["coordinator"] and row.get("risk_coordinator_name", default_coordinator) == default_coordinator:
+                row["risk_coordinator_name"] = department["coordinator"]
+            # owner and controls are not in UPSERT_FIELDS, so this only reaches new risks
+            if department["owner"]:
+                row["risk_owner"] = row["control_owner"] = department["owner"]
+            if department["controls"]:
+                row["controls"] = department["controls"]
+
+        fingerprint = make_fingerprint(row.get("area_name"), row.get("reporting_period"), kri_text)
+        if fingerprint in prepared:
+            # same KRI pasted twice in one report
+            summary["skipped"] += 1
+            continue
+        prepared[fingerprint] = (base_ref, row)
+
+    if not prepared and not observations:
+        return summary
+
+    now = timezone.now()
+
+    # the KRI history is written with the risks: a failed upsert leaves neither
+    with transaction.atomic():
+        if observations:
+            record_kri_observations(observations, departments)
+        if not prepared:
+            return summary
+
+        existing = {
+            risk.fingerprint: risk
+            for risk in RiskAssessment.objects.filter(fingerprint__in=list(prepared))
+        }
+
+        new_keys = [fp for fp in prepared if fp not in existing]
+        reference_ids = allocate_reference_ids([prepared[fp][0] for fp in new_keys])
+
+        to_create = []
+        for fingerprint, reference_id in zip(new_keys, reference_ids):
+            risk = RiskAssessment(
+                reference_id=reference_id,
+                fingerprint=fingerprint,
+                updated_by=user,
+                **prepared[fingerprint][1]
+            )
+            risk.apply_ratings()
+            risk.apply_keyword_tags()
+            to_create.append(risk)
+
+        to_update = []
+        for fingerprint, risk in existing.items():
+            row = prepared[fingerprint][1]
+
+            # never push an approved risk back to draft
+            description = row.get("description", "")
+            if description.startswith(DRAFT_PREFIX) and not risk.description.startswith(DRAFT_PREFIX):
+                row["description"] = description[len(DRAFT_PREFIX):]
+
+            changed = [f for f in UPSERT_FIELDS if f in row and getattr(risk, f) != row[f]]
+            if not changed:
+                summary["skipped"] += 1
+                continue
+
+            for field in changed:
+                setattr(risk, field, row[field])
+            risk.apply_ratings()
+            risk.apply_keyword_tags()
+            risk.updated_by = user
+            risk.updated_at = now
+            to_update.append(risk)
+
+        RiskAssessment.objects.bulk_create(to_create, batch_size=500)
+        RiskAssessment.objects.bulk_update(
+            to_update,
+            UPSERT_FIELDS + ["inherent_rating", "residual_rating", "keyword_tags", "updated_by", "updated_at"],
+            batch_size=500,
+        )
+        record_heatmap_writes(created=to_create, updated=to_update)
+
+        changed_ids = [risk.pk for risk in to_update]
+        if any(risk.pk is None for risk in to_create):
+            # backends that cannot return ids from a bulk insert
+            changed_ids += RiskAssessment.objects.filter(
+                fingerprint__in=[risk.fingerprint for risk in to_create]
+            ).values_list("pk", flat=True)
+        else:
+            changed_ids += [risk.pk for risk in to_create]
+        if changed_ids:
+            risks_bulk_changed.send(sender=RiskAssessment, ids=changed_ids)
+
+    summary["inserted"] = len(to_create)
+    summary["updated"] = len(to_update)
+    return summary
+# ========= UPSERT_END =========
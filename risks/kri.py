@@ -0,0 +1,409 @@
+"""
+Parsing and scoring of pasted KRI reports (Save & Approve rules).
+
+Kept free of model imports so batch ingestion can run it in worker
+processes; the results are written by ingest.upsert_ingested_risks.
+"""
+import datetime
+import re
+
+from .departments import derive_controls, derive_owner
+
+
+# ========= ZERO_OCCURRENCE_HELPER_START =========
+def is_zero_occurrence(value) -> bool:
+    if value is None:
+        return True
+
+    v = str(value).strip().lower()
+
+    ZERO_WORDS = [
+        "0", "0.0", "zero", "nil", "none", "no", "n/a", "",
+        "always updated", "timelines met", "on time", "no issues", "ok"
+    ]
+
+    return v in ZERO_WORDS
+# ========= ZERO_OCCURRENCE_HELPER_END =========
+
+
+# ========= OBSERVATION_VALUES_START =========
+_MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ("jan", "january"), ("feb", "february"), ("mar", "march"), ("apr", "april"),
+        ("may",), ("jun", "june"), ("jul", "july"), ("aug", "august"),
+        ("sep", "sept", "september"), ("oct", "october"), ("nov", "november"), ("dec", "december"),
+    ], start=1)
+    for name in names
+}
+
+
+def parse_occurrence(value):
+    """
+    (number, is_percentage) for one occurrence cell: "3" -> (3.0, False),
+    "2.5%" -> (2.5, True), the zero words -> (0.0, False). Free text such
+    as "weekly" has no number: (None, False).
+    """
+    if is_zero_occurrence(value):
+        return 0.0, False
+    v = str(value).strip().lower().replace(",", "")
+    is_percentage = v.endswith("%")
+    try:
+        return float(v.rstrip("%").strip()), is_percentage
+    except ValueError:
+        return None, False
+
+
+def parse_period(text):
+    """
+    First day of a reporting period label, or None: "Q2 2025", "2025 Q2",
+    "March 2025", "Mar-2025", "2025-03", "31/03/2025", "2025-03-31", "FY2025".
+    """
+    v = str(text or "").strip().lower()
+    year = re.search(r"(?:19|20)\d{2}", v)
+    if not year:
+        return None
+    y = int(year.group())
+
+    quarter = re.search(r"(?<![a-z])q([1-4])(?!\d)", v)
+    if quarter:
+        return datetime.date(y, 3 * int(quarter.group(1)) - 2, 1)
+
+    for word in re.findall(r"[a-z]+", v):
+        if word in _MONTHS:
+            return datetime.date(y, _MONTHS[word], 1)
+
+    numeric = re.search(r"(\d{1,4})[-/.](\d{1,2})(?:[-/.](\d{1,4}))?", v)
+    if numeric:
+        first, second, third = numeric.groups()
+        if len(first) == 4:
+            month = int(second)                       # 2025-03[-31]
+        elif third:
+            month = int(second)                       # 31/03/2025
+        else:
+            month = int(first)                        # 03/2025
+        if 1 <= month <= 12:
+            return datetime.date(y, month, 1)
+
+    return datetime.date(y, 1, 1)
+
+
+def kri_observation(area_name, reporting_period, kri, process, occurrence):
+    """One KRI reading as stored by observations.record_kri_observations."""
+    value, is_percentage = parse_occurrence(occurrence)
+    return {
+        "area_name": area_name,
+        "kri": kri,
+        "process": process,
+        "reporting_period": reporting_period,
+        "period_start": parse_period(reporting_period),
+        "occurrence": value,
+        "is_percentage": is_percentage,
+    }
+# ========= OBSERVATION_VALUES_END =========
+
+
+# ========= APPROVE_SCORING_START =========
+def split_row(line):
+    if "\t" in line:
+        return [p.strip() for p in line.split("\t") if p.strip()]
+    return [p.strip() for p in re.split(r"\s{2,}", line.strip()) if p.strip()]
+
+
+def likelihood_from_occurrence(value):
+    v = str(value).strip().lower()
+
+    # percentage like 10%
+    if v.endswith("%"):
+        try:
+            pct = float(v.replace("%", "").strip())
+        except ValueError:
+            pct = 0.0
+        if pct <= 0:
+            return "Very Low"
+        if pct < 5:
+            return "Medium"
+        if pct < 10:
+            return "High"
+        return "Very High"
+
+    # frequency phrases
+    if any(x in v for x in ["daily", "per day", "every day"]):
+        return "Very High"
+    if any(x in v for x in ["weekly", "per week", "frequently", "often"]):
+        return "High"
+    if any(x in v for x in ["monthly", "per month"]):
+        return "Medium"
+    if any(x in v for x in ["quarterly", "per quarter"]):
+        return "Low"
+    if any(x in v for x in ["annually", "annual", "per year"]):
+        return "Low"
+
+    # numeric
+    try:
+        n = int(v)
+    except ValueError:
+        # blank/unknown text -> Medium is safer than Low
+        return "Medium"
+
+    if n <= 0:
+        return "Very Low"
+    if n == 1:
+        return "Low"
+    if 2 <= n <= 3:
+        return "Medium"
+    if 4 <= n <= 9:
+        return "High"
+    return "Very High"
+
+
+# keyword groups in precedence order: the first group with a hit sets the impact
+IMPACT_KEYWORDS = [
+    ("Very High", [
+        "money laundering", "aml", "cft", "sanction", "regulatory", "penalty",
+        "fraud", "theft", "misappropriation", "terrorist financing",
+        "data breach", "privacy breach", "identity theft", "loss of funds"
+    ]),
+    ("High", [
+        "legal", "contract", "reputational", "litigation", "complaint to the regulator",
+        "regulatory scrutiny", "enforcement"
+    ]),
+    ("Medium", [
+        "operational", "process", "delay", "reporting", "documentation", "control breakdown",
+        "governance", "recommendation", "overdue corrective"
+    ]),
+    ("High", ["vault", "insurance", "cash exposure", "cash vault"]),
+]
+
+
+def impact_from_text(text):
+    t = (text or "").lower()
+
+    for level, keywords in IMPACT_KEYWORDS:
+        if any(k in t for k in keywords):
+            return level
+
+    return "Medium"
+
+
+def reduce_level(level):
+    order = ["Very Low", "Low", "Medium", "High", "Very High"]
+    if level not in order:
+        level = "Medium"
+    return order[max(order.index(level) - 1, 0)]
+# ========= APPROVE_SCORING_END =========
+
+
+# ========= COORDINATOR_MAP_START =========
+COORDINATOR_MAP = {
+    # Compliance / AML
+    "aml": "Compliance Officer",
+    "cft": "Compliance Officer",
+    "money laundering": "Compliance Officer",
+    "sanction": "Compliance Officer",
+    "regulatory": "Compliance Officer",
+    "fic": "Compliance Officer",
+    "bog": "Compliance Officer",
+
+    # Fraud / theft
+    "fraud": "Fraud & Investigations Officer",
+    "theft": "Fraud & Investigations Officer",
+    "misappropriation": "Fraud & Investigations Officer",
+    "robbery": "Security Coordinator",
+
+    # IT / systems
+    "system": "IT Support Lead",
+    "downtime": "IT Support Lead",
+    "alert": "IT Support Lead",
+    "verification system": "IT Support Lead",
+
+    # Treasury / liquidity
+    "liquidity": "Treasury Coordinator",
+    "reserve": "Treasury Coordinator",
+    "clearing": "Treasury Coordinator",
+    "settlement": "Treasury Coordinator",
+
+    # Customer / service
+    "complaint": "Customer Service Coordinator",
+    "reputational": "Customer Service Coordinator",
+
+    # HR / people
+    "staff": "HR Coordinator",
+    "training": "HR Coordinator",
+    "competency": "HR Coordinator",
+
+    "__default__": "Risk & Compliance Coordinator",
+}
+# ========= COORDINATOR_MAP_END =========
+
+
+# ========= PARSE_KRI_REPORT_START =========
+def parse_kri_report(raw_text, default_area="", with_observations=False):
+    """
+    Turn one pasted KRI table into row dicts ready for upsert_ingested_risks.
+    default_area is used when the first line has no "Reporting Period:" header.
+    With `with_observations`, returns (rows, observations): one observation
+    per KRI line, zero occurrences included.
+    """
+    # ---------- PARSE LINES ----------
+    lines = [ln.strip() for ln in raw_text.splitlines() if ln.strip()]
+    if not lines:
+        return ([], []) if with_observations else []
+
+    # Parse area name safely from first line
+    first = lines[0]
+    reporting_period = ""
+    if "Reporting Period:" in first:
+        area_name, reporting_period = [x.strip() for x in first.split("Reporting Period:", 1)]
+    elif default_area:
+        area_name = default_area
+    else:
+        area_name = first.strip()
+
+    # Find header safely (no StopIteration)
+    header_idx = -1
+    for i, ln in enumerate(lines):
+        if "Key Risk Indicator" in ln:
+            header_idx = i
+            break
+
+    data_lines = lines[header_idx + 1:] if header_idx != -1 else lines[1:]
+
+    rows = []
+    observations = []
+    counter = 1
+
+    for ln in data_lines:
+        # ===== SKIP TABLE HEADER ROW =====
+        if "kri description" in ln.lower() and "related risk" in ln.lower():
+            continue
+        # ================================
+
+        parts = split_row(ln)
+        if len(parts) < 3:
+            continue
+
+        kri = parts[0] if len(parts) >= 1 else ""
+        kri_desc = parts[1] if len(parts) >= 2 else ""
+        related_risk = parts[2] if len(parts) >= 3 else ""
+        process = parts[3] if len(parts) >= 4 else ""
+        occ = parts[4] if len(parts) >= 5 else ""
+
+        # ========= OWNER_SELECT_START =========
+        # seed rule only: ingest applies the department's stored owner and controls
+        owner = derive_owner(area_name)
+        # ========= OWNER_SELECT_END =========
+
+        # ========= COORDINATOR_SELECT_START =========
+        combined_text = f"{kri} {kri_desc} {related_risk} {process}".lower()
+
+        coordinator = COORDINATOR_MAP.get("__default__", "Risk Coordinator")
+        for key, coord_name in COORDINATOR_MAP.items():
+            if key != "__default__" and key in combined_text:
+                coordinator = coord_name
+                break
+        # ========= COORDINATOR_SELECT_END =========
+
+        if with_observations:
+            observations.append(kri_observation(area_name, reporting_period, kri, process, occ))
+
+        # ===== SKIP ZERO OCCURRENCE RISKS =====
+        if is_zero_occurrence(occ):
+            continue
+        # =====================================
+
+
+        inherent_prob = likelihood_from_occurrence(occ)
+        inherent_impact = impact_from_text(" ".join([related_risk, kri, kri_desc, process]))
+
+        residual_prob = reduce_level(inherent_prob)
+        residual_impact = reduce_level(inherent_impact)
+
+        base_ref = f"RISK-{area_name[:12].upper().replace(' ', '-')}-{counter:03d}"
+        base_ref = re.sub(r"[^A-Z0-9\-]", "", base_ref)
+
+        rows.append({
+            "base_ref": base_ref,
+            "kri_text": f"{kri} {kri_desc}",
+            "area_name": area_name,
+            "reporting_period": reporting_period,
+            "description": related_risk or kri or "TBD",
+            "caused_by": kri_desc,
+            "consequences": related_risk,
+            "risk_owner": owner,
+            "risk_coordinator_name": coordinator,
+            "inherent_probability": inherent_prob,
+            "inherent_impact": inherent_impact,
+            "residual_probability": residual_prob,
+            "residual_impact": residual_impact,
+            "controls": derive_controls(area_name),
+            "control_owner": owner,
+        })
+
+        counter += 1
+
+    if with_observations:
+        return rows, observations
+    return rows
+# ========= PARSE_KRI_REPORT_END =========
+
+
+# ========= WORKBOOK_READER_START =========
+_XLSX_NS = {
+    "m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+
+
+def _xlsx_cell_text(cell, shared_strings):
+    ns = _XLSX_NS
+    kind = cell.get("t")
+    if kind == "inlineStr":
+        return "".join(t.text or "" for t in cell.iterfind(".//m:t", ns))
+    value = cell.find("m:v", ns)
+    if value is None or value.text is None:
+        return ""
+    if kind == "s":
+        return shared_strings[int(value.text)]
+    if kind is None and value.text.endswith(".0"):
+        # whole numbers come back as floats, e.g. "5.0"
+        return value.text[:-2]
+    return value.text
+
+
+def read_workbook_sheets(path):
+    """
+    Yield (sheet_name, text) for every sheet of an .xlsx workbook, each sheet
+    rendered as tab-separated lines like a pasted KRI table. Uses only the
+    standard library so no spreadsheet package is needed on the server.
+    """
+    import posixpath
+    import zipfile
+    from xml.etree import ElementTree
+
+    ns = _XLSX_NS
+    with zipfile.ZipFile(path) as zf:
+        shared_strings = []
+        if "xl/sharedStrings.xml" in zf.namelist():
+            root = ElementTree.fromstring(zf.read("xl/sharedStrings.xml"))
+            for si in root.iterfind("m:si", ns):
+                shared_strings.append("".join(t.text or "" for t in si.iterfind(".//m:t", ns)))
+
+        rels = ElementTree.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+        targets = {rel.get("Id"): rel.get("Target") for rel in rels.iterfind("rel:Relationship", ns)}
+
+        workbook = ElementTree.fromstring(zf.read("xl/workbook.xml"))
+        for sheet in workbook.iterfind("m:sheets/m:sheet", ns):
+            target = targets[sheet.get(f"{{{ns['r']}}}id")]
+            part = target.lstrip("/") if target.startswith("/") else posixpath.join("xl", target)
+
+            lines = []
+            root = ElementTree.fromstring(zf.read(part))
+            for row in root.iterfind("m:sheetData/m:row", ns):
+                cells = [_xlsx_cell_text(c, shared_strings) for c in row.iterfind("m:c", ns)]
+                if any(c.strip() for c in cells):
+                    lines.append("\t".join(cells))
+
+            yield sheet.get("name"), "\n".join(lines)
+# ========= WORKBOOK_READER_END =========
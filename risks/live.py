@@ -0,0 +1,41 @@
+"""
+In-process change notification for the live dashboard stream.
+
+Register writes made in this process wake every open stream once their
+transaction commits (see signals.py). There is no broker: writes from other
+processes are picked up by each stream's periodic fingerprint check.
+"""
+import asyncio
+import threading
+
+
+class RegisterChangeHub:
+    """Set of asyncio events, one per open stream, that any thread can set."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = set()
+
+    def subscribe(self):
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.add(waiter)
+        return waiter
+
+    def unsubscribe(self, waiter):
+        with self._lock:
+            self._waiters.discard(waiter)
+
+    def notify(self):
+        with self._lock:
+            waiters = list(self._waiters)
+        for waiter in waiters:
+            loop, event = waiter
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # the stream's event loop has shut down
+                self.unsubscribe(waiter)
+
+
+hub = RegisterChangeHub()
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from risks.models import RiskAssessment
+from risks.themes import retag_risks
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored keyword tags (board themes, impact and coordinator keywords) for every risk."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000,
+                            help="Risks read and tagged per batch (default 2000)")
+
+    def handle(self, *args, **options):
+        changed = retag_risks(RiskAssessment.objects.all(), chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-tagged {changed} of {RiskAssessment.objects.count()} risks."
+        ))
@@ -0,0 +1,80 @@
+import time
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from risks.compression import COMPRESSORS, brotli, compress_bytes, compress_stream
+
+
+DEFAULT_PATHS = [
+    "/",
+    "/board-explanation/",
+    "/official-report/",
+    "/export-csv/",
+    "/api/risks/?limit=1000",
+]
+
+
+@async_to_sync
+async def _collect(streaming_content):
+    return [bytes(chunk) async for chunk in streaming_content]
+
+
+class Command(BaseCommand):
+    help = (
+        "Fetch the main pages and exports uncompressed, then report the bytes each "
+        "encoding saves and the CPU time it costs per response."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", help=f"Paths to fetch (default: {' '.join(DEFAULT_PATHS)})")
+        parser.add_argument("--user", help="Username to fetch as (default: the first superuser)")
+        parser.add_argument("--repeat", type=int, default=5, help="Compressions per response to average")
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.all()
+        user = (
+            users.filter(username=options["user"]).first()
+            if options["user"]
+            else users.filter(is_superuser=True).order_by("pk").first()
+        )
+        if user is None:
+            raise CommandError("No such user; pass --user or create a superuser.")
+
+        client = Client(HTTP_ACCEPT_ENCODING="identity")
+        client.force_login(user)
+        repeat = max(1, options["repeat"])
+        encodings = [name for name in COMPRESSORS if name != "br" or brotli is not None]
+        if brotli is None:
+            self.stdout.write("brotli is not installed: gzip only.")
+
+        self.stdout.write(
+            f"{'path':<28} {'raw KB':>9}" + "".join(f" {name + ' KB':>9} {'saved':>6} {'CPU ms':>8}" for name in encodings)
+        )
+        for path in options["paths"] or DEFAULT_PATHS:
+            response = client.get(path)
+            if response.status_code != 200:
+                self.stdout.write(f"{path:<28} HTTP {response.status_code}, skipped")
+                continue
+            if response.streaming and response.is_async:
+                chunks = _collect(response.streaming_content)
+            elif response.streaming:
+                chunks = [bytes(chunk) for chunk in response.streaming_content]
+            else:
+                chunks = [response.content]
+            raw = sum(len(chunk) for chunk in chunks)
+
+            line = f"{path:<28} {raw / 1024:>9.1f}"
+            for encoding in encodings:
+                started = time.process_time()
+                for _ in range(repeat):
+                    if response.streaming:
+                        size = sum(len(part) for part in compress_stream(chunks, encoding))
+                    else:
+                        size = len(compress_bytes(chunks[0], encoding))
+                cpu_ms = (time.process_time() - started) * 1000 / repeat
+                saved = 100 * (1 - size / raw) if raw else 0
+                line += f" {size / 1024:>9.1f} {saved:>5.0f}% {cpu_ms:>8.2f}"
+            self.stdout.write(line)
@@ -0,0 +1,147 @@
+import csv
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from risks.ingest import upsert_ingested_risks
+from risks.kri import parse_kri_report, read_workbook_sheets
+
+
+TEXT_SUFFIXES = {".txt", ".tsv"}
+
+
+def _csv_to_tabbed(text):
+    return "\n".join("\t".join(row) for row in csv.reader(io.StringIO(text)))
+
+
+def load_sources(path):
+    """Return [(label, raw_text)] for a directory of reports or a workbook."""
+    path = Path(path)
+    if path.is_file():
+        if path.suffix.lower() != ".xlsx":
+            raise CommandError("A single file must be an .xlsx workbook (one sheet per area).")
+        return list(read_workbook_sheets(path))
+
+    if not path.is_dir():
+        raise CommandError(f"{path} does not exist.")
+
+    sources = []
+    for item in sorted(path.iterdir()):
+        suffix = item.suffix.lower()
+        if suffix in TEXT_SUFFIXES:
+            sources.append((item.stem, item.read_text(encoding="utf-8", errors="replace")))
+        elif suffix == ".csv":
+            sources.append((item.stem, _csv_to_tabbed(item.read_text(encoding="utf-8", errors="replace"))))
+        elif suffix == ".xlsx":
+            sources.extend(read_workbook_sheets(item))
+    return sources
+
+
+def parse_report(text, label):
+    """(rows, observations) for one report; module level so the pool can pickle it."""
+    return parse_kri_report(text, label, with_observations=True)
+
+
+def parse_sources(sources, workers):
+    labels = [label for label, _text in sources]
+    texts = [text for _label, text in sources]
+    if workers <= 1:
+        return [parse_report(text, label) for text, label in zip(texts, labels)]
+
+    # workers only parse and score; they never touch the database
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(parse_report, texts, labels))
+
+
+class Command(BaseCommand):
+    help = (
+        "Ingest a directory (or .xlsx workbook) of KRI reports, one per area. "
+        "Reports are parsed and scored in a process pool and written in batched transactions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Directory of .txt/.tsv/.csv/.xlsx reports, or a single .xlsx workbook")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="Parser processes (1 = serial, same as the web view)")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per write transaction")
+        parser.add_argument("--user", help="Username recorded as updated_by")
+        parser.add_argument("--compare-serial", action="store_true",
+                            help="Also time a serial parse to report the pool speed-up")
+
+    def handle(self, *args, **options):
+        user = None
+        if options["user"]:
+            try:
+                user = get_user_model().objects.get(username=options["user"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User {options['user']!r} not found.")
+
+        started = time.perf_counter()
+        sources = load_sources(options["path"])
+        if not sources:
+            raise CommandError("No KRI reports found.")
+
+        workers = max(1, options["workers"])
+        parse_started = time.perf_counter()
+        parsed = parse_sources(sources, workers)
+        parse_seconds = time.perf_counter() - parse_started
+
+        total_rows = sum(len(rows) for rows, _observations in parsed)
+        self.stdout.write(
+            f"Parsed {len(sources)} reports / {total_rows} rows in {parse_seconds:.2f}s "
+            f"with {workers} worker(s) ({_rate(total_rows, parse_seconds)} rows/s)"
+        )
+
+        if options["compare_serial"] and workers > 1:
+            serial_started = time.perf_counter()
+            parse_sources(sources, 1)
+            serial_seconds = time.perf_counter() - serial_started
+            self.stdout.write(
+                f"Serial parse: {serial_seconds:.2f}s ({_rate(total_rows, serial_seconds)} rows/s), "
+                f"speed-up x{serial_seconds / parse_seconds if parse_seconds else 0:.1f}"
+            )
+
+        # single writer: batches go through one connection, one transaction each
+        write_started = time.perf_counter()
+        summary = {"inserted": 0, "updated": 0, "skipped": 0}
+        batch, observations = [], []
+        batches = recorded = 0
+        for rows, report_observations in parsed:
+            batch.extend(rows)
+            observations.extend(report_observations)
+            if len(batch) >= options["batch_size"]:
+                _merge(summary, upsert_ingested_risks(batch, user=user, observations=observations))
+                batches += 1
+                recorded += len(observations)
+                batch, observations = [], []
+        if batch or observations:
+            _merge(summary, upsert_ingested_risks(batch, user=user, observations=observations))
+            batches += 1
+            recorded += len(observations)
+        write_seconds = time.perf_counter() - write_started
+
+        total_seconds = time.perf_counter() - started
+        self.stdout.write(
+            f"Wrote {batches} batch(es) in {write_seconds:.2f}s: "
+            f"{summary['inserted']} inserted, {summary['updated']} updated, {summary['skipped']} unchanged, "
+            f"{recorded} KRI observations recorded"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {total_seconds:.2f}s ({_rate(total_rows, total_seconds)} rows/s end to end)"
+        ))
+
+
+def _merge(summary, result):
+    for key, value in result.items():
+        summary[key] += value
+
+
+def _rate(rows, seconds):
+    return int(rows / seconds) if seconds else rows
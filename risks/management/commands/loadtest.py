@@ -0,0 +1,259 @@
+import http.cookiejar
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# endpoint -> (method, path, weight)
+# kri_ingest posts through the real save form, so it writes draft risks for
+# the LOADTEST area (and their KRI observations) into the server's database.
+ENDPOINTS = {
+    "dashboard": ("GET", "/", 40),
+    "board_explanation": ("GET", "/board-explanation/", 20),
+    "official_report": ("GET", "/official-report/", 15),
+    "export_csv": ("GET", "/export-csv/", 10),
+    "kri_ingest": ("POST", "/ai-extract/save/", 15),
+}
+
+# Ingests always post the same KRI lines for one area, so repeated runs update
+# those few draft risks in place instead of growing the register.
+LOADTEST_AREA = "LOADTEST"
+LOADTEST_KRIS = [
+    ("Failed logins", "Failed privileged logins", "Unauthorised system access", "Access review"),
+    ("Overdue reconciliations", "Reconciliations past deadline", "Financial misstatement", "Reconciliation"),
+    ("Customer complaints", "Complaints about delays", "Reputational damage", "Customer service"),
+    ("Loan documentation gaps", "Loans missing documents", "Credit recovery failure", "Credit"),
+]
+
+
+def kri_report(rng):
+    lines = [
+        f"{LOADTEST_AREA} Reporting Period: Load test",
+        "Key Risk Indicator\tKRI Description\tRelated Risk\tProcess\tNo Occurrence",
+    ]
+    for kri in LOADTEST_KRIS:
+        lines.append("\t".join([*kri, str(rng.randint(1, 12))]))
+    return "\n".join(lines)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    # nearest rank
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def response_ok(endpoint, status, headers):
+    """
+    A save must redirect to the dashboard; anything else is an error. Pages
+    must answer 2xx: a redirect there is usually to the login page, which
+    would otherwise count as a fast success.
+    """
+    if ENDPOINTS[endpoint][0] == "POST":
+        location = urllib.parse.urlsplit(headers.get("Location", ""))
+        return status == 302 and location.path == ENDPOINTS["dashboard"][1]
+    return 200 <= status < 300
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class VirtualUser:
+    """One logged-in browser: its own cookie jar, CSRF token and think time."""
+
+    def __init__(self, base_url, username, password, rng, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.rng = rng
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect()
+        )
+        self.login(username, password)
+
+    def csrf_token(self):
+        return next((c.value for c in self.cookies if c.name == "csrftoken"), "")
+
+    def request(self, method, path, data=None):
+        """(status, headers, body bytes); redirects are returned, not followed."""
+        url = self.base_url + path
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(url, data=body, method=method, headers={
+            "Accept-Encoding": "gzip",
+            "Referer": url,
+            "X-CSRFToken": self.csrf_token(),
+        })
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.headers, exc.read()
+
+    def login(self, username, password):
+        self.request("GET", "/accounts/login/")
+        status, _headers, _body = self.request("POST", "/accounts/login/", {
+            "username": username,
+            "password": password,
+            "csrfmiddlewaretoken": self.csrf_token(),
+        })
+        if status != 302:
+            raise CommandError(f"Login as {username!r} failed (HTTP {status}).")
+
+    def hit(self, endpoint):
+        method, path, _weight = ENDPOINTS[endpoint]
+        data = None
+        if method == "POST":
+            data = {"raw_text": kri_report(self.rng), "csrfmiddlewaretoken": self.csrf_token()}
+        return self.request(method, path, data)
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate concurrent logged-in coordinators against a running server and report "
+        "p50/p95/p99 latency, throughput and error rate per endpoint. kri_ingest saves "
+        f"{LOADTEST_AREA} draft risks into the target server's database; leave it out with "
+        "--mix kri_ingest=0 against a database that must stay untouched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8080", help="Base URL of the running server")
+        parser.add_argument("--username", required=False, help="Account every virtual user logs in as")
+        parser.add_argument("--password", required=False)
+        parser.add_argument("--users", type=int, default=10, help="Concurrent virtual users")
+        parser.add_argument("--duration", type=float, default=60, help="Seconds to run")
+        parser.add_argument("--think", type=float, default=1.0,
+                            help="Mean pause between a user's requests, in seconds (0 = back to back)")
+        parser.add_argument("--mix", help="Endpoint weights, e.g. dashboard=50,kri_ingest=0 "
+                                          f"(endpoints: {', '.join(ENDPOINTS)})")
+        parser.add_argument("--timeout", type=float, default=60, help="Per-request timeout in seconds")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--label", default="", help="Name of the server setup, e.g. waitress or uvicorn")
+        parser.add_argument("--json", help="Also write the results to this file")
+        parser.add_argument("--compare", nargs="+", metavar="RESULTS",
+                            help="Print earlier --json results side by side instead of running")
+
+    def handle(self, *args, **options):
+        if options["compare"]:
+            self.compare([json.loads(Path(path).read_text()) for path in options["compare"]])
+            return
+        if not options["username"] or options["password"] is None:
+            raise CommandError("--username and --password are required.")
+
+        weights = self.parse_mix(options["mix"])
+        users = max(1, options["users"])
+        self.stdout.write(
+            f"{users} users for {options['duration']:g}s against {options['url']} "
+            f"(think {options['think']:g}s, mix {', '.join(f'{k}={v}' for k, v in weights.items())})"
+        )
+
+        samples = defaultdict(list)   # endpoint -> [(seconds, ok)]
+        lock = threading.Lock()
+        names, weight_values = list(weights), list(weights.values())
+
+        def log_in(number):
+            rng = random.Random(options["seed"] * 1000 + number)
+            return VirtualUser(options["url"], options["username"], options["password"], rng, options["timeout"])
+
+        def run_user(user, deadline):
+            rng = user.rng
+            while time.monotonic() < deadline:
+                endpoint = rng.choices(names, weights=weight_values)[0]
+                started = time.perf_counter()
+                try:
+                    status, headers, _body = user.hit(endpoint)
+                    ok = response_ok(endpoint, status, headers)
+                except OSError:
+                    ok = False
+                elapsed = time.perf_counter() - started
+                with lock:
+                    samples[endpoint].append((elapsed, ok))
+                if options["think"]:
+                    time.sleep(min(rng.expovariate(1 / options["think"]), max(0, deadline - time.monotonic())))
+
+        with ThreadPoolExecutor(max_workers=users) as pool:
+            # everyone logs in before the clock starts
+            virtual_users = list(pool.map(log_in, range(users)))
+            started = time.monotonic()
+            deadline = started + options["duration"]
+            for future in [pool.submit(run_user, user, deadline) for user in virtual_users]:
+                future.result()
+        wall = time.monotonic() - started
+
+        results = {
+            "label": options["label"],
+            "url": options["url"],
+            "users": users,
+            "duration": round(wall, 2),
+            "endpoints": {name: self.summarise(samples[name], wall) for name in weights if samples[name]},
+        }
+        results["total"] = self.summarise([s for name in weights for s in samples[name]], wall)
+        self.report(results)
+        if options["json"]:
+            Path(options["json"]).write_text(json.dumps(results, indent=2))
+            self.stdout.write(f"Results written to {options['json']}")
+
+    def parse_mix(self, mix):
+        weights = {name: weight for name, (_m, _p, weight) in ENDPOINTS.items()}
+        for part in (mix or "").split(","):
+            if not part.strip():
+                continue
+            name, _sep, value = part.partition("=")
+            name = name.strip()
+            if name not in ENDPOINTS:
+                raise CommandError(f"Unknown endpoint {name!r}; choose from {', '.join(ENDPOINTS)}.")
+            try:
+                weights[name] = max(0, int(value))
+            except ValueError:
+                raise CommandError(f"Weight for {name} must be a whole number.")
+        weights = {name: weight for name, weight in weights.items() if weight}
+        if not weights:
+            raise CommandError("The mix leaves no endpoints to request.")
+        return weights
+
+    def summarise(self, samples, wall):
+        times = sorted(seconds for seconds, _ok in samples)
+        errors = sum(1 for _seconds, ok in samples if not ok)
+        return {
+            "requests": len(samples),
+            "errors": errors,
+            "error_rate": round(errors / len(samples), 4) if samples else 0,
+            "rps": round(len(samples) / wall, 2) if wall else 0,
+            "p50_ms": round(percentile(times, 50) * 1000, 1),
+            "p95_ms": round(percentile(times, 95) * 1000, 1),
+            "p99_ms": round(percentile(times, 99) * 1000, 1),
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'endpoint':<20} {'reqs':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>8}"
+        )
+        rows = list(results["endpoints"].items()) + [("total", results["total"])]
+        for name, row in rows:
+            self.stdout.write(
+                f"{name:<20} {row['requests']:>7} {row['rps']:>8.1f} {row['p50_ms']:>9.1f} "
+                f"{row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['error_rate'] * 100:>7.1f}%"
+            )
+
+    def compare(self, runs):
+        labels = [run.get("label") or run.get("url", "?") for run in runs]
+        self.stdout.write(f"{'p95 ms / req/s':<20}" + "".join(f" {label[:18]:>18}" for label in labels))
+        names = list(dict.fromkeys(name for run in runs for name in run["endpoints"])) + ["total"]
+        for name in names:
+            cells = []
+            for run in runs:
+                row = run["total"] if name == "total" else run["endpoints"].get(name)
+                cells.append(f"{row['p95_ms']:.0f} / {row['rps']:.1f}" if row else "-")
+            self.stdout.write(f"{name:<20}" + "".join(f" {cell:>18}" for cell in cells))
@@ -0,0 +1,96 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from risks.heatmap import record_heatmap_writes
+from risks.models import RiskAssessment
+from risks.purge import PURGE_CHUNK_SIZE, close_register_cycle, purge_register
+
+
+class Command(BaseCommand):
+    help = (
+        "Clear the risk register in bounded id-range chunks (snapshot + archive first), "
+        "or benchmark the purge on synthetic rows with --benchmark."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=PURGE_CHUNK_SIZE, help="Rows per delete transaction")
+        parser.add_argument("--yes", action="store_true", help="Confirm clearing the live register")
+        parser.add_argument("--user", help="Username recorded on the closed cycle")
+        parser.add_argument("--no-archive", action="store_true", help="Skip the trend snapshot and archive")
+        parser.add_argument("--benchmark", type=int, metavar="ROWS",
+                            help="Seed ROWS synthetic risks into an empty register and time the purge")
+        parser.add_argument("--compare-delete", action="store_true",
+                            help="With --benchmark, also time QuerySet.delete() on the same number of rows")
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options["chunk_size"])
+        if options["benchmark"]:
+            return self.benchmark(options["benchmark"], chunk_size, options["compare_delete"])
+
+        total = RiskAssessment.objects.count()
+        if not total:
+            self.stdout.write("Register is already empty.")
+            return
+        if not options["yes"]:
+            raise CommandError(f"This deletes all {total} risks. Re-run with --yes to confirm.")
+
+        if not options["no_archive"]:
+            user = None
+            if options["user"]:
+                user = get_user_model().objects.filter(username=options["user"]).first()
+            cycle = close_register_cycle(user)
+            if cycle:
+                self.stdout.write(f"Closed cycle {cycle.label!r} ({cycle.total} risks snapshotted and archived)")
+
+        started = time.perf_counter()
+        deleted = purge_register(chunk_size=chunk_size, progress=self.report_progress)
+        self.finish(deleted, time.perf_counter() - started)
+
+    def report_progress(self, deleted, total):
+        self.stdout.write(f"  deleted {deleted:>9,} / {total:,} ({deleted * 100 // total}%)")
+
+    def finish(self, deleted, seconds, label="Purged"):
+        rate = int(deleted / seconds) if seconds else deleted
+        self.stdout.write(self.style.SUCCESS(f"{label} {deleted:,} risks in {seconds:.2f}s ({rate:,} rows/s)"))
+
+    def seed(self, rows):
+        batch = []
+        for i in range(rows):
+            batch.append(RiskAssessment(
+                reference_id=f"BENCH-{i:07d}",
+                area_name=f"Bench {i % 12}",
+                description=f"Benchmark risk {i}",
+                caused_by="Synthetic cause",
+                consequences="Synthetic consequence",
+                risk_owner="Benchmark",
+                inherent_probability="High",
+                inherent_impact="Medium",
+                inherent_rating="Severe",
+                residual_probability="Low",
+                residual_impact="Low",
+                residual_rating="Sustainable",
+            ))
+            if len(batch) == 5000:
+                RiskAssessment.objects.bulk_create(batch)
+                record_heatmap_writes(created=batch)
+                batch = []
+        RiskAssessment.objects.bulk_create(batch)
+        record_heatmap_writes(created=batch)
+
+    def benchmark(self, rows, chunk_size, compare_delete):
+        if RiskAssessment.objects.exists():
+            raise CommandError("--benchmark needs an empty register; it seeds and deletes its own rows.")
+
+        self.stdout.write(f"Seeding {rows:,} synthetic risks...")
+        self.seed(rows)
+        started = time.perf_counter()
+        deleted = purge_register(chunk_size=chunk_size)
+        self.finish(deleted, time.perf_counter() - started, f"Chunked purge ({chunk_size:,}/chunk):")
+
+        if compare_delete:
+            self.seed(rows)
+            started = time.perf_counter()
+            deleted, _per_model = RiskAssessment.objects.all().delete()
+            self.finish(deleted, time.perf_counter() - started, "QuerySet.delete():")
@@ -0,0 +1,44 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from risks.archive import DICT_COLUMNS, RegisterArchive, list_archives
+
+
+class Command(BaseCommand):
+    help = "List cleared-register archives or count their rows by area/rating without decompressing text."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--list", action="store_true", help="List archives and exit")
+        parser.add_argument("--period", help='Reporting period to count, e.g. "Q1 2025"')
+        parser.add_argument("--file", help="Query a single archive instead of all of them")
+        parser.add_argument("--by", nargs="+", default=["area_name", "residual_rating"],
+                            choices=DICT_COLUMNS, help="Columns to group by")
+
+    def handle(self, *args, **options):
+        paths = [options["file"]] if options["file"] else list_archives()
+        if not paths:
+            raise CommandError("No archives found.")
+
+        if options["list"]:
+            for path in paths:
+                with RegisterArchive(path) as archive:
+                    self.stdout.write(
+                        f"{archive.period:<20} {archive.header['closed_at'][:19]:<20} "
+                        f"{archive.rows:>8} rows  {archive.path.name}"
+                    )
+            return
+
+        totals = Counter()
+        for path in paths:
+            with RegisterArchive(path) as archive:
+                totals.update(archive.counts(by=options["by"], period=options["period"]))
+
+        if not totals:
+            self.stdout.write("No matching rows.")
+            return
+
+        self.stdout.write(" | ".join(options["by"]) + " | count")
+        for key, count in sorted(totals.items()):
+            self.stdout.write(" | ".join(k or "-" for k in key) + f" | {count}")
+        self.stdout.write(self.style.SUCCESS(f"{sum(totals.values())} rows"))
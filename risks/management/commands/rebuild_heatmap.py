@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from risks.heatmap import rebuild_heatmap, verify_heatmap
+from risks.models import HeatmapCell
+
+
+class Command(BaseCommand):
+    help = "Recount the heatmap cell counters from the register, or check them with --verify."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verify", action="store_true",
+                            help="Only compare the stored counters with the register; fail on any drift")
+
+    def handle(self, *args, **options):
+        if options["verify"]:
+            drift = verify_heatmap()
+            for (area, status, matrix, prob, impact), (stored, actual) in sorted(drift.items()):
+                self.stdout.write(
+                    f"{area or '-'} / {status} / {matrix} {prob} x {impact}: stored {stored}, actual {actual}"
+                )
+            if drift:
+                raise CommandError(f"{len(drift)} heatmap cell(s) out of step; run rebuild_heatmap.")
+            self.stdout.write(self.style.SUCCESS(
+                f"All {HeatmapCell.objects.filter(count__gt=0).count()} heatmap cells match the register."
+            ))
+            return
+
+        cells = rebuild_heatmap()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {cells} heatmap cells."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from risks.models import RiskAssessment
+from risks.search import FTS_TABLE, create_index, fts_enabled, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Recreate the full-text search index from the live register (SQLite only)."
+
+    def handle(self, *args, **options):
+        if not fts_enabled():
+            raise CommandError("The FTS5 index is only used on SQLite; other backends search live.")
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                create_index(cursor)
+            rebuild_index()
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+            (indexed,) = cursor.fetchone()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {indexed} of {RiskAssessment.objects.count()} risks."
+        ))
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-19 04:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('risks', '0005_riskassessment_risk_coordinator_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='riskassessment',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of area, reporting period and KRI text for ingested rows', max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='riskassessment',
+            name='reporting_period',
+            field=models.CharField(blank=True, default='', help_text='KRI reporting period the risk was ingested from', max_length=50),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 6.0 on 2026-10-19 04:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('risks', '0006_riskassessment_fingerprint_reporting_period'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegisterCycle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(help_text='Reporting period, or the close date if none was recorded', max_length=50)),
+                ('closed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('closed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='closed_cycles', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-closed_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PeriodSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('area_name', models.CharField(blank=True, default='', max_length=100)),
+                ('status', models.CharField(choices=[('approved', 'Approved'), ('draft', 'Draft')], max_length=10)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('inherent_critical', models.PositiveIntegerField(default=0)),
+                ('inherent_severe', models.PositiveIntegerField(default=0)),
+                ('inherent_moderate', models.PositiveIntegerField(default=0)),
+                ('inherent_sustainable', models.PositiveIntegerField(default=0)),
+                ('residual_critical', models.PositiveIntegerField(default=0)),
+                ('residual_severe', models.PositiveIntegerField(default=0)),
+                ('residual_moderate', models.PositiveIntegerField(default=0)),
+                ('residual_sustainable', models.PositiveIntegerField(default=0)),
+                ('improved', models.PositiveIntegerField(default=0)),
+                ('unchanged', models.PositiveIntegerField(default=0)),
+                ('worsened', models.PositiveIntegerField(default=0)),
+                ('inherent_matrix', models.JSONField(default=dict)),
+                ('residual_matrix', models.JSONField(default=dict)),
+                ('cycle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='risks.registercycle')),
+            ],
+            options={
+                'unique_together': {('cycle', 'area_name', 'status')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-19 10:12
+
+from django.db import migrations
+
+
+def create_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS risks_riskassessment_fts "
+            "USING fts5(description, caused_by, consequences, controls, tokenize='porter unicode61')"
+        )
+        cursor.execute(
+            "INSERT INTO risks_riskassessment_fts (rowid, description, caused_by, consequences, controls) "
+            "SELECT id, description, caused_by, consequences, controls FROM risks_riskassessment"
+        )
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS risks_riskassessment_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('risks', '0007_registercycle_periodsnapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-19 04:55
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('risks', '0008_riskassessment_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.CharField(help_text='Hash of the register state and executive summary', max_length=64, unique=True)),
+                ('executive_summary', models.TextField(blank=True, default='')),
+                ('rows_html', models.BinaryField(help_text='zlib-compressed report table rows')),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
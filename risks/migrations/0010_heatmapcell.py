@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-19 05:09
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_existing_risks(apps, schema_editor):
+    RiskAssessment = apps.get_model('risks', 'RiskAssessment')
+    HeatmapCell = apps.get_model('risks', 'HeatmapCell')
+    counts = Counter()
+    rows = RiskAssessment.objects.values_list(
+        'area_name', 'description',
+        'inherent_probability', 'inherent_impact',
+        'residual_probability', 'residual_impact',
+    )
+    for area, description, inh_p, inh_i, res_p, res_i in rows.iterator(chunk_size=2000):
+        status = 'draft' if (description or '').startswith('[DRAFT]') else 'approved'
+        counts[(area or '', status, 'inherent', inh_p, inh_i)] += 1
+        counts[(area or '', status, 'residual', res_p, res_i)] += 1
+    HeatmapCell.objects.bulk_create([
+        HeatmapCell(area_name=area, status=status, matrix=matrix, probability=prob, impact=impact, count=n)
+        for (area, status, matrix, prob, impact), n in counts.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('risks', '0009_reportsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HeatmapCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('area_name', models.CharField(blank=True, default='', max_length=100)),
+                ('status', models.CharField(choices=[('draft', 'Draft'), ('approved', 'Approved')], max_length=10)),
+                ('matrix', models.CharField(choices=[('inherent', 'Inherent'), ('residual', 'Residual')], max_length=10)),
+                ('probability', models.CharField(max_length=20)),
+                ('impact', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('area_name', 'status', 'matrix', 'probability', 'impact'), name='unique_heatmap_cell')],
+            },
+        ),
+        migrations.RunPython(count_existing_risks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 6.0 on 2026-10-19 05:12
+
+from django.db import migrations, models
+
+
+# Frozen copy of risks.themes at the time of this migration: bit position ->
+# keywords. Later edits to themes must not change what the backfill writes.
+TAG_KEYWORDS = [
+    # Fraud / Financial Crime
+    (0, [
+        'fraud', 'money laundering', 'aml', 'cft', 'theft', 'identity theft',
+        'misappropriation', 'unauthorized'
+    ]),
+    # Operational Process Breakdown
+    (1, [
+        'process', 'delay', 'error', 'breakdown', 'overdue', 'documentation', 'reconciliation',
+        'processing'
+    ]),
+    # Customer / Service Impact
+    (2, ['customer', 'complaint', 'service', 'downtime', 'reputational', 'reputation']),
+    # Regulatory / Compliance Exposure
+    (3, ['regulatory', 'compliance', 'penalty', 'sanction', 'legal', 'litigation', 'breach']),
+    # Technology / Information Security
+    (4, [
+        'system', 'it', 'ict', 'data', 'privacy', 'breach', 'access', 'security', 'cyber',
+        'information leakage'
+    ]),
+    # Credit / Recovery Exposure
+    (5, ['credit', 'loan', 'recovery', 'collections', 'default']),
+    # impact:Very High
+    (6, [
+        'money laundering', 'aml', 'cft', 'sanction', 'regulatory', 'penalty', 'fraud',
+        'theft', 'misappropriation', 'terrorist financing', 'data breach', 'privacy breach',
+        'identity theft', 'loss of funds'
+    ]),
+    # impact:High
+    (7, [
+        'legal', 'contract', 'reputational', 'litigation', 'complaint to the regulator',
+        'regulatory scrutiny', 'enforcement', 'vault', 'insurance', 'cash exposure',
+        'cash vault'
+    ]),
+    # impact:Medium
+    (8, [
+        'operational', 'process', 'delay', 'reporting', 'documentation', 'control breakdown',
+        'governance', 'recommendation', 'overdue corrective'
+    ]),
+    # coordinator:Compliance Officer
+    (9, ['aml', 'cft', 'money laundering', 'sanction', 'regulatory', 'fic', 'bog']),
+    # coordinator:Fraud & Investigations Officer
+    (10, ['fraud', 'theft', 'misappropriation']),
+    # coordinator:Security Coordinator
+    (11, ['robbery']),
+    # coordinator:IT Support Lead
+    (12, ['system', 'downtime', 'alert', 'verification system']),
+    # coordinator:Treasury Coordinator
+    (13, ['liquidity', 'reserve', 'clearing', 'settlement']),
+    # coordinator:Customer Service Coordinator
+    (14, ['complaint', 'reputational']),
+    # coordinator:HR Coordinator
+    (15, ['staff', 'training', 'competency']),
+]
+TEXT_FIELDS = ["description", "caused_by", "consequences", "controls"]
+
+
+def keyword_tags(text):
+    text = text.lower()
+    mask = 0
+    for position, words in TAG_KEYWORDS:
+        if any(word in text for word in words):
+            mask |= 1 << position
+    return mask
+
+
+def tag_existing_risks(apps, schema_editor):
+    RiskAssessment = apps.get_model('risks', 'RiskAssessment')
+    by_mask = {}
+    for pk, *texts in RiskAssessment.objects.values_list('pk', *TEXT_FIELDS).iterator(chunk_size=2000):
+        mask = keyword_tags(" ".join(t or "" for t in texts))
+        if mask:
+            by_mask.setdefault(mask, []).append(pk)
+    for mask, ids in by_mask.items():
+        for start in range(0, len(ids), 500):
+            RiskAssessment.objects.filter(pk__in=ids[start:start + 500]).update(keyword_tags=mask)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('risks', '0010_heatmapcell'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='riskassessment',
+            name='keyword_tags',
+            field=models.PositiveBigIntegerField(db_index=True, default=0, editable=False, help_text='Bitmask of board themes and KRI keyword groups found in the narrative'),
+        ),
+        migrations.RunPython(tag_existing_risks, migrations.RunPython.noop),
+    ]
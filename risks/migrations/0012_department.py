@@ -0,0 +1,136 @@
+# Generated by Django 6.0 on 2026-10-19 05:15
+
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, CharField, Count, Value, When
+from django.db.models.functions import Coalesce
+
+
+# Frozen copies of risks.departments and risks.heatmap.count_cells as they
+# were when this migration was written, so later edits cannot change it.
+def normalise_area(name):
+    """Key used to match area names and aliases: lower case, single spaces."""
+    return " ".join(str(name or "").lower().split())
+
+
+def derive_owner(area_name):
+    a = (area_name or "").strip().lower()
+
+    if "microfinance" in a:
+        return "Head of Microfinance"
+    if "credit" in a:
+        return "Head of Credit"
+    if "finance" in a:
+        return "Head of Finance"
+    if a == "it" or " ict" in f" {a} " or " it " in f" {a} " or "information technology" in a:
+        return "Head of IT"
+    if "operations" in a or "teller" in a or "customer service" in a:
+        return "Head of Operations"
+    if "compliance" in a:
+        return "Compliance Officer"
+    if "audit" in a:
+        return "Internal Auditor"
+    if "treasury" in a:
+        return "Treasury Manager"
+    if "hr" in a or "human resource" in a:
+        return "Head of HR"
+    if "legal" in a:
+        return "Legal Officer"
+
+    return "Department Head"
+
+
+def derive_controls(area_name):
+    a = (area_name or "").lower()
+    if "teller" in a or "customer service" in a or "operations" in a:
+        return "Maker-checker, daily call-over, cash limits, CCTV monitoring, ID verification"
+    if "credit" in a or "microfinance" in a:
+        return "Approval workflow controls, KYC verification, monitoring visits, collections follow-up"
+    if "it" in a or "ict" in a:
+        return "Access control, system monitoring, change management, alerting, backups"
+    if "compliance" in a or "aml" in a:
+        return "Transaction monitoring, reporting controls, periodic compliance review"
+    return "Standard Controls"
+
+
+def count_cells(queryset):
+    counts = Counter()
+    rows = queryset.annotate(
+        _area=Coalesce('area_name', Value('')),
+        _status=Case(
+            When(description__startswith='[DRAFT]', then=Value('draft')),
+            default=Value('approved'),
+            output_field=CharField(),
+        ),
+    )
+    for matrix in ('inherent', 'residual'):
+        prob, impact = f'{matrix}_probability', f'{matrix}_impact'
+        for row in rows.values('_area', '_status', prob, impact).annotate(n=Count('pk')).order_by():
+            counts[(row['_area'], row['_status'], matrix, row[prob], row[impact])] += row['n']
+    return counts
+
+
+def canonicalise_areas(apps, schema_editor):
+    RiskAssessment = apps.get_model('risks', 'RiskAssessment')
+    Department = apps.get_model('risks', 'Department')
+    HeatmapCell = apps.get_model('risks', 'HeatmapCell')
+
+    # every spelling in use, grouped by its normalised form
+    spellings = {}
+    for area, rows in RiskAssessment.objects.values_list('area_name').annotate(n=Count('pk')).order_by():
+        key = normalise_area(area)
+        if key:
+            spellings.setdefault(key, Counter())[area] += rows
+
+    for variants in spellings.values():
+        # the most used spelling becomes the canonical name; the others only
+        # differ in case and spacing, which lookups ignore anyway
+        canonical = " ".join(variants.most_common(1)[0][0].split())
+        department = Department.objects.create(
+            name=canonical,
+            default_owner=derive_owner(canonical),
+            default_controls=derive_controls(canonical),
+        )
+        RiskAssessment.objects.filter(area_name__in=list(variants)).update(
+            area_name=canonical, department=department
+        )
+
+    # heatmap counters are keyed by area name
+    HeatmapCell.objects.all().delete()
+    HeatmapCell.objects.bulk_create([
+        HeatmapCell(area_name=area, status=status, matrix=matrix, probability=prob, impact=impact, count=n)
+        for (area, status, matrix, prob, impact), n in count_cells(RiskAssessment.objects.all()).items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('risks', '0011_riskassessment_keyword_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Department',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('aliases', models.TextField(blank=True, default='', help_text='Other spellings of this department, one per line')),
+                ('default_owner', models.CharField(blank=True, default='', max_length=100)),
+                ('default_coordinator', models.CharField(blank=True, default='', max_length=100)),
+                ('default_controls', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='riskassessment',
+            name='department',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='risks', to='risks.department'),
+        ),
+        migrations.RunPython(canonicalise_areas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-19 05:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('risks', '0012_department'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KRIObservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('area_name', models.CharField(blank=True, default='', max_length=100)),
+                ('kri', models.CharField(max_length=200)),
+                ('process', models.CharField(blank=True, default='', max_length=200)),
+                ('reporting_period', models.CharField(blank=True, default='', max_length=50)),
+                ('period_start', models.DateField(blank=True, help_text='First day of the reporting period, when it could be read', null=True)),
+                ('occurrence', models.FloatField(blank=True, help_text='Reported occurrences (or percentage); empty for free-text answers', null=True)),
+                ('is_percentage', models.BooleanField(default=False)),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='kri_observations', to='risks.department')),
+            ],
+            options={
+                'ordering': ['area_name', 'kri', 'period_start'],
+                'indexes': [models.Index(fields=['area_name', 'kri', 'period_start'], name='kri_obs_series_idx'), models.Index(fields=['period_start'], name='kri_obs_period_idx')],
+                'constraints': [models.UniqueConstraint(fields=('area_name', 'kri', 'reporting_period'), name='unique_kri_observation')],
+            },
+        ),
+    ]
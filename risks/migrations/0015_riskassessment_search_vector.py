@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-19 06:15
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def fill_search_vectors(apps, schema_editor):
+    # frozen copy of search.SEARCH_VECTOR as SQL
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "UPDATE risks_riskassessment SET search_vector = "
+        "setweight(to_tsvector(COALESCE(description, '')), 'A') || "
+        "setweight(to_tsvector(COALESCE(caused_by, '') || ' ' || COALESCE(consequences, '')), 'B') || "
+        "setweight(to_tsvector(COALESCE(controls, '')), 'C')"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('risks', '0014_profilerun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='riskassessment',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='riskassessment',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='risk_search_vector_gin'),
+        ),
+        migrations.RunPython(fill_search_vectors, migrations.RunPython.noop),
+    ]
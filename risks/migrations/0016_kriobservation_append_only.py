@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-19 06:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('risks', '0015_riskassessment_search_vector'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='kriobservation',
+            name='unique_kri_observation',
+        ),
+        migrations.AddIndex(
+            model_name='kriobservation',
+            index=models.Index(fields=['area_name', 'kri', 'reporting_period'], name='kri_obs_reading_idx'),
+        ),
+    ]
@@ -1,6 +1,15 @@
-from django.db import models
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import F
 from django.utils import timezone
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+
+from .departments import derive_controls, derive_owner, normalise_area
+from .themes import keyword_tags, risk_text
 
 
 class RiskAssessment(models.Model):
@@ -31,7 +40,17 @@ class RiskAssessment(models.Model):
     # --- IDENTIFICATION ---
     reference_id = models.CharField(max_length=20, unique=True, help_text="Unique ID (e.g., RISK-001)")
     area_name = models.CharField(max_length=100, blank=True, null=True, help_text="Department or Area (e.g. IT, Finance)")
+    # set from area_name on save; area_name holds the department's canonical name
+    department = models.ForeignKey(
+        'Department',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='risks'
+    )
     description = models.TextField(verbose_name="Risk Description")
+    reporting_period = models.CharField(max_length=50, blank=True, default="", help_text="KRI reporting period the risk was ingested from")
 
     # --- NEW SEPARATE FIELDS ---
     caused_by = models.TextField(verbose_name="Root Cause", blank=True, default="", help_text="What triggers this risk?")
@@ -84,7 +103,29 @@ class RiskAssessment(models.Model):
         related_name='risks_updated'
     )
 
-    def calculate_rating(self, prob, impact):
+    # --- INGEST DEDUPLICATION ---
+    fingerprint = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Hash of area, reporting period and KRI text for ingested rows"
+    )
+
+    # --- PRECOMPUTED KEYWORD TAGS (see themes.py) ---
+    keyword_tags = models.PositiveBigIntegerField(
+        default=0,
+        db_index=True,
+        editable=False,
+        help_text="Bitmask of board themes and KRI keyword groups found in the narrative"
+    )
+
+    # --- FULL-TEXT SEARCH (PostgreSQL only; see search.py) ---
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    @staticmethod
+    def calculate_rating(prob, impact):
         """Standard 5x5 Matrix Logic"""
         # 1. Critical (Red)
         if (prob == 'Very High' and impact in ['Very High', 'High', 'Medium']) or \
@@ -110,10 +151,62 @@ class RiskAssessment(models.Model):
         # 4. Sustainable (Green)
         return 'Sustainable'
 
-    def save(self, *args, **kwargs):
+    def apply_ratings(self):
+        """Fill both rating fields; also used by bulk paths that skip save()."""
         self.inherent_rating = self.calculate_rating(self.inherent_probability, self.inherent_impact)
         self.residual_rating = self.calculate_rating(self.residual_probability, self.residual_impact)
-        super().save(*args, **kwargs)
+
+    def apply_department(self):
+        """Link the department for area_name and use its canonical spelling."""
+        department = Department.objects.lookup(self.area_name)
+        self.department_id = department["id"] if department else None
+        if department:
+            self.area_name = department["name"]
+
+    def apply_keyword_tags(self):
+        """Fill keyword_tags from the narrative fields; bulk paths call this before writing."""
+        self.keyword_tags = keyword_tags(risk_text(self))
+
+    # ========= HEATMAP_CELLS_START =========
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # cells as loaded, so save() and the bulk paths can move the
+        # heatmap counters without reading the row again
+        instance._loaded_cells = instance.heatmap_cells() if HEATMAP_FIELDS.issubset(field_names) else None
+        return instance
+
+    def heatmap_cells(self):
+        """The inherent and residual HeatmapCell keys this risk counts towards."""
+        area = self.area_name or ""
+        status = "draft" if (self.description or "").startswith("[DRAFT]") else "approved"
+        return [
+            (area, status, "inherent", self.inherent_probability, self.inherent_impact),
+            (area, status, "residual", self.residual_probability, self.residual_impact),
+        ]
+
+    def _stored_cells(self):
+        if self._state.adding:
+            return []
+        if getattr(self, "_loaded_cells", None) is not None:
+            return self._loaded_cells
+        stored = type(self).objects.filter(pk=self.pk).only(*HEATMAP_FIELDS).first()
+        return stored.heatmap_cells() if stored else []
+
+    def save(self, *args, **kwargs):
+        self.apply_department()
+        self.apply_ratings()
+        self.apply_keyword_tags()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and not HEATMAP_FIELDS.intersection(update_fields):
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic():
+            old_cells = self._stored_cells()
+            super().save(*args, **kwargs)
+            HeatmapCell.objects.move(old_cells, self.heatmap_cells())
+        self._loaded_cells = self.heatmap_cells()
+    # ========= HEATMAP_CELLS_END =========
 
         # ========= AUTO_FILL_PROPERTIES_START =========
     @property
@@ -131,6 +224,218 @@ class RiskAssessment(models.Model):
     def __str__(self):
         return f"{self.reference_id} - {self.description[:30]}"
 
+    class Meta:
+        indexes = [
+            # GIN on PostgreSQL; elsewhere a plain index over an always-NULL column
+            GinIndex(fields=['search_vector'], name='risk_search_vector_gin'),
+        ]
+
+
+# Heatmap axis order used by the dashboard and snapshot matrices
+PROBABILITIES = ['Very High', 'High', 'Medium', 'Low', 'Very Low']
+IMPACTS = ['Very Low', 'Low', 'Medium', 'High', 'Very High']
+
+# fields that decide which heatmap cells a risk is counted in
+HEATMAP_FIELDS = {
+    'area_name', 'description',
+    'inherent_probability', 'inherent_impact',
+    'residual_probability', 'residual_impact',
+}
+
+
+# ========= DEPARTMENTS_START =========
+DEPARTMENT_DIRECTORY_KEY = "risks:department-directory"
+# the cache may be per process: other workers' edits show up within this long
+DEPARTMENT_DIRECTORY_TIMEOUT = 60
+
+
+class DepartmentManager(models.Manager):
+    def directory(self):
+        """
+        {normalised name or alias: department dict}, cached until a
+        department changes here or for DEPARTMENT_DIRECTORY_TIMEOUT. Not
+        cached while inside a transaction, which could still roll back a
+        department it just created.
+        """
+        directory = cache.get(DEPARTMENT_DIRECTORY_KEY)
+        if directory is not None:
+            return directory
+
+        directory = {}
+        for department in self.all():
+            entry = {
+                "id": department.pk,
+                "name": department.name,
+                "owner": department.default_owner,
+                "coordinator": department.default_coordinator,
+                "controls": department.default_controls,
+            }
+            for name in [department.name, *department.alias_list()]:
+                directory.setdefault(normalise_area(name), entry)
+        self._store(directory)
+        return directory
+
+    def _store(self, directory):
+        if not connection.in_atomic_block:
+            cache.set(DEPARTMENT_DIRECTORY_KEY, directory, DEPARTMENT_DIRECTORY_TIMEOUT)
+
+    def lookup(self, area_name, create=True):
+        """
+        The department dict for a free-text area name or alias, or None for a
+        blank name. Unknown names become a new department (seeded with the
+        legacy owner/controls rules) unless `create` is False.
+
+        A name missing from the cached directory reloads it once, since the
+        copy may predate a department or alias another worker has just saved;
+        if it is still missing the miss is remembered in the directory.
+        """
+        key = normalise_area(area_name)
+        if not key:
+            return None
+        directory = self.directory()
+        if key not in directory:
+            cache.delete(DEPARTMENT_DIRECTORY_KEY)
+            directory = self.directory()
+            if key not in directory:
+                directory[key] = None
+                self._store(directory)
+        department = directory[key]
+        if department is None and create:
+            name = " ".join(area_name.split())
+            self.get_or_create(
+                name__iexact=name,
+                defaults={
+                    "name": name,
+                    "default_owner": derive_owner(name),
+                    "default_controls": derive_controls(name),
+                },
+            )
+            # found rather than created sends no signal, so reload here too
+            cache.delete(DEPARTMENT_DIRECTORY_KEY)
+            department = self.directory().get(key)
+        return department
+
+    def canonical_name(self, area_name, create=True):
+        department = self.lookup(area_name, create=create)
+        return department["name"] if department else (area_name or "").strip()
+
+
+class Department(models.Model):
+    """
+    One department (area) of the register: its canonical name, the other
+    spellings that map to it, and the defaults used for new risks.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    aliases = models.TextField(blank=True, default="", help_text="Other spellings of this department, one per line")
+    default_owner = models.CharField(max_length=100, blank=True, default="")
+    default_coordinator = models.CharField(max_length=100, blank=True, default="")
+    default_controls = models.TextField(blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = DepartmentManager()
+
+    def alias_list(self):
+        return [line.strip() for line in self.aliases.splitlines() if line.strip()]
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        ordering = ['name']
+# ========= DEPARTMENTS_END =========
+
+
+# ========= HEATMAP_CELL_MODEL_START =========
+class HeatmapCellManager(models.Manager):
+    def apply_deltas(self, deltas):
+        """Add each delta to its cell counter, creating missing cells."""
+        for key, delta in deltas.items():
+            if not delta:
+                continue
+            cell = dict(zip(HeatmapCell.KEY_FIELDS, key))
+            if self.filter(**cell).update(count=F("count") + delta):
+                continue
+            try:
+                with transaction.atomic():
+                    self.create(count=delta, **cell)
+            except IntegrityError:
+                # created concurrently since the update above
+                self.filter(**cell).update(count=F("count") + delta)
+
+    def move(self, old_cells, new_cells):
+        """Count risks out of `old_cells` and into `new_cells` (lists of keys)."""
+        deltas = Counter(new_cells)
+        deltas.subtract(old_cells)
+        self.apply_deltas(deltas)
+
+
+class HeatmapCell(models.Model):
+    """
+    How many risks sit in one heatmap cell for an area and draft/approved
+    status. Kept in step by RiskAssessment.save(), deletes and the bulk
+    paths; `manage.py rebuild_heatmap` rebuilds or verifies it.
+    """
+    KEY_FIELDS = ("area_name", "status", "matrix", "probability", "impact")
+
+    area_name = models.CharField(max_length=100, blank=True, default="")
+    status = models.CharField(max_length=10, choices=[('draft', 'Draft'), ('approved', 'Approved')])
+    matrix = models.CharField(max_length=10, choices=[('inherent', 'Inherent'), ('residual', 'Residual')])
+    probability = models.CharField(max_length=20)
+    impact = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    objects = HeatmapCellManager()
+
+    def __str__(self):
+        return f"{self.area_name or '-'} {self.status} {self.matrix} {self.probability}/{self.impact}: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['area_name', 'status', 'matrix', 'probability', 'impact'],
+                name='unique_heatmap_cell',
+            ),
+        ]
+# ========= HEATMAP_CELL_MODEL_END =========
+
+
+# ========= KRI_OBSERVATIONS_START =========
+class KRIObservation(models.Model):
+    """
+    One reported KRI reading: the occurrence an area reported for a KRI in a
+    reporting period. Written in bulk at ingest and kept across register
+    cycles. Append-only: a corrected re-submission of the same (area, KRI,
+    period) adds a newer reading, and the trend queries use the latest one.
+    """
+    area_name = models.CharField(max_length=100, blank=True, default="")
+    department = models.ForeignKey(
+        Department,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='kri_observations'
+    )
+    kri = models.CharField(max_length=200)
+    process = models.CharField(max_length=200, blank=True, default="")
+    reporting_period = models.CharField(max_length=50, blank=True, default="")
+    period_start = models.DateField(null=True, blank=True, help_text="First day of the reporting period, when it could be read")
+    occurrence = models.FloatField(null=True, blank=True, help_text="Reported occurrences (or percentage); empty for free-text answers")
+    is_percentage = models.BooleanField(default=False)
+    recorded_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.area_name or '-'} {self.kri} {self.reporting_period}: {self.occurrence}"
+
+    class Meta:
+        ordering = ['area_name', 'kri', 'period_start']
+        indexes = [
+            models.Index(fields=['area_name', 'kri', 'period_start'], name='kri_obs_series_idx'),
+            # finds the newer readings of the same (area, KRI, period)
+            models.Index(fields=['area_name', 'kri', 'reporting_period'], name='kri_obs_reading_idx'),
+            models.Index(fields=['period_start'], name='kri_obs_period_idx'),
+        ]
+# ========= KRI_OBSERVATIONS_END =========
+
 
 # --- NEW REPORT CONFIGURATION MODEL ---
 class ReportConfiguration(models.Model):
@@ -154,3 +459,106 @@ class AISettings(models.Model):
     def __str__(self):
         return "AI Settings"
 # ========= AI_SETTINGS_END =========
+
+
+# ========= PERIOD_SNAPSHOTS_START =========
+class RegisterCycle(models.Model):
+    """One closed risk cycle (written just before the register is cleared)."""
+    label = models.CharField(max_length=50, help_text="Reporting period, or the close date if none was recorded")
+    closed_at = models.DateTimeField(default=timezone.now)
+    closed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='closed_cycles'
+    )
+    total = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.label} ({self.closed_at:%Y-%m-%d})"
+
+    class Meta:
+        ordering = ['-closed_at']
+
+
+class PeriodSnapshot(models.Model):
+    """Pre-aggregated heatmap and rating distribution for one area/status of a closed cycle."""
+    STATUS_CHOICES = [
+        ('approved', 'Approved'),
+        ('draft', 'Draft'),
+    ]
+
+    cycle = models.ForeignKey(RegisterCycle, on_delete=models.CASCADE, related_name='snapshots')
+    area_name = models.CharField(max_length=100, blank=True, default="")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    total = models.PositiveIntegerField(default=0)
+
+    inherent_critical = models.PositiveIntegerField(default=0)
+    inherent_severe = models.PositiveIntegerField(default=0)
+    inherent_moderate = models.PositiveIntegerField(default=0)
+    inherent_sustainable = models.PositiveIntegerField(default=0)
+    residual_critical = models.PositiveIntegerField(default=0)
+    residual_severe = models.PositiveIntegerField(default=0)
+    residual_moderate = models.PositiveIntegerField(default=0)
+    residual_sustainable = models.PositiveIntegerField(default=0)
+
+    improved = models.PositiveIntegerField(default=0)
+    unchanged = models.PositiveIntegerField(default=0)
+    worsened = models.PositiveIntegerField(default=0)
+
+    # {probability: {impact: count}}, same shape as the dashboard matrices
+    inherent_matrix = models.JSONField(default=dict)
+    residual_matrix = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"{self.cycle.label} - {self.area_name or 'UNSPECIFIED'} ({self.status})"
+
+    class Meta:
+        unique_together = [('cycle', 'area_name', 'status')]
+# ========= PERIOD_SNAPSHOTS_END =========
+
+
+# ========= REPORT_SNAPSHOTS_START =========
+class ReportSnapshot(models.Model):
+    """Pre-rendered official report body for one version of the register and executive summary."""
+    version = models.CharField(max_length=64, unique=True, help_text="Hash of the register state and executive summary")
+    executive_summary = models.TextField(blank=True, default="")
+    rows_html = models.BinaryField(help_text="zlib-compressed report table rows")
+    row_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Report {self.version[:12]} ({self.row_count} risks)"
+
+    class Meta:
+        ordering = ['-created_at']
+# ========= REPORT_SNAPSHOTS_END =========
+
+
+# ========= PROFILE_RUNS_START =========
+class ProfileRun(models.Model):
+    """One cProfile trace of a single request, taken on demand with ?_profile (superusers only)."""
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500, help_text="Request path and query string")
+    view_name = models.CharField(max_length=200, blank=True, default="")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='profile_runs'
+    )
+    status_code = models.PositiveSmallIntegerField(default=0)
+    duration_ms = models.FloatField(default=0, help_text="Wall time of the view, body included, while profiled")
+    query_count = models.PositiveIntegerField(default=0)
+    total_calls = models.PositiveIntegerField(default=0)
+    stats = models.BinaryField(help_text="zlib-compressed pstats dump")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+    class Meta:
+        ordering = ['-created_at']
+# ========= PROFILE_RUNS_END =========
@@ -0,0 +1,151 @@
+"""
+KRI observation history.
+
+Every ingested KRI line is kept as a KRIObservation (area, KRI, reporting
+period -> occurrence), including the zero readings that never become risks,
+and survives the end-of-cycle purge. Readings are never overwritten: a
+corrected re-submission is appended, and the queries below only use the
+latest reading of each (area, KRI, period). The series queries read the
+(area_name, kri, period_start) index, so a trailing-quarters trend is one
+grouped query however long the history gets.
+"""
+import datetime
+
+from django.db.models import Count, Exists, OuterRef, Sum
+from django.db.models.functions import TruncQuarter
+from django.utils import timezone
+
+from .kri import likelihood_from_occurrence
+from .models import Department, KRIObservation
+
+
+OBSERVATION_BATCH_SIZE = 500
+# what makes a re-submitted reading different from the stored one
+READING_FIELDS = ["department_id", "process", "period_start", "occurrence", "is_percentage"]
+TREND_QUARTERS = 4
+
+
+def record_kri_observations(observations, departments=None):
+    """
+    Bulk-append observation dicts (kri.kri_observation). Areas are stored
+    under their department's canonical name. A reading identical to the
+    latest one for its area, KRI and period is not appended again.
+    `departments` is an optional {area spelling: Department.lookup() result}
+    memo. Returns the number of observations written.
+    """
+    departments = {} if departments is None else departments
+    kri_length = KRIObservation._meta.get_field("kri").max_length
+    process_length = KRIObservation._meta.get_field("process").max_length
+    now = timezone.now()
+
+    latest = {}
+    for observation in observations:
+        kri = (observation.get("kri") or "").strip()[:kri_length]
+        if not kri:
+            continue
+        area = observation.get("area_name") or ""
+        if area not in departments:
+            departments[area] = Department.objects.lookup(area)
+        department = departments[area]
+        record = KRIObservation(
+            area_name=department["name"] if department else area,
+            department_id=department["id"] if department else None,
+            kri=kri,
+            process=(observation.get("process") or "")[:process_length],
+            reporting_period=observation.get("reporting_period") or "",
+            period_start=observation.get("period_start"),
+            occurrence=observation.get("occurrence"),
+            is_percentage=observation.get("is_percentage", False),
+            recorded_at=now,
+        )
+        # the same KRI twice in one report: the later line wins
+        latest[(record.area_name, record.kri, record.reporting_period)] = record
+
+    if not latest:
+        return 0
+
+    stored = {}
+    for row in current_observations().filter(
+        area_name__in={key[0] for key in latest}, kri__in={key[1] for key in latest}
+    ).values("area_name", "kri", "reporting_period", *READING_FIELDS):
+        stored[(row["area_name"], row["kri"], row["reporting_period"])] = tuple(row[f] for f in READING_FIELDS)
+
+    new = [
+        record for key, record in latest.items()
+        if stored.get(key) != tuple(getattr(record, f) for f in READING_FIELDS)
+    ]
+    KRIObservation.objects.bulk_create(new, batch_size=OBSERVATION_BATCH_SIZE)
+    return len(new)
+
+
+def current_observations(queryset=None):
+    """`queryset` (default: all) without the readings a later re-submission superseded."""
+    if queryset is None:
+        queryset = KRIObservation.objects.all()
+    newer = KRIObservation.objects.filter(
+        area_name=OuterRef("area_name"),
+        kri=OuterRef("kri"),
+        reporting_period=OuterRef("reporting_period"),
+        pk__gt=OuterRef("pk"),
+    )
+    return queryset.filter(~Exists(newer))
+
+
+def observations_between(start, end, area_name=None, kri=None):
+    """Current observations whose period starts in [start, end), oldest first."""
+    queryset = current_observations().filter(period_start__gte=start, period_start__lt=end)
+    if area_name is not None:
+        queryset = queryset.filter(area_name=area_name)
+    if kri is not None:
+        queryset = queryset.filter(kri=kri)
+    return queryset.order_by("area_name", "kri", "period_start")
+
+
+def quarter_start(day):
+    return datetime.date(day.year, 3 * ((day.month - 1) // 3) + 1, 1)
+
+
+def _add_quarters(day, quarters):
+    months = day.year * 12 + day.month - 1 + 3 * quarters
+    return datetime.date(months // 12, months % 12 + 1, 1)
+
+
+def trailing_quarters(area_name, as_of=None, quarters=TREND_QUARTERS, kris=None):
+    """
+    {kri: [value per quarter, oldest first]} for the `quarters` quarters up
+    to and including the one holding `as_of` (default today). A quarter's
+    value is the summed occurrences (averaged for percentage KRIs), None
+    when nothing numeric was reported.
+    """
+    last = quarter_start(as_of or timezone.localdate())
+    first = _add_quarters(last, -(quarters - 1))
+    starts = [_add_quarters(first, n) for n in range(quarters)]
+
+    rows = observations_between(first, _add_quarters(last, 1), area_name=area_name)
+    if kris is not None:
+        rows = rows.filter(kri__in=list(kris))
+    rows = (
+        rows.values("kri", "is_percentage", quarter=TruncQuarter("period_start"))
+        .annotate(total=Sum("occurrence"), readings=Count("occurrence"))
+        .order_by()
+    )
+
+    series = {}
+    for row in rows:
+        if not row["readings"]:
+            continue
+        values = series.setdefault(row["kri"], dict.fromkeys(starts))
+        value = row["total"] / row["readings"] if row["is_percentage"] else row["total"]
+        values[row["quarter"]] = value
+    return {kri: [values[start] for start in starts] for kri, values in series.items()}
+
+
+def trend_probability(values, is_percentage=False):
+    """Probability level for the average of the reported quarters, or None."""
+    reported = [value for value in values if value is not None]
+    if not reported:
+        return None
+    average = sum(reported) / len(reported)
+    if is_percentage:
+        return likelihood_from_occurrence(f"{average}%")
+    return likelihood_from_occurrence(str(round(average)))
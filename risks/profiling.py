@@ -0,0 +1,145 @@
+"""
+On-demand request profiling for superusers.
+
+Adding `_profile` to any URL (e.g. /board-explanation/?_profile=1, or the
+action URL of the KRI save form) runs that one view under cProfile. The
+trace is stored as a ProfileRun and the response carries an
+X-Profile-Run header pointing at its ranked summary under /profiles/.
+A streamed body is produced inside the profiler too, so the report and
+export generators show up in the trace.
+
+Async views (the ASGI profile) are driven to completion with async_to_sync
+under the profiler. From Python 3.12 cProfile records every thread, so
+the event-loop work is included, along with anything else the server is
+doing at that moment. Only one profile runs at a time; a second ?_profile
+request that arrives meanwhile is served normally.
+
+When the parameter is absent the middleware does one substring test on
+the raw query string and nothing else: it never parses the query, loads
+the user or touches the database.
+"""
+import cProfile
+import marshal
+import pstats
+import threading
+import time
+import zlib
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.urls import reverse
+from django.utils.deprecation import MiddlewareMixin
+
+from .models import ProfileRun
+
+
+PROFILE_PARAM = "_profile"
+
+# cProfile allows one active profiler per process (3.12+)
+_profiling = threading.Lock()
+
+
+def keep_runs():
+    return getattr(settings, "RISKS_PROFILE_KEEP", 50)
+
+
+def wants_profile(request):
+    if PROFILE_PARAM not in request.META.get("QUERY_STRING", ""):
+        return False
+    return PROFILE_PARAM in request.GET and request.user.is_superuser
+
+
+def view_label(view_func):
+    view_func = getattr(view_func, "view_class", view_func)
+    return f"{view_func.__module__}.{getattr(view_func, '__qualname__', view_func.__name__)}"
+
+
+@async_to_sync
+async def _collect(streaming_content):
+    return [chunk async for chunk in streaming_content]
+
+
+async def _replay(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def load_stats(run):
+    """
+    A run's pstats data, the dict Stats.dump_stats marshals:
+    {(file, line, function): (primitive calls, calls, tottime, cumtime, callers)}.
+    """
+    return marshal.loads(zlib.decompress(bytes(run.stats)))
+
+
+def hot_functions(stats, sort="tottime", limit=40, app_only=False):
+    """The `limit` most expensive functions, ranked by own ("tottime") or cumulative ("cumtime") time."""
+    total = sum(tottime for _cc, _nc, tottime, _ct, _callers in stats.values()) or 1
+    app_dir = str(settings.BASE_DIR)
+    rows = []
+    for (filename, line, function), (prim_calls, calls, tottime, cumtime, _callers) in stats.items():
+        if app_only and (not filename.startswith(app_dir) or "site-packages" in filename):
+            continue
+        rows.append({
+            "function": function,
+            "location": f"{filename.removeprefix(app_dir + '/')}:{line}" if line else filename,
+            "calls": f"{calls}/{prim_calls}" if calls != prim_calls else str(calls),
+            "tottime_ms": tottime * 1000,
+            "cumtime_ms": cumtime * 1000,
+            "percall_ms": cumtime * 1000 / calls if calls else 0,
+            "share": 100 * tottime / total,
+        })
+    key = "cumtime_ms" if sort == "cumtime" else "tottime_ms"
+    rows.sort(key=lambda row: row[key], reverse=True)
+    return rows[:limit]
+
+
+class ProfilingMiddleware(MiddlewareMixin):
+    """Runs the view under cProfile when a superuser asks for ?_profile; goes last in MIDDLEWARE."""
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not wants_profile(request) or not _profiling.acquire(blocking=False):
+            return None
+        try:
+            return self.profile_view(request, view_func, view_args, view_kwargs)
+        finally:
+            _profiling.release()
+
+    def profile_view(self, request, view_func, view_args, view_kwargs):
+        view = async_to_sync(view_func) if iscoroutinefunction(view_func) else view_func
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            response = profiler.runcall(view, request, *view_args, **view_kwargs)
+            # render a streamed body now, inside the profiler, and hand the chunks on
+            if response.streaming and response.is_async:
+                response.streaming_content = _replay(profiler.runcall(_collect, response.streaming_content))
+            elif response.streaming:
+                response.streaming_content = profiler.runcall(list, response.streaming_content)
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        stats = pstats.Stats(profiler)
+        # stored in pstats' own file format, so a download opens in pstats or snakeviz
+        run = ProfileRun.objects.create(
+            method=request.method,
+            path=request.get_full_path()[:500],
+            view_name=view_label(view_func)[:200],
+            user=request.user,
+            status_code=response.status_code,
+            duration_ms=duration_ms,
+            query_count=len(queries),
+            total_calls=stats.total_calls,
+            stats=zlib.compress(marshal.dumps(stats.stats)),
+        )
+        stale = ProfileRun.objects.order_by("-created_at", "-pk").values_list("pk", flat=True)[keep_runs():]
+        ProfileRun.objects.filter(pk__in=list(stale)).delete()
+
+        response.headers["X-Profile-Run"] = reverse("profile-run", args=[run.pk])
+        return response
@@ -0,0 +1,72 @@
+"""
+Clearing the register at the end of a cycle.
+
+close_register_cycle() keeps the trend snapshot and the archive, then
+purge_register() deletes the rows in bounded primary-key ranges: one short
+transaction per chunk, raw DELETEs with no Python-side collection, so
+readers only ever wait for a single chunk. Each chunk takes its rows out
+of the heatmap counters and announces its id range (risks_purged), so
+risks added while a purge runs keep their cells and their search entries.
+"""
+from django.db import connection, transaction
+
+from .archive import write_register_archive
+from .heatmap import uncount_risks
+from .models import RiskAssessment
+from .signals import risks_purged
+from .snapshots import snapshot_register
+
+
+PURGE_CHUNK_SIZE = 5000
+
+
+def close_register_cycle(user):
+    """Keep trend snapshots and a server-side archive before the register is wiped."""
+    cycle = snapshot_register(user)
+    if cycle:
+        write_register_archive(cycle.label, cycle.closed_at)
+    return cycle
+
+
+def purge_register(chunk_size=PURGE_CHUNK_SIZE, progress=None, up_to_id=None):
+    """
+    Delete every risk that exists when the purge starts, or with `up_to_id`
+    only the risks with ids up to it (those a caller has exported). Rows are removed
+    `chunk_size` at a time by id range, each range in its own transaction;
+    `progress(deleted, total)` is called after every chunk. Returns the
+    number of rows deleted.
+    """
+    table = RiskAssessment._meta.db_table
+
+    with connection.cursor() as cursor:
+        if up_to_id is None:
+            cursor.execute(f"SELECT count(*), max(id) FROM {table}")
+        else:
+            cursor.execute(f"SELECT count(*), max(id) FROM {table} WHERE id <= %s", [up_to_id])
+        total, last_id = cursor.fetchone()
+    if not total:
+        return 0
+
+    deleted = 0
+    lower = 0
+    while lower < last_id:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                # upper bound of the next chunk_size rows, so gaps in the id
+                # sequence never produce oversized or empty chunks
+                cursor.execute(
+                    f"SELECT id FROM {table} WHERE id > %s AND id <= %s "
+                    f"ORDER BY id LIMIT 1 OFFSET %s",
+                    [lower, last_id, chunk_size - 1],
+                )
+                row = cursor.fetchone()
+                upper = row[0] if row else last_id
+                uncount_risks(RiskAssessment.objects.filter(pk__gt=lower, pk__lte=upper))
+                cursor.execute(f"DELETE FROM {table} WHERE id > %s AND id <= %s", [lower, upper])
+                deleted += cursor.rowcount
+            risks_purged.send(sender=RiskAssessment, first_id=lower + 1, last_id=upper)
+        lower = upper
+        if progress:
+            progress(deleted, total)
+    return deleted
+
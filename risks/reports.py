@@ -0,0 +1,151 @@
+"""
+Official report snapshots and streaming.
+
+The report body (the risk table rows) only changes when the register or the
+executive summary does, so it is rendered once per version and stored
+compressed in ReportSnapshot. Page views render the small per-user shell
+around the stored rows.
+
+When no snapshot exists yet, the report is streamed: rows are read in
+(area_name, reference_id) order, area headings are emitted whenever the
+area changes, and the HTML goes to the client chunk by chunk while being
+compressed into the new snapshot.
+"""
+import hashlib
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import ReportSnapshot, RiskAssessment
+
+
+SNAPSHOTS_KEPT = 10
+ROWS_MARKER = "<!-- REPORT_ROWS -->"
+STREAM_CHUNK_ROWS = 200
+
+
+def report_version(config):
+    """Hash of everything the report body depends on: register state + executive summary."""
+    state = RiskAssessment.objects.aggregate(
+        rows=Count("pk"), last_id=Max("pk"), last_change=Max("updated_at")
+    )
+    raw = "|".join([
+        str(state["rows"]),
+        str(state["last_id"] or 0),
+        state["last_change"].isoformat() if state["last_change"] else "",
+        config.executive_summary or "",
+    ])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def report_shell(request, context):
+    """Render the page around the rows; returns (head, tail) split at the rows."""
+    html = render_to_string("admin/official_report.html", {**context, "report_rows": mark_safe(ROWS_MARKER)}, request)
+    head, tail = html.split(ROWS_MARKER, 1)
+    return head, tail
+
+
+def snapshot_rows(snapshot):
+    return mark_safe(zlib.decompress(bytes(snapshot.rows_html)).decode("utf-8"))
+
+
+# ========= REPORT_STREAM_START =========
+def report_queryset():
+    return RiskAssessment.objects.all().order_by("area_name", "reference_id")
+
+
+class ReportRowRenderer:
+    """
+    Renders risks arriving in (area_name, reference_id) order, emitting an
+    area heading whenever the area changes. Holds one row at a time.
+    """
+
+    def __init__(self):
+        self.heading_template = get_template("admin/official_report_area.html")
+        self.row_template = get_template("admin/official_report_row.html")
+        self.current_area = None
+        self.rows = 0
+
+    def feed(self, risk):
+        parts = []
+        area = risk.area_name or "UNSPECIFIED"
+        if area != self.current_area:
+            self.current_area = area
+            parts.append(self.heading_template.render({"dept": area}))
+        parts.append(self.row_template.render({"risk": risk}))
+        self.rows += 1
+        return "".join(parts)
+
+    def close(self):
+        if not self.rows:
+            return self.row_template.render({"risk": None})
+        return ""
+
+
+class SnapshotWriter:
+    """Compresses the streamed rows and stores them as the snapshot for `version`."""
+
+    def __init__(self, version, executive_summary):
+        self.version = version
+        self.executive_summary = executive_summary
+        self.compressor = zlib.compressobj(6)
+        self.compressed = []
+
+    def write(self, html):
+        self.compressed.append(self.compressor.compress(html.encode("utf-8")))
+        return html
+
+    def save(self, row_count):
+        self.compressed.append(self.compressor.flush())
+        try:
+            with transaction.atomic():
+                ReportSnapshot.objects.create(
+                    version=self.version,
+                    executive_summary=self.executive_summary,
+                    rows_html=b"".join(self.compressed),
+                    row_count=row_count,
+                )
+        except IntegrityError:
+            # another request rendered the same version first
+            return
+        stale = ReportSnapshot.objects.values_list("pk", flat=True)[SNAPSHOTS_KEPT:]
+        ReportSnapshot.objects.filter(pk__in=list(stale)).delete()
+
+
+def stream_report(head, tail, version, executive_summary):
+    """Yield the report page, reading rows lazily and saving the snapshot at the end."""
+    yield head
+    renderer = ReportRowRenderer()
+    writer = SnapshotWriter(version, executive_summary)
+    chunk = []
+    for risk in report_queryset().iterator(chunk_size=1000):
+        chunk.append(renderer.feed(risk))
+        if len(chunk) >= STREAM_CHUNK_ROWS:
+            yield writer.write("".join(chunk))
+            chunk = []
+    chunk.append(renderer.close())
+    yield writer.write("".join(chunk))
+    yield tail
+    writer.save(renderer.rows)
+
+
+async def astream_report(head, tail, version, executive_summary):
+    """Async twin of stream_report for the ASGI views."""
+    yield head
+    renderer = ReportRowRenderer()
+    writer = SnapshotWriter(version, executive_summary)
+    chunk = []
+    async for risk in report_queryset().aiterator(chunk_size=1000):
+        chunk.append(renderer.feed(risk))
+        if len(chunk) >= STREAM_CHUNK_ROWS:
+            yield writer.write("".join(chunk))
+            chunk = []
+    chunk.append(renderer.close())
+    yield writer.write("".join(chunk))
+    yield tail
+    await sync_to_async(writer.save)(renderer.rows)
+# ========= REPORT_STREAM_END =========
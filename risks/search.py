@@ -0,0 +1,212 @@
+"""
+Full-text search over risk narratives.
+
+On SQLite the register is mirrored into an FTS5 table (rowid = risk id)
+holding description, caused_by, consequences and controls. The table is
+kept in step by the receivers in signals.py: post_save/post_delete for
+single rows and the `risks_bulk_changed` / `risks_purged` signals for
+bulk writes that bypass the model signals.
+
+On PostgreSQL the same fields are stored as a weighted tsvector in
+RiskAssessment.search_vector (GIN-indexed), refreshed by the same
+receivers. Other backends have no index behind search: they fall back to
+icontains.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+from .models import RiskAssessment
+
+
+FTS_TABLE = "risks_riskassessment_fts"
+INDEXED_FIELDS = ["description", "caused_by", "consequences", "controls"]
+# bm25 column weights, same order as INDEXED_FIELDS
+FTS_WEIGHTS = (4.0, 2.0, 2.0, 1.0)
+CHUNK_SIZE = 500
+
+# PostgreSQL: description weighs most, controls least, as in FTS_WEIGHTS
+SEARCH_VECTOR = (
+    SearchVector("description", weight="A")
+    + SearchVector("caused_by", "consequences", weight="B")
+    + SearchVector("controls", weight="C")
+)
+# SearchRank weights in D, C, B, A order: FTS_WEIGHTS scaled to A = 1
+RANK_WEIGHTS = [0.1, 0.25, 0.5, 1.0]
+
+
+# ========= FTS_INDEX_START =========
+def create_index(cursor):
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        f"USING fts5({', '.join(INDEXED_FIELDS)}, tokenize='porter unicode61')"
+    )
+
+
+def fts_enabled():
+    # the FTS5 mirror is created by migration 0008 on every SQLite database
+    return connection.vendor == "sqlite"
+
+
+def vector_enabled():
+    return connection.vendor == "postgresql"
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def index_risks(ids):
+    """(Re)index the given risk ids from the live table."""
+    if vector_enabled():
+        for chunk in _chunks(ids):
+            # update() sends no post_save, so this does not re-enter the receivers
+            RiskAssessment.objects.filter(pk__in=chunk).update(search_vector=SEARCH_VECTOR)
+        return
+    if not fts_enabled():
+        return
+    table = RiskAssessment._meta.db_table
+    columns = ", ".join(INDEXED_FIELDS)
+    with connection.cursor() as cursor:
+        for chunk in _chunks(ids):
+            marks = ", ".join(["%s"] * len(chunk))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({marks})", chunk)
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, {columns}) "
+                f"SELECT id, {columns} FROM {table} WHERE id IN ({marks})",
+                chunk,
+            )
+
+
+def remove_risks(ids):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(ids):
+            marks = ", ".join(["%s"] * len(chunk))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({marks})", chunk)
+
+
+def remove_range(first_id, last_id):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid >= %s AND rowid <= %s", [first_id, last_id])
+
+
+def rebuild_index():
+    """Drop every indexed row and re-read the whole register."""
+    if vector_enabled():
+        RiskAssessment.objects.update(search_vector=SEARCH_VECTOR)
+        return
+    if not fts_enabled():
+        return
+    table = RiskAssessment._meta.db_table
+    columns = ", ".join(INDEXED_FIELDS)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, {columns}) SELECT id, {columns} FROM {table}"
+        )
+# ========= FTS_INDEX_END =========
+
+
+# ========= SEARCH_START =========
+def search_terms(query):
+    return re.findall(r"\w+", query or "")
+
+
+def fts_expression(query):
+    """
+    Turn free text into a safe FTS5 MATCH expression: every word quoted and
+    prefix-matched, all words required. Returns "" when there is nothing to search.
+    """
+    return " ".join(f'"{term}"*' for term in search_terms(query))
+
+
+def tsquery(query):
+    """
+    PostgreSQL counterpart of fts_expression: every word prefix-matched and
+    required. search_terms() only yields word characters, so the raw tsquery
+    needs no escaping.
+    """
+    return SearchQuery(" & ".join(f"{term}:*" for term in search_terms(query)), search_type="raw")
+
+
+def _fallback_q(query):
+    condition = Q()
+    for term in search_terms(query):
+        term_q = Q()
+        for field in INDEXED_FIELDS:
+            term_q |= Q(**{f"{field}__icontains": term})
+        condition &= term_q
+    return condition
+
+
+def filter_matching(queryset, query):
+    """Restrict `queryset` to risks matching `query`, keeping its ordering."""
+    if not search_terms(query):
+        return queryset
+
+    if fts_enabled():
+        return queryset.filter(pk__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [fts_expression(query)]
+        ))
+
+    if vector_enabled():
+        return queryset.filter(search_vector=tsquery(query))
+
+    return queryset.filter(_fallback_q(query))
+
+
+def search_risks(query, queryset=None, limit=50):
+    """
+    Ranked search. Returns a list of RiskAssessment objects, best match
+    first, each with a `search_rank` attribute (higher is better).
+    """
+    if queryset is None:
+        queryset = RiskAssessment.objects.all()
+    if not search_terms(query):
+        return []
+
+    if fts_enabled():
+        weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+        # any filters already applied to `queryset` (area, status) join the
+        # MATCH, so only the top `limit` allowed matches leave the database
+        allowed_sql, allowed_params = queryset.order_by().values("pk").query.sql_with_params()
+        with connection.cursor() as cursor:
+            # bm25() is lower-is-better
+            cursor.execute(
+                f"SELECT rowid, -bm25({FTS_TABLE}, {weights}) AS rank FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid IN ({allowed_sql}) "
+                f"ORDER BY rank DESC LIMIT %s",
+                [fts_expression(query), *allowed_params, limit],
+            )
+            top = cursor.fetchall()
+
+        found = queryset.in_bulk([pk for pk, _rank in top])
+        results = []
+        for pk, rank in top:
+            risk = found[pk]
+            risk.search_rank = rank
+            results.append(risk)
+        return results
+
+    if vector_enabled():
+        search_query = tsquery(query)
+        return list(
+            queryset.filter(search_vector=search_query)
+            .annotate(search_rank=SearchRank(F("search_vector"), search_query, weights=RANK_WEIGHTS))
+            .order_by("-search_rank", "reference_id")[:limit]
+        )
+
+    results = list(queryset.filter(_fallback_q(query)).order_by("reference_id")[:limit])
+    for risk in results:
+        risk.search_rank = 0
+    return results
+# ========= SEARCH_END =========
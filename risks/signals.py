@@ -0,0 +1,91 @@
+"""
+Register change signals.
+
+Model post_save/post_delete only cover row-at-a-time writes. Code paths that
+write through bulk_create/bulk_update/update() or raw deletes send one of
+the signals below instead, so listeners (the search index, cached admin
+counts, live dashboards, ...) can catch up.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from . import live, search
+from .auth import invalidate_auth_cache
+from .counts import invalidate_register_counts
+from .models import DEPARTMENT_DIRECTORY_KEY, Department, HeatmapCell, RiskAssessment
+
+
+# sent with ids=[...] after rows were inserted or updated in bulk
+risks_bulk_changed = Signal()
+# sent with first_id/last_id after a raw DELETE of that id range (register purge)
+risks_purged = Signal()
+
+
+@receiver(post_save, sender=RiskAssessment)
+def index_saved_risk(sender, instance, **kwargs):
+    search.index_risks([instance.pk])
+
+
+@receiver(post_delete, sender=RiskAssessment)
+def unindex_deleted_risk(sender, instance, **kwargs):
+    search.remove_risks([instance.pk])
+
+
+@receiver(risks_bulk_changed)
+def index_bulk_changes(sender, ids, **kwargs):
+    search.index_risks(ids)
+
+
+@receiver(risks_purged)
+def unindex_purged_risks(sender, first_id, last_id, **kwargs):
+    search.remove_range(first_id, last_id)
+
+
+@receiver(post_delete, sender=RiskAssessment)
+def uncount_deleted_risk(sender, instance, **kwargs):
+    # save() maintains the heatmap counters itself; deletes land here
+    cells = getattr(instance, "_loaded_cells", None) or instance.heatmap_cells()
+    HeatmapCell.objects.move(cells, [])
+
+
+@receiver([post_save, post_delete], sender=RiskAssessment)
+@receiver([risks_bulk_changed, risks_purged])
+def expire_register_counts(sender, **kwargs):
+    invalidate_register_counts()
+
+
+@receiver([post_save, post_delete], sender=RiskAssessment)
+@receiver([risks_bulk_changed, risks_purged])
+def wake_live_dashboards(sender, **kwargs):
+    # after commit, so the streams recount what was actually written
+    transaction.on_commit(live.hub.notify)
+
+
+def _expire_department_directory():
+    cache.delete(DEPARTMENT_DIRECTORY_KEY)
+
+
+@receiver([post_save, post_delete], sender=Department)
+def expire_department_directory(sender, **kwargs):
+    # now for this connection, and again once committed for everyone else
+    _expire_department_directory()
+    transaction.on_commit(_expire_department_directory)
+
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=Group)
+@receiver([post_save, post_delete], sender=Permission)
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def expire_cached_auth(sender, **kwargs):
+    # same pattern as the department directory: now, and again after commit
+    invalidate_auth_cache()
+    transaction.on_commit(invalidate_auth_cache)
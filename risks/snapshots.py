@@ -0,0 +1,141 @@
+from django.db import transaction
+from django.db.models import BooleanField, Case, Count, Sum, Value, When
+from django.utils import timezone
+
+from .models import IMPACTS, PROBABILITIES, PeriodSnapshot, RegisterCycle, RiskAssessment
+
+
+RATINGS = ["Critical", "Severe", "Moderate", "Sustainable"]
+RATING_SCALE = {"Sustainable": 1, "Moderate": 2, "Severe": 3, "Critical": 4}
+
+
+# ========= CLOSE_CYCLE_SNAPSHOT_START =========
+def _cycle_label():
+    top = (
+        RiskAssessment.objects.exclude(reporting_period="")
+        .values("reporting_period")
+        .annotate(n=Count("id"))
+        .order_by("-n", "reporting_period")
+        .first()
+    )
+    if top:
+        return top["reporting_period"]
+    return timezone.localdate().isoformat()
+
+
+def _empty_snapshot():
+    return {
+        "total": 0,
+        "improved": 0,
+        "unchanged": 0,
+        "worsened": 0,
+        "inherent_matrix": {p: {i: 0 for i in IMPACTS} for p in PROBABILITIES},
+        "residual_matrix": {p: {i: 0 for i in IMPACTS} for p in PROBABILITIES},
+        **{f"inherent_{r.lower()}": 0 for r in RATINGS},
+        **{f"residual_{r.lower()}": 0 for r in RATINGS},
+    }
+
+
+def snapshot_register(user=None):
+    """
+    Store the current register as pre-aggregated counts per area and status,
+    so trends survive the end-of-cycle clear. Returns the RegisterCycle, or
+    None when the register is empty.
+    """
+    groups = (
+        RiskAssessment.objects
+        .annotate(is_draft=Case(
+            When(description__startswith="[DRAFT]", then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ))
+        .values(
+            "area_name", "is_draft",
+            "inherent_probability", "inherent_impact",
+            "residual_probability", "residual_impact",
+        )
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+
+    aggregates = {}
+    for g in groups:
+        key = (g["area_name"] or "", "draft" if g["is_draft"] else "approved")
+        agg = aggregates.setdefault(key, _empty_snapshot())
+        n = g["n"]
+
+        ip, ii = g["inherent_probability"], g["inherent_impact"]
+        rp, ri = g["residual_probability"], g["residual_impact"]
+        inherent = RiskAssessment.calculate_rating(ip, ii)
+        residual = RiskAssessment.calculate_rating(rp, ri)
+
+        agg["total"] += n
+        agg[f"inherent_{inherent.lower()}"] += n
+        agg[f"residual_{residual.lower()}"] += n
+        if ip in agg["inherent_matrix"] and ii in IMPACTS:
+            agg["inherent_matrix"][ip][ii] += n
+        if rp in agg["residual_matrix"] and ri in IMPACTS:
+            agg["residual_matrix"][rp][ri] += n
+
+        before, after = RATING_SCALE[inherent], RATING_SCALE[residual]
+        if after < before:
+            agg["improved"] += n
+        elif after == before:
+            agg["unchanged"] += n
+        else:
+            agg["worsened"] += n
+
+    if not aggregates:
+        return None
+
+    with transaction.atomic():
+        cycle = RegisterCycle.objects.create(
+            label=_cycle_label(),
+            closed_by=user,
+            total=sum(agg["total"] for agg in aggregates.values()),
+        )
+        PeriodSnapshot.objects.bulk_create([
+            PeriodSnapshot(cycle=cycle, area_name=area_name, status=status, **agg)
+            for (area_name, status), agg in aggregates.items()
+        ])
+    return cycle
+# ========= CLOSE_CYCLE_SNAPSHOT_END =========
+
+
+# ========= PERIOD_TRENDS_START =========
+TREND_FIELDS = [
+    "total",
+    "inherent_critical", "inherent_severe",
+    "residual_critical", "residual_severe",
+    "improved", "worsened",
+]
+
+
+def period_trends(selected_area="", filter_type="all", limit=6):
+    """
+    Period-over-period totals for the last `limit` closed cycles, oldest
+    first, read only from the snapshot tables. Each row carries a
+    `<field>_delta` against the previous cycle (None for the first one).
+    """
+    snapshots = PeriodSnapshot.objects.all()
+    if selected_area:
+        snapshots = snapshots.filter(area_name=selected_area)
+    if filter_type in ("draft", "approved"):
+        snapshots = snapshots.filter(status=filter_type)
+
+    rows = list(
+        snapshots.values("cycle_id", "cycle__label", "cycle__closed_at")
+        .annotate(**{f: Sum(f) for f in TREND_FIELDS})
+        .order_by("-cycle__closed_at")[:limit]
+    )
+    rows.reverse()
+
+    previous = None
+    for row in rows:
+        row["label"] = row.pop("cycle__label")
+        row["closed_at"] = row.pop("cycle__closed_at")
+        for f in TREND_FIELDS:
+            row[f"{f}_delta"] = row[f] - previous[f] if previous else None
+        previous = row
+    return rows
+# ========= PERIOD_TRENDS_END =========
@@ -1,3 +1,1070 @@
-from django.test import TestCase
+import base64
+import gzip
+import io
+import datetime
+import json
+import marshal
+import os
+import re
+import sys
+import tempfile
+import time
+import zipfile
+from unittest import mock, skipIf
+from xml.etree import ElementTree
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import api, async_views, compression, ingest, live
+from .auth import check_auth_cache
+from .bulk import set_field, upsert_risk_records
+from .compression import CompressionMiddleware, choose_encoding
+from .conditional import register_fingerprint, register_state
+from .heatmap import heatmap_matrices, rebuild_heatmap, verify_heatmap
+from .ingest import upsert_ingested_risks
+from .kri import parse_kri_report
+from .models import DEPARTMENT_DIRECTORY_KEY, Department, KRIObservation, ProfileRun, ReportSnapshot, RiskAssessment
+from .purge import purge_register
+from .observations import trailing_quarters
+from .search import filter_matching, fts_enabled, rebuild_index, search_risks
+from .themes import retag_risks
+from .xlsx import XlsxStream, register_sheets
+
+
+# a cache every worker process shares (risks.counts only caches with one)
+SHARED_CACHE = override_settings(CACHES={"default": {
+    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+    "LOCATION": os.path.join(tempfile.gettempdir(), "risks-test-cache"),
+}})
+
+# the query counts below leave out session and user loading, as with a shared cache
+CACHED_AUTH = override_settings(
+    SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+    AUTHENTICATION_BACKENDS=["risks.auth.CachedModelBackend"],
+)
+
+
+def make_risks(count, start=0, users=None):
+    users = users or [None]
+    for i in range(start, start + count):
+        RiskAssessment.objects.create(
+            reference_id=f"RISK-T-{i:05d}",
+            area_name=["IT", "Credit", "Operations"][i % 3],
+            description=f"Test risk {i}",
+            risk_owner=f"Owner {i % 4}",
+            inherent_probability="High",
+            inherent_impact="High" if i % 2 else "Medium",
+            residual_probability="Low",
+            residual_impact="Low",
+            updated_by=users[i % len(users)],
+        )
+
+
+# ========= ADMIN_CHANGELIST_TESTS_START =========
+@CACHED_AUTH
+class AdminChangelistQueryTests(TestCase):
+    url = "/admin/risks/riskassessment/"
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.editors = [User.objects.create_user(f"editor{i}") for i in range(5)]
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, query_string=""):
+        # first load fills the cached totals/facets, the second is measured
+        self.client.get(self.url + query_string)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url + query_string)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        make_risks(5, users=self.editors)
+        small = self.changelist_queries()
+
+        make_risks(95, start=5, users=self.editors)
+        large = self.changelist_queries()
+
+        self.assertEqual(small, large)
+
+    @SHARED_CACHE
+    def test_warm_changelist_is_constant(self):
+        cache.clear()
+        make_risks(60, users=self.editors)
+        filtered = "?area_name=IT&residual_rating=Sustainable"
+        self.client.get(self.url)
+        self.client.get(self.url + filtered)
+        # session and user come from the cache: only the single joined page query
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+        with self.assertNumQueries(1):
+            self.client.get(self.url + filtered)
+
+    @SHARED_CACHE
+    def test_cached_counts_expire_on_change(self):
+        cache.clear()
+        make_risks(3)
+        response = self.client.get(self.url)
+        self.assertContains(response, "3 risk assessments")
+
+        make_risks(1, start=3)
+        response = self.client.get(self.url)
+        self.assertContains(response, "4 risk assessments")
+        self.assertContains(response, "IT (2)")
+
+    def test_local_memory_cache_counts_every_time(self):
+        make_risks(3)
+        self.assertContains(self.client.get(self.url), "3 risk assessments")
+        # bulk_create sends no signal, like a write in another worker process
+        RiskAssessment.objects.bulk_create([RiskAssessment(
+            reference_id="RISK-W2-001",
+            area_name="IT",
+            description="Written by another worker",
+            inherent_probability="Low",
+            inherent_impact="Low",
+            residual_probability="Low",
+            residual_impact="Low",
+        )])
+        response = self.client.get(self.url)
+        self.assertContains(response, "4 risk assessments")
+        self.assertContains(response, "IT (2)")
+# ========= ADMIN_CHANGELIST_TESTS_END =========
+
+
+# ========= SESSION_AUTH_TESTS_START =========
+def _writes(queries):
+    return [q["sql"] for q in queries if q["sql"].split(None, 1)[0].upper() in ("INSERT", "UPDATE", "DELETE")]
+
+
+def _auth_reads(queries):
+    return [q["sql"] for q in queries if any(t in q["sql"] for t in ('"django_session"', '"auth_user"', '"auth_permission"'))]
+
+
+class SessionAuthOverheadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("coordinator", password="pw")
+        self.user.user_permissions.add(Permission.objects.get(codename="view_reportconfiguration"))
+
+    def page_views(self, count=5):
+        self.client.login(username="coordinator", password="pw")
+        # first view creates the report settings and snapshot
+        self.client.get("/official-report/")
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(count):
+                self.assertEqual(self.client.get("/official-report/").status_code, 200)
+        return ctx.captured_queries
+
+    @CACHED_AUTH
+    def test_page_views_do_not_touch_session_or_auth_tables(self):
+        queries = self.page_views()
+        self.assertEqual(_writes(queries), [])
+        self.assertEqual(_auth_reads(queries), [])
+
+    @override_settings(
+        SESSION_ENGINE="django.contrib.sessions.backends.db",
+        AUTHENTICATION_BACKENDS=["django.contrib.auth.backends.ModelBackend"],
+    )
+    def test_database_baseline_reads_session_and_user_every_view(self):
+        queries = self.page_views()
+        self.assertEqual(_writes(queries), [])
+        self.assertEqual(len([sql for sql in _auth_reads(queries) if "django_session" in sql]), 5)
+        self.assertEqual(len([sql for sql in _auth_reads(queries) if '"auth_user"' in sql]), 5)
+
+    @CACHED_AUTH
+    def test_permission_change_is_seen_on_next_request(self):
+        self.page_views(count=1)
+        self.user.user_permissions.clear()
+        self.assertEqual(self.client.get("/official-report/").status_code, 403)
+
+    def test_local_memory_cache_check(self):
+        self.assertEqual(check_auth_cache(None), [])
+        with CACHED_AUTH:
+            self.assertEqual([error.id for error in check_auth_cache(None)], ["risks.W001"])
+# ========= SESSION_AUTH_TESTS_END =========
+
+
+# ========= PERFORMANCE_BUDGET_TESTS_START =========
+# Wall-clock budgets depend on the machine. Every run checks them, scaled 3x
+# so a busy CI runner passes while a per-row query or a second pass over the
+# register still fails; RISKS_PERF_LATENCY=1 holds them to the budget itself
+# and RISKS_PERF_BUDGET_SCALE sets any other factor.
+PERF_LATENCY = os.environ.get("RISKS_PERF_LATENCY", "") == "1"
+PERF_BUDGET_SCALE = float(os.environ.get("RISKS_PERF_BUDGET_SCALE", "1" if PERF_LATENCY else "3"))
+
+AREAS = ["IT", "Credit", "Operations", "Treasury"]
+
+
+def seed_register(count, start=0):
+    """`count` risks through the batch upsert path (a quarter of them drafts); returns its results."""
+    return upsert_risk_records([
+        {
+            "reference_id": f"RISK-P-{i:06d}",
+            "area_name": AREAS[i % len(AREAS)],
+            "description": ("[DRAFT] " if i % 4 == 0 else "") + f"Risk {i}: customer data breach and fraud loss",
+            "caused_by": "Weak access controls",
+            "consequences": "Regulatory penalty",
+            "risk_owner": f"Owner {i % 5}",
+            "inherent_probability": ["Low", "Medium", "High", "Very High"][i % 4],
+            "inherent_impact": ["Low", "Medium", "High", "Very High"][(i // 4) % 4],
+            "residual_probability": "Low",
+            "residual_impact": "Very Low",
+        }
+        for i in range(start, start + count)
+    ])
+
+
+def kri_report(area, rows):
+    lines = [
+        f"{area} Reporting Period: Q1 2025",
+        "Key Risk Indicator\tKRI Description\tRelated Risk\tProcess\tNo Occurrence",
+    ]
+    lines += [f"KRI {i}\tIndicator {i} breached\tFraud loss {i}\tPayments\t{i % 9 + 1}" for i in range(rows)]
+    return "\n".join(lines)
+
+
+def ingest_summary(response):
+    """The counts in the latest ingest summary a save view flashed for the dashboard."""
+    message = list(get_messages(response.wsgi_request))[-1]
+    counts = re.findall(r"(\d+) (inserted|updated|unchanged)", str(message))
+    return {"skipped" if key == "unchanged" else key: int(value) for value, key in counts}
+
+
+@async_to_sync
+async def _acollect(streaming_content):
+    return [chunk async for chunk in streaming_content]
+
+
+def _body(response):
+    """Response body, including streamed and (under RISKS_ASYNC_VIEWS) async-streamed ones."""
+    if response.streaming and response.is_async:
+        return b"".join(_acollect(response.streaming_content))
+    return b"".join(response.streaming_content) if response.streaming else response.content
+
+
+class SeededRegisterMixin:
+    def seed(self, count, start=0):
+        results = seed_register(count, start)
+        self.assertEqual([result for result in results if result["status"] == "error"], [])
+        self.assertEqual(RiskAssessment.objects.count(), start + count)
+
+
+@CACHED_AUTH
+class QueryBudgetTests(SeededRegisterMixin, TransactionTestCase):
+    """
+    Query counts per request must stay under a fixed budget and must not
+    grow with the register or the size of the submitted batch. (Not a
+    TestCase: its wrapping transaction turns off the department directory
+    cache, so every lookup would hit the database.)
+    """
+    # path -> most queries one warm request may run
+    READ_BUDGETS = {
+        "/": 8,
+        "/?area=IT&filter=approved": 8,
+        "/?q=fraud": 9,
+        "/board-explanation/": 8,
+        "/official-report/": 14,
+        "/export-csv/": 5,
+        "/export-xlsx/": 5,
+        "/search/?q=fraud": 4,
+        "/api/risks/?limit=500": 5,
+        "/api/matrices/": 5,
+        "/api/ratings/": 5,
+        "/api/board/": 7,
+    }
+    # ingest path -> most queries for one pasted report
+    INGEST_BUDGETS = {
+        "/ai-extract/": 8,
+        "/ai-extract/save/": 45,
+        "/ai-extract/save-approve/": 45,
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(self.admin)
+
+    def count_queries(self, path, method="get", status=200, **kwargs):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(path, **kwargs)
+            _body(response)
+        self.assertEqual(response.status_code, status, path)
+        self.last_response, self.last_queries = response, ctx.captured_queries
+        return len(ctx)
+
+    def read_queries(self):
+        counts = {}
+        for path in self.READ_BUDGETS:
+            _body(self.client.get(path))  # warm caches and report snapshots
+            counts[path] = self.count_queries(path)
+        return counts
+
+    def test_read_views_stay_within_budget_as_register_grows(self):
+        self.seed(20)
+        small = self.read_queries()
+        self.seed(380, start=20)
+        large = self.read_queries()
+
+        for path, budget in self.READ_BUDGETS.items():
+            with self.subTest(path=path):
+                self.assertLessEqual(large[path], budget)
+                self.assertEqual(small[path], large[path], "query count grows with the register")
+
+    def test_ingest_queries_do_not_grow_with_report_size(self):
+        self.seed(100)
+        for path, budget in self.INGEST_BUDGETS.items():
+            # the preview renders the table, the saves redirect to the dashboard
+            status = 200 if path == "/ai-extract/" else 302
+            with self.subTest(path=path):
+                # the first report for an area also creates its department
+                self.count_queries(path, "post", status, data={"raw_text": kri_report(f"Warm {path}", 3)})
+                # nine rows already touch every heatmap cell the larger report does
+                small = self.count_queries(path, "post", status, data={"raw_text": kri_report(f"Small {path}", 9)})
+                large = self.count_queries(path, "post", status, data={"raw_text": kri_report(f"Large {path}", 80)})
+                self.assertLessEqual(large, budget)
+                # SQLite's parameter limit splits the bulk INSERT once, nothing more
+                self.assertLessEqual(large, small + 1, "query count grows with the report")
+
+    def test_resubmitted_report_is_set_based(self):
+        report = {"raw_text": kri_report("Payments", 60)}
+        self.count_queries("/ai-extract/save-approve/", "post", 302, data=report)
+        queries = self.count_queries("/ai-extract/save-approve/", "post", 302, data=report)
+        self.assertEqual(ingest_summary(self.last_response), {"inserted": 0, "updated": 0, "skipped": 60})
+        self.assertLessEqual(queries, self.INGEST_BUDGETS["/ai-extract/save-approve/"])
+
+    def test_bulk_approve_is_set_based(self):
+        # sixteen risks hold drafts in every heatmap cell the larger register does;
+        # approving a first batch creates the approved cells
+        self.seed(16)
+        self.count_queries("/drafts/approve-all/", "post", 302)
+        self.seed(16, start=16)
+        small = self.count_queries("/drafts/approve-all/", "post", 302)
+        self.seed(400, start=32)
+        large = self.count_queries("/drafts/approve-all/", "post", 302)
+        self.assertEqual(small, large)
+        self.assertFalse(RiskAssessment.objects.filter(description__startswith="[DRAFT]").exists())
+
+    def test_bulk_api_queries_do_not_grow_with_batch(self):
+        def post(records):
+            queries = self.count_queries(
+                "/api/risks/bulk/", "post", data=json.dumps(records), content_type="application/json",
+            )
+            inserts = sum(q["sql"].startswith('INSERT INTO "risks_riskassessment"') for q in self.last_queries)
+            return queries - inserts, inserts, json.loads(self.last_response.content)["summary"]
+
+        def records(start, count, residual_probability="Low"):
+            return [
+                {
+                    "reference_id": f"EXT-{i:05d}",
+                    "area_name": AREAS[i % len(AREAS)],
+                    "description": f"External risk {i}",
+                    "risk_owner": "Owner",
+                    "inherent_probability": "High",
+                    "inherent_impact": "High",
+                    "residual_probability": residual_probability,
+                    "residual_impact": "Very Low",
+                }
+                for i in range(start, start + count)
+            ]
+
+        _queries, _inserts, summary = post(records(0, 40) + records(40, 4, "Medium"))
+        self.assertEqual(summary, {"created": 44, "updated": 0, "unchanged": 0, "error": 0})
+        # both batches move risks in every area between cells that already exist
+        small, _inserts, summary = post(records(0, 4, "Medium") + records(100, 10))
+        self.assertEqual(summary, {"created": 10, "updated": 4, "unchanged": 0, "error": 0})
+        # 500 rows: one search index chunk
+        large, inserts, summary = post(records(4, 36, "Medium") + records(200, 464))
+        self.assertEqual(summary, {"created": 464, "updated": 36, "unchanged": 0, "error": 0})
+        self.assertEqual(small, large)
+        # the bulk INSERT is split only by the backend's parameter limit
+        self.assertLess(inserts, 464 // 20)
+
+
+@CACHED_AUTH
+class LatencyBudgetTests(SeededRegisterMixin, TransactionTestCase):
+    """
+    Warm response time per endpoint on a 2,000-risk register, best of
+    three. A change that pushes an endpoint over its budget fails the run.
+    """
+    REGISTER_SIZE = 2000
+    # path -> milliseconds
+    BUDGETS_MS = {
+        "/": 1500,
+        "/?q=fraud": 1500,
+        "/board-explanation/": 400,
+        "/official-report/": 1500,
+        "/export-csv/": 400,
+        "/export-xlsx/": 1000,
+        "/api/risks/?limit=1000": 400,
+        "/api/matrices/": 100,
+        "/api/board/": 150,
+    }
+    INGEST_BUDGET_MS = 1000
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.seed(self.REGISTER_SIZE)
+        self.client.force_login(self.admin)
+
+    def best_of(self, request, runs=3):
+        request()
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            request()
+            timings.append((time.perf_counter() - started) * 1000)
+        return min(timings)
+
+    def test_read_endpoints_within_budget(self):
+        for path, budget in self.BUDGETS_MS.items():
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path).status_code, 200)
+                elapsed = self.best_of(lambda: _body(self.client.get(path)))
+                self.assertLessEqual(
+                    elapsed, budget * PERF_BUDGET_SCALE, f"{path} took {elapsed:.0f} ms (budget {budget} ms)"
+                )
+
+    def test_kri_ingest_within_budget(self):
+        report = kri_report("Payments", 100)
+        self.assertEqual(self.client.post("/ai-extract/save-approve/", {"raw_text": report}).status_code, 302)
+        elapsed = self.best_of(lambda: self.client.post("/ai-extract/save-approve/", {"raw_text": report}))
+        self.assertLessEqual(
+            elapsed, self.INGEST_BUDGET_MS * PERF_BUDGET_SCALE,
+            f"ingest took {elapsed:.0f} ms (budget {self.INGEST_BUDGET_MS} ms)",
+        )
+# ========= PERFORMANCE_BUDGET_TESTS_END =========
+
+
+# ========= PROFILING_TESTS_START =========
+class ProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_risks(6)
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.staff = User.objects.create_user("staff", password="pw", is_staff=True)
+
+    def test_superuser_profile_is_stored_and_ranked(self):
+        self.client.force_login(self.admin)
+        response = self.client.get("/board-explanation/?_profile=1")
+        self.assertEqual(response.status_code, 200)
+
+        run = ProfileRun.objects.get()
+        self.assertEqual(response["X-Profile-Run"], f"/profiles/{run.pk}/")
+        self.assertRegex(run.view_name, r"^risks\.(async_)?views\.board_explanation$")
+        self.assertGreater(run.query_count, 0)
+
+        page = self.client.get(f"/profiles/{run.pk}/?sort=cumtime&scope=app")
+        self.assertContains(page, "period_trends")
+        stats = marshal.loads(self.client.get(f"/profiles/{run.pk}/download/").content)
+        self.assertTrue(any(function == "period_trends" for _file, _line, function in stats))
+
+    def test_ingest_post_and_streamed_export_are_profiled(self):
+        self.client.force_login(self.admin)
+        self.client.post("/ai-extract/save-approve/?_profile=1", {"raw_text": kri_report("Payments", 5)})
+        response = self.client.get("/export-xlsx/?_profile=1")
+        self.assertTrue(_body(response).startswith(b"PK"))
+        self.assertEqual(ProfileRun.objects.filter(view_name="risks.views.ai_extract_save_and_approve").count(), 1)
+        self.assertTrue(ProfileRun.objects.filter(view_name__endswith="views.export_risks_xlsx").exists())
+
+    @skipIf(settings.RISKS_ASYNC_VIEWS and sys.version_info < (3, 12), "cProfile only sees the event loop from 3.12")
+    def test_streamed_body_is_inside_the_trace(self):
+        self.client.force_login(self.admin)
+        _body(self.client.get("/export-xlsx/?_profile=1"))
+        run = ProfileRun.objects.get()
+        self.assertContains(self.client.get(f"/profiles/{run.pk}/?scope=app"), "write_rows")
+
+    def test_only_superusers_can_profile(self):
+        self.client.force_login(self.staff)
+        response = self.client.get("/board-explanation/?_profile=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Profile-Run", response)
+        self.assertFalse(ProfileRun.objects.exists())
+        self.assertEqual(self.client.get("/profiles/").status_code, 403)
+
+    def test_requests_without_the_parameter_are_untouched(self):
+        self.client.force_login(self.admin)
+        self.client.get("/board-explanation/")
+        with CaptureQueriesContext(connection) as plain:
+            self.client.get("/board-explanation/?area=IT")
+        self.assertFalse(ProfileRun.objects.exists())
+        self.assertFalse(any("risks_profilerun" in q["sql"] for q in plain.captured_queries))
+
+    @override_settings(RISKS_PROFILE_KEEP=2)
+    def test_only_the_newest_runs_are_kept(self):
+        self.client.force_login(self.admin)
+        for _ in range(4):
+            self.client.get("/api/matrices/?_profile=1")
+        self.assertEqual(ProfileRun.objects.count(), 2)
+# ========= PROFILING_TESTS_END =========
+
+
+# ========= INGEST_UPSERT_TESTS_START =========
+class IngestUpsertTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(self.admin)
+
+    def submit(self, report, path="/ai-extract/save-approve/"):
+        response = self.client.post(path, {"raw_text": report})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Location"], reverse("dashboard"))
+        return ingest_summary(response)
+
+    def test_resubmitted_report_updates_in_place(self):
+        report = kri_report("Payments", 6)
+        self.assertEqual(self.submit(report), {"inserted": 6, "updated": 0, "skipped": 0})
+        self.assertEqual(self.submit(report), {"inserted": 0, "updated": 0, "skipped": 6})
+
+        # one KRI jumps from 1 to 12 occurrences: only that risk is rewritten
+        changed = report.replace("Payments\t1", "Payments\t12", 1)
+        self.assertEqual(self.submit(changed), {"inserted": 0, "updated": 1, "skipped": 5})
+        self.assertEqual(RiskAssessment.objects.count(), 6)
+
+    def test_drafts_resubmitted_after_approval_stay_approved(self):
+        report = kri_report("Payments", 3)
+        self.submit(report, path="/ai-extract/save/")
+        self.assertEqual(RiskAssessment.objects.filter(description__startswith="[DRAFT]").count(), 3)
+        self.client.post("/drafts/approve-all/")
+
+        self.submit(report.replace("Payments\t1", "Payments\t12", 1), path="/ai-extract/save/")
+        self.assertFalse(RiskAssessment.objects.filter(description__startswith="[DRAFT]").exists())
+
+    def test_losing_a_concurrent_insert_race_retries_as_update(self):
+        rows = parse_kri_report(kri_report("Payments", 4))
+        allocate = ingest.allocate_reference_ids
+
+        def race(base_refs):
+            # the identical submission commits between our lookup and our insert
+            patcher.stop()
+            upsert_ingested_risks(rows)
+            return allocate(base_refs)
+
+        patcher = mock.patch("risks.ingest.allocate_reference_ids", side_effect=race)
+        patcher.start()
+        with mock.patch("risks.ingest._upsert_ingested_risks", wraps=ingest._upsert_ingested_risks) as attempt:
+            summary = upsert_ingested_risks(rows)
+        # ours, the racing one, then our retry
+        self.assertEqual(attempt.call_count, 3)
+        self.assertEqual(sum(summary.values()), 4)
+        self.assertEqual(RiskAssessment.objects.count(), 4)
+
+    def test_failed_upsert_leaves_no_observations(self):
+        rows, observations = parse_kri_report(kri_report("Payments", 4), with_observations=True)
+        with mock.patch("risks.ingest.record_heatmap_writes", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                upsert_ingested_risks(rows, observations=observations)
+        self.assertFalse(KRIObservation.objects.exists())
+        self.assertFalse(RiskAssessment.objects.exists())
+
+    def test_corrected_resubmission_keeps_the_earlier_reading(self):
+        report = kri_report("Payments", 3)
+        self.submit(report)
+        self.submit(report)
+        self.assertEqual(KRIObservation.objects.count(), 3)
+
+        # KRI 1 reported 2, corrected to 12
+        self.submit(report.replace("Payments\t2", "Payments\t12", 1))
+        readings = KRIObservation.objects.filter(kri="KRI 1").order_by("pk")
+        self.assertEqual([reading.occurrence for reading in readings], [2, 12])
+        trend = trailing_quarters("Payments", as_of=datetime.date(2025, 3, 31), quarters=1)
+        self.assertEqual(trend, {"KRI 0": [1], "KRI 1": [12], "KRI 2": [3]})
+
+    def test_new_risks_take_department_defaults(self):
+        Department.objects.create(name="Payments", default_owner="Head of Payments", default_controls="Dual sign-off")
+        report = kri_report("payments", 3)
+        self.submit(report)
+        self.assertEqual(
+            set(RiskAssessment.objects.values_list("area_name", "risk_owner", "control_owner", "controls")),
+            {("Payments", "Head of Payments", "Head of Payments", "Dual sign-off")},
+        )
+
+        # manual edits survive a resubmission, even after the defaults change
+        RiskAssessment.objects.update(risk_owner="Payments Ops Lead", controls="Daily reconciliation")
+        Department.objects.filter(name="Payments").update(default_owner="Someone Else", default_controls="Other")
+        cache.clear()
+        self.submit(report.replace("Payments\t1", "Payments\t12", 1))
+        self.assertEqual(
+            set(RiskAssessment.objects.values_list("risk_owner", "controls")),
+            {("Payments Ops Lead", "Daily reconciliation")},
+        )
+
+    def test_summary_is_shown_once_and_cannot_be_forged(self):
+        self.assertNotContains(self.client.get("/?inserted=999&updated=0&skipped=0"), "KRI ingest complete")
+
+        self.submit(kri_report("Payments", 3))
+        first = self.client.get("/", HTTP_IF_NONE_MATCH="*")
+        self.assertContains(first, "KRI ingest complete: 3 inserted, 0 updated, 0 unchanged.")
+        self.assertFalse(first.has_header("ETag"))
+        self.assertNotContains(self.client.get("/"), "KRI ingest complete")
+
+    def test_preview_does_not_create_departments(self):
+        response = self.client.post("/ai-extract/", {"raw_text": kri_report("Brand New Area", 3)})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Department.objects.filter(name="Brand New Area").exists())
+# ========= INGEST_UPSERT_TESTS_END =========
+
+
+# ========= SEARCH_TESTS_START =========
+class SearchTests(TestCase):
+    def setUp(self):
+        make_risks(30)
+        RiskAssessment.objects.filter(pk__in=RiskAssessment.objects.filter(area_name="IT").values("pk")[:4]).update(
+            description="Card fraud through phishing"
+        )
+        RiskAssessment.objects.filter(area_name="Credit").update(description="Fraud in loan files")
+        rebuild_index()
+
+    def test_filters_join_the_match(self):
+        with CaptureQueriesContext(connection) as ctx:
+            results = search_risks("fraud", RiskAssessment.objects.filter(area_name="IT"), limit=3)
+        # SQLite: ranked ids, then the rows; PostgreSQL ranks the rows in one query
+        self.assertEqual(len(ctx), 2 if fts_enabled() else 1)
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(risk.area_name == "IT" for risk in results))
+        ranks = [risk.search_rank for risk in results]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+
+    def test_search_endpoint(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        response = self.client.get("/search/?q=phishing&area=IT")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 4)
+
+    def test_saves_and_bulk_edits_are_indexed(self):
+        risk = RiskAssessment.objects.create(
+            reference_id="RISK-IDX-001",
+            area_name="Operations",
+            description="Counterfeit banknotes accepted at the teller",
+            inherent_probability="High",
+            inherent_impact="High",
+            residual_probability="Low",
+            residual_impact="Low",
+        )
+        self.assertEqual([r.pk for r in search_risks("counterfeit")], [risk.pk])
+
+        set_field(RiskAssessment.objects.filter(pk=risk.pk), "controls", "UV scanners at every till")
+        self.assertEqual([r.pk for r in filter_matching(RiskAssessment.objects.all(), "uv scann")], [risk.pk])
+        risk.delete()
+        self.assertEqual(search_risks("counterfeit"), [])
+# ========= SEARCH_TESTS_END =========
+
+
+# ========= PURGE_TESTS_START =========
+class PurgeTests(TestCase):
+    def test_risk_added_during_purge_keeps_search_and_heatmap(self):
+        make_risks(12)
+        rebuild_index()
+        rebuild_heatmap()
+
+        def add_risk(deleted, total):
+            if deleted == 5:
+                RiskAssessment.objects.create(
+                    reference_id="RISK-LATE-001",
+                    area_name="IT",
+                    description="Late phishing report",
+                    inherent_probability="High",
+                    inherent_impact="High",
+                    residual_probability="Low",
+                    residual_impact="Low",
+                )
+
+        self.assertEqual(purge_register(chunk_size=5, progress=add_risk), 12)
+        self.assertEqual(list(RiskAssessment.objects.values_list("reference_id", flat=True)), ["RISK-LATE-001"])
+        self.assertEqual([risk.reference_id for risk in search_risks("phishing")], ["RISK-LATE-001"])
+        self.assertEqual(search_risks("test"), [])
+        self.assertEqual(verify_heatmap(), {})
+        self.assertEqual(heatmap_matrices()["total_risks"], 1)
+
+    def test_export_and_clear_keeps_risks_added_after_the_export(self):
+        make_risks(4)
+        admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin)
+
+        def ingest_meanwhile(user):
+            make_risks(1, start=100)
+
+        with mock.patch("risks.views.close_register_cycle", side_effect=ingest_meanwhile):
+            response = self.client.get("/export-csv-clear/")
+        self.assertEqual(response.status_code, 200)
+        exported = response.content.decode()
+        self.assertIn("RISK-T-00003", exported)
+        self.assertNotIn("RISK-T-00100", exported)
+        self.assertEqual(list(RiskAssessment.objects.values_list("reference_id", flat=True)), ["RISK-T-00100"])
+        self.assertEqual(heatmap_matrices()["total_risks"], 1)
+# ========= PURGE_TESTS_END =========
+
+
+# ========= COMPRESSION_TESTS_START =========
+class CompressionTests(TestCase):
+    body = ("<p>Residual risk within appetite.</p>\n" * 200).encode()
+
+    def compress(self, response, accept="gzip, br"):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response).process_response(request, response)
+
+    def test_negotiation(self):
+        self.assertEqual(choose_encoding("gzip"), "gzip")
+        self.assertEqual(choose_encoding("gzip;q=0, identity"), None)
+        self.assertEqual(choose_encoding("deflate"), None)
+        self.assertEqual(choose_encoding(""), None)
+        self.assertEqual(choose_encoding("br;q=0, *"), "gzip")
+        self.assertEqual(choose_encoding("br, gzip"), "br" if compression.brotli else "gzip")
+
+        response = self.compress(HttpResponse(self.body), accept="identity")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(response.content, self.body)
+
+    def test_gzip_body_is_padded(self):
+        lengths = set()
+        for _ in range(10):
+            response = self.compress(HttpResponse(self.body), accept="gzip")
+            self.assertEqual(response["Content-Encoding"], "gzip")
+            self.assertEqual(int(response["Content-Length"]), len(response.content))
+            self.assertEqual(gzip.decompress(response.content), self.body)
+            lengths.add(len(response.content))
+        self.assertGreater(len(lengths), 1)
+
+    @skipIf(compression.brotli is None, "brotli is not installed")
+    def test_brotli_body_is_padded(self):
+        lengths = set()
+        for _ in range(10):
+            response = self.compress(HttpResponse(self.body), accept="br")
+            self.assertEqual(response["Content-Encoding"], "br")
+            self.assertEqual(compression.brotli.decompress(response.content), self.body)
+            lengths.add(len(response.content))
+        self.assertGreater(len(lengths), 1)
+
+    def test_thresholds(self):
+        small = self.compress(HttpResponse(b"x" * 500))
+        self.assertFalse(small.has_header("Content-Encoding"))
+        self.assertFalse(small.has_header("Vary"))
+
+        with override_settings(RISKS_COMPRESS_MIN_BYTES=100):
+            self.assertTrue(self.compress(HttpResponse(b"x" * 500)).has_header("Content-Encoding"))
+
+        image = self.compress(HttpResponse(self.body, content_type="image/png"))
+        self.assertFalse(image.has_header("Content-Encoding"))
+        events = self.compress(StreamingHttpResponse(iter([self.body]), content_type="text/event-stream"))
+        self.assertFalse(events.has_header("Content-Encoding"))
+        no_transform = HttpResponse(self.body)
+        no_transform["Cache-Control"] = "no-transform"
+        self.assertFalse(self.compress(no_transform).has_header("Content-Encoding"))
+
+    def test_streaming_is_one_stream(self):
+        rows = [f"RISK-{i:05d},IT,Within appetite\n" for i in range(5000)]
+        response = self.compress(StreamingHttpResponse(iter(rows), content_type="text/csv"), accept="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertFalse(response.has_header("Content-Length"))
+        chunks = list(response.streaming_content)
+        # flushed every STREAM_FLUSH_BYTES of input, not once per row
+        self.assertLess(len(chunks), 10)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(gzip.decompress(b"".join(chunks)).decode(), "".join(rows))
+
+    @skipIf(compression.brotli is None, "brotli is not installed")
+    def test_brotli_stream(self):
+        rows = [f"RISK-{i:05d},IT,Within appetite\n" for i in range(5000)]
+        response = self.compress(StreamingHttpResponse(iter(rows), content_type="text/csv"), accept="br")
+        body = b"".join(response.streaming_content)
+        self.assertEqual(compression.brotli.decompress(body).decode(), "".join(rows))
+
+    def test_etag_becomes_weak(self):
+        response = HttpResponse(self.body)
+        response["ETag"] = '"abc123"'
+        self.assertEqual(self.compress(response, accept="gzip")["ETag"], 'W/"abc123"')
+
+        weak = HttpResponse(self.body)
+        weak["ETag"] = 'W/"abc123"'
+        self.assertEqual(self.compress(weak, accept="gzip")["ETag"], 'W/"abc123"')
+
+        identity = HttpResponse(self.body)
+        identity["ETag"] = '"abc123"'
+        self.assertEqual(self.compress(identity, accept="identity")["ETag"], '"abc123"')
+# ========= COMPRESSION_TESTS_END =========
+
+
+# ========= DEPARTMENT_DIRECTORY_TESTS_START =========
+class DepartmentDirectoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Department.objects.create(name="Treasury", default_owner="Treasury Manager")
+        # a directory cached by this worker (TestCase's transaction keeps directory() from caching)
+        cache.set(DEPARTMENT_DIRECTORY_KEY, Department.objects.directory(), None)
+
+    def test_department_saved_by_another_worker_is_found(self):
+        # bulk_create sends no signal, like a save in another process
+        Department.objects.bulk_create([Department(name="Treasury Ops")])
+        department = Department.objects.lookup("treasury  ops")
+        self.assertEqual(department["name"], "Treasury Ops")
+        self.assertEqual(Department.objects.filter(name__iexact="treasury ops").count(), 1)
+
+        risk = RiskAssessment.objects.create(
+            reference_id="RISK-TO-001",
+            area_name="treasury ops",
+            description="FX settlement failure",
+            inherent_probability="High",
+            inherent_impact="High",
+            residual_probability="Low",
+            residual_impact="Low",
+        )
+        self.assertEqual((risk.area_name, risk.department_id), ("Treasury Ops", department["id"]))
+
+    def test_alias_added_by_another_worker_is_found(self):
+        Department.objects.filter(name="Treasury").update(aliases="Dealing Room")
+        self.assertEqual(Department.objects.lookup("dealing room")["name"], "Treasury")
+        self.assertFalse(Department.objects.filter(name__iexact="dealing room").exists())
+# ========= DEPARTMENT_DIRECTORY_TESTS_END =========
+
+
+# ========= RETAG_TESTS_START =========
+class RetagTests(TestCase):
+    def test_retag_changes_the_register_fingerprint(self):
+        make_risks(3)
+        # tags written by an older keyword table, without touching updated_at
+        RiskAssessment.objects.update(keyword_tags=1)
+        before = register_fingerprint(register_state())
+
+        self.assertEqual(retag_risks(RiskAssessment.objects.all()), 3)
+        self.assertNotEqual(register_fingerprint(register_state()), before)
+# ========= RETAG_TESTS_END =========
+
+
+# ========= BULK_API_TESTS_START =========
+class BulkApiTests(TestCase):
+    def setUp(self):
+        User.objects.create_superuser("loader", "loader@example.com", "pw")
+        self.basic = "Basic " + base64.b64encode(b"loader:pw").decode()
+
+    def post(self, body, content_type="application/x-ndjson", **extra):
+        return self.client.post(
+            "/api/risks/bulk/", data=body, content_type=content_type, HTTP_AUTHORIZATION=self.basic, **extra
+        )
+
+    def ndjson(self, count):
+        return "\n".join(
+            json.dumps({
+                "reference_id": f"EXT-{i:03d}",
+                "area_name": "IT",
+                "description": f"External risk {i}",
+                "risk_owner": "Owner",
+                "inherent_probability": "High",
+                "inherent_impact": "High",
+                "residual_probability": "Low",
+                "residual_impact": "Low",
+            })
+            for i in range(count)
+        )
+
+    def test_authentication(self):
+        self.assertEqual(self.client.post("/api/risks/bulk/", data=self.ndjson(1),
+                                          content_type="application/x-ndjson").status_code, 401)
+
+        self.basic = "Basic " + base64.b64encode(b"loader:wrong").decode()
+        response = self.post(self.ndjson(1))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("Basic", response["WWW-Authenticate"])
+
+        User.objects.create_user("viewer", password="pw")
+        self.basic = "Basic " + base64.b64encode(b"viewer:pw").decode()
+        self.assertEqual(self.post(self.ndjson(1)).status_code, 403)
+        self.assertFalse(RiskAssessment.objects.exists())
+
+    def test_session_clients_need_the_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(User.objects.get(username="loader"))
+        client.get("/")
+
+        def post(**extra):
+            return client.post("/api/risks/bulk/", data=self.ndjson(2), content_type="application/x-ndjson", **extra)
+
+        self.assertEqual(post().status_code, 403)
+        response = post(HTTP_X_CSRFTOKEN=client.cookies["csrftoken"].value)
+        self.assertEqual(response.json()["summary"]["created"], 2)
+
+    def test_declared_length_over_the_limit(self):
+        with mock.patch.object(api, "BULK_MAX_BYTES", 100):
+            response = self.post(self.ndjson(3))
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(RiskAssessment.objects.exists())
+
+    def test_too_many_records_stop_the_read(self):
+        with mock.patch.object(api, "BULK_MAX_RECORDS", 3), \
+                mock.patch.object(api.json, "loads", wraps=json.loads) as loads:
+            response = self.post(self.ndjson(10))
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(loads.call_count, 4)
+        self.assertFalse(RiskAssessment.objects.exists())
+
+        with mock.patch.object(api, "BULK_MAX_RECORDS", 3):
+            response = self.post(json.dumps([{"reference_id": f"EXT-{i}"} for i in range(4)]), "application/json")
+        self.assertEqual(response.status_code, 413)
+
+    def test_body_without_content_length_is_capped(self):
+        for content_type in ("application/x-ndjson", "application/json"):
+            body = self.ndjson(50).encode() if "nd" in content_type else json.dumps([{}] * 500).encode()
+            request = RequestFactory().post("/api/risks/bulk/", data=body, content_type=content_type)
+            # a chunked upload: no Content-Length, the stream just runs on
+            del request.META["CONTENT_LENGTH"]
+            request._stream = io.BytesIO(body)
+            with mock.patch.object(api, "BULK_MAX_BYTES", 1000):
+                with self.assertRaises(api.BulkTooLarge):
+                    api._read_records(request)
+
+        with mock.patch.object(api, "BULK_MAX_BYTES", 1000):
+            self.assertEqual(self.post(self.ndjson(50)).status_code, 413)
+        self.assertEqual(self.post(self.ndjson(3)).json()["summary"]["created"], 3)
+# ========= BULK_API_TESTS_END =========
+
+
+# ========= XLSX_EXPORT_TESTS_START =========
+SPREADSHEET_NS = {"x": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+
+def read_workbook(data):
+    """{sheet title: (row count, conditional-format ranges)} of an .xlsx body."""
+    with zipfile.ZipFile(io.BytesIO(data)) as workbook:
+        assert workbook.testzip() is None
+        root = ElementTree.fromstring(workbook.read("xl/workbook.xml"))
+        titles = [sheet.get("name") for sheet in root.iterfind("x:sheets/x:sheet", SPREADSHEET_NS)]
+        sheets = {}
+        for n, title in enumerate(titles, start=1):
+            sheet = ElementTree.fromstring(workbook.read(f"xl/worksheets/sheet{n}.xml"))
+            rows = len(sheet.findall("x:sheetData/x:row", SPREADSHEET_NS))
+            ranges = [cf.get("sqref") for cf in sheet.iterfind("x:conditionalFormatting", SPREADSHEET_NS)]
+            sheets[title] = (rows, ranges)
+    return sheets
+
+
+class XlsxExportTests(TestCase):
+    def test_one_sheet_per_area_with_rating_formats(self):
+        user = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(user)
+        make_risks(7)
+        response = self.client.get("/export-xlsx/")
+        self.assertEqual(response.status_code, 200)
+
+        sheets = read_workbook(_body(response))
+        # make_risks cycles IT, Credit, Operations; sheets follow area order
+        self.assertEqual(list(sheets), ["Credit", "IT", "Operations"])
+        self.assertEqual({title: rows for title, (rows, _ranges) in sheets.items()},
+                         {"Credit": 3, "IT": 4, "Operations": 3})
+        self.assertEqual(sheets["IT"][1], ["I2:I4 L2:L4"])
+
+    def test_sheet_titles_are_valid_and_unique(self):
+        long_area = "Retail Banking and Consumer Lending Operations"
+        areas = ["", "Cards/Payments [EU]", "cards payments eu", long_area, long_area + " East"]
+        stream = XlsxStream(["ID", "Area", "Rating"], rating_columns=[2])
+        rows = [(f"R{n}", area, "Critical") for n, area in enumerate(areas)]
+        sheets = read_workbook(b"".join(register_sheets(rows, stream, area_column=1)))
+
+        self.assertEqual(list(sheets), [
+            "Unspecified",
+            "Cards Payments EU",
+            "cards payments eu (1)",
+            long_area[:31],
+            long_area[:27] + " (1)",
+        ])
+        self.assertTrue(all(len(title) <= 31 for title in sheets))
+        self.assertEqual([ranges for _rows, ranges in sheets.values()], [["C2:C2"]] * len(areas))
+
+    def test_empty_register_still_opens(self):
+        stream = XlsxStream(["ID", "Area", "Rating"], rating_columns=[2])
+        sheets = read_workbook(b"".join(register_sheets([], stream)))
+        self.assertEqual(sheets, {"Register": (1, [])})
+# ========= XLSX_EXPORT_TESTS_END =========
+
+
+# ========= REPORT_SNAPSHOT_TESTS_START =========
+class ReportSnapshotTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        make_risks(5)
+
+    def test_snapshot_is_written_once_and_reused(self):
+        first = self.client.get("/official-report/")
+        self.assertTrue(first.streaming)
+        html = _body(first).decode()
+        self.assertIn("RISK-T-00004", html)
+        self.assertEqual(list(ReportSnapshot.objects.values_list("row_count", flat=True)), [5])
+
+        second = self.client.get("/official-report/")
+        self.assertFalse(second.streaming)
+        self.assertIn("RISK-T-00004", second.content.decode())
+        self.assertEqual(ReportSnapshot.objects.count(), 1)
+
+        # a register change is a new version
+        make_risks(1, start=5)
+        self.assertIn("RISK-T-00005", _body(self.client.get("/official-report/")).decode())
+        self.assertEqual(ReportSnapshot.objects.count(), 2)
+
+    def test_old_snapshots_are_pruned(self):
+        with mock.patch("risks.reports.SNAPSHOTS_KEPT", 2):
+            for n in range(4):
+                make_risks(1, start=5 + n)
+                _body(self.client.get("/official-report/"))
+        self.assertEqual(list(ReportSnapshot.objects.values_list("row_count", flat=True)), [9, 8])
+# ========= REPORT_SNAPSHOT_TESTS_END =========
+
+
+# ========= LIVE_DASHBOARD_TESTS_START =========
+def _sse_events(text):
+    """[(event, data)] of a Server-Sent Events chunk."""
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line and not line.startswith(":"))
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+class LiveDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_risks(3)
+
+    @async_to_sync
+    async def stream_until_change(self, change):
+        events = async_views._register_events("", "all", "")
+        try:
+            chunks = [await anext(events), await anext(events)]
+            await sync_to_async(change)()
+            # on_commit never fires inside a TestCase: wake the stream by hand
+            live.hub.notify()
+            chunks.append(await anext(events))
+        finally:
+            await events.aclose()
+        return chunks
+
+    def test_first_event_has_every_cell_then_only_changes(self):
+        with mock.patch.object(async_views, "LIVE_DEBOUNCE_SECONDS", 0):
+            retry, first, second = self.stream_until_change(lambda: make_risks(1, start=3))
+
+        self.assertTrue(retry.startswith("retry: "))
+        [(event, values)] = _sse_events(first)
+        self.assertEqual(event, "register")
+        self.assertEqual(values["total"], 3)
+        self.assertEqual(len(values), 2 + 2 * 25)
+
+        # risk 3: High/High inherent, Low/Low residual, not critical
+        [(event, delta)] = _sse_events(second)
+        self.assertEqual(delta, {"total": 4, "inherent:High:High": 2, "residual:Low:Low": 4})
+        self.assertFalse(live.hub._waiters)
+
+    def test_unchanged_register_sends_a_keep_alive(self):
+        with mock.patch.object(async_views, "LIVE_DEBOUNCE_SECONDS", 0):
+            _retry, _first, second = self.stream_until_change(lambda: None)
+        self.assertEqual(second, ": keep-alive\n\n")
+# ========= LIVE_DASHBOARD_TESTS_END =========
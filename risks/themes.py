@@ -0,0 +1,162 @@
+"""
+Keyword tags stored per risk.
+
+Each risk carries a `keyword_tags` bitmask, set when it is saved or ingested:
+one bit per board theme, per KRI impact keyword group and per coordinator
+role whose keywords appear in its narrative. Theme ranking is then a
+GROUP BY over the stored masks instead of re-scanning every narrative.
+
+Bit positions are stored in the database, so they are pinned in
+TAG_POSITIONS rather than taken from dict order: a new tag gets the next
+free position, and a retired tag's position is never reused.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Count
+from django.utils import timezone
+
+from .kri import COORDINATOR_MAP, IMPACT_KEYWORDS
+
+
+RISK_THEME_KEYWORDS = {
+    "Fraud / Financial Crime": [
+        "fraud", "money laundering", "aml", "cft", "theft",
+        "identity theft", "misappropriation", "unauthorized"
+    ],
+    "Operational Process Breakdown": [
+        "process", "delay", "error", "breakdown", "overdue",
+        "documentation", "reconciliation", "processing"
+    ],
+    "Customer / Service Impact": [
+        "customer", "complaint", "service", "downtime",
+        "reputational", "reputation"
+    ],
+    "Regulatory / Compliance Exposure": [
+        "regulatory", "compliance", "penalty", "sanction",
+        "legal", "litigation", "breach"
+    ],
+    "Technology / Information Security": [
+        "system", "it", "ict", "data", "privacy", "breach",
+        "access", "security", "cyber", "information leakage"
+    ],
+    "Credit / Recovery Exposure": [
+        "credit", "loan", "recovery", "collections", "default"
+    ],
+}
+THEME_TEXT_FIELDS = ["description", "caused_by", "consequences", "controls"]
+
+
+def _impact_groups():
+    groups = {}
+    for level, keywords in IMPACT_KEYWORDS:
+        groups.setdefault(f"impact:{level}", []).extend(keywords)
+    return groups
+
+
+def _coordinator_groups():
+    groups = {}
+    for keyword, coordinator in COORDINATOR_MAP.items():
+        if keyword != "__default__":
+            groups.setdefault(f"coordinator:{coordinator}", []).append(keyword)
+    return groups
+
+
+# tag name -> keywords
+TAGS = {**RISK_THEME_KEYWORDS, **_impact_groups(), **_coordinator_groups()}
+
+# tag name -> bit position in keyword_tags (never renumber)
+TAG_POSITIONS = {
+    "Fraud / Financial Crime": 0,
+    "Operational Process Breakdown": 1,
+    "Customer / Service Impact": 2,
+    "Regulatory / Compliance Exposure": 3,
+    "Technology / Information Security": 4,
+    "Credit / Recovery Exposure": 5,
+    "impact:Very High": 6,
+    "impact:High": 7,
+    "impact:Medium": 8,
+    "coordinator:Compliance Officer": 9,
+    "coordinator:Fraud & Investigations Officer": 10,
+    "coordinator:Security Coordinator": 11,
+    "coordinator:IT Support Lead": 12,
+    "coordinator:Treasury Coordinator": 13,
+    "coordinator:Customer Service Coordinator": 14,
+    "coordinator:HR Coordinator": 15,
+}
+if set(TAGS) - set(TAG_POSITIONS):
+    raise ImproperlyConfigured(
+        f"Keyword tags without a bit position in TAG_POSITIONS: {sorted(set(TAGS) - set(TAG_POSITIONS))}"
+    )
+TAG_BITS = {tag: 1 << TAG_POSITIONS[tag] for tag in TAGS}
+THEMES = list(RISK_THEME_KEYWORDS)
+
+
+def keyword_tags(text):
+    """Bitmask of every tag with at least one keyword in `text`."""
+    text = (text or "").lower()
+    mask = 0
+    for tag, words in TAGS.items():
+        if any(word in text for word in words):
+            mask |= TAG_BITS[tag]
+    return mask
+
+
+def risk_text(risk):
+    return " ".join(getattr(risk, f) or "" for f in THEME_TEXT_FIELDS)
+
+
+def tag_names(mask):
+    return [tag for tag, bit in TAG_BITS.items() if mask & bit]
+
+
+def _ranked(scores, limit):
+    ranked = [(theme, count) for theme, count in scores.items() if count > 0]
+    ranked.sort(key=lambda x: (-x[1], x[0]))
+    return ranked[:limit]
+
+
+def rank_themes(queryset, limit=5):
+    """How many risks in `queryset` touch each theme, from one grouped count."""
+    scores = dict.fromkeys(THEMES, 0)
+    for row in queryset.values("keyword_tags").annotate(n=Count("pk")).order_by():
+        for theme in THEMES:
+            if row["keyword_tags"] & TAG_BITS[theme]:
+                scores[theme] += row["n"]
+    return _ranked(scores, limit)
+
+
+def rank_loaded_themes(risks, limit=5):
+    """rank_themes for risks already in memory."""
+    scores = dict.fromkeys(THEMES, 0)
+    for risk in risks:
+        for theme in THEMES:
+            if risk.keyword_tags & TAG_BITS[theme]:
+                scores[theme] += 1
+    return _ranked(scores, limit)
+
+
+def retag_risks(queryset, chunk_size=2000):
+    """
+    Recompute keyword_tags for every risk in `queryset` (after set-based
+    text edits, or to backfill). Returns the number of risks whose mask changed.
+    Changed risks get a new updated_at, so conditional GETs see the new themes.
+    """
+    now = timezone.now()
+    changed = 0
+    last_id = 0
+    while True:
+        rows = list(
+            queryset.filter(pk__gt=last_id)
+            .order_by("pk")
+            .values_list("pk", "keyword_tags", *THEME_TEXT_FIELDS)[:chunk_size]
+        )
+        if not rows:
+            return changed
+        last_id = rows[-1][0]
+
+        by_mask = {}
+        for pk, stored, *texts in rows:
+            mask = keyword_tags(" ".join(t or "" for t in texts))
+            if mask != stored:
+                by_mask.setdefault(mask, []).append(pk)
+        for mask, ids in by_mask.items():
+            changed += queryset.model.objects.filter(pk__in=ids).update(keyword_tags=mask, updated_at=now)
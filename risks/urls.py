@@ -1,9 +1,15 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views, async_views
+
+# Read-heavy pages switch to their async variants under the ASGI profile
+read_views = async_views if settings.RISKS_ASYNC_VIEWS else views
 
 urlpatterns = [
-    path('', views.dashboard, name='dashboard'),
-    path('export-csv/', views.export_risks_csv, name='export-csv'),
+    path('', read_views.dashboard, name='dashboard'),
+    path('search/', views.search_register, name='search'),
+    path('export-csv/', read_views.export_risks_csv, name='export-csv'),
+    path('export-xlsx/', read_views.export_risks_xlsx, name='export-xlsx'),
 
     path('export-csv-clear/', views.export_risks_csv_and_clear, name='export-csv-clear'),
     path('clear-risks/', views.clear_all_risks, name='clear-risks'),
@@ -15,5 +21,19 @@ urlpatterns = [
     path('draft/<int:risk_id>/edit/', views.edit_draft_risk, name='edit-draft-risk'),
     path('drafts/approve-all/', views.bulk_approve_drafts, name='bulk-approve-drafts'),
 
-    path('board-explanation/', views.board_explanation, name='board-explanation'),
+    path('board-explanation/', read_views.board_explanation, name='board-explanation'),
+
+    path('profiles/', views.profile_runs, name='profile-runs'),
+    path('profiles/<int:run_id>/', views.profile_run_detail, name='profile-run'),
+    path('profiles/<int:run_id>/download/', views.profile_run_download, name='profile-run-download'),
+
+    path('api/risks/', api.api_risks, name='api-risks'),
+    path('api/risks/bulk/', api.api_risks_bulk, name='api-risks-bulk'),
+    path('api/matrices/', api.api_matrices, name='api-matrices'),
+    path('api/ratings/', api.api_ratings, name='api-ratings'),
+    path('api/board/', api.api_board, name='api-board'),
 ]
+
+if settings.RISKS_ASYNC_VIEWS:
+    # long-lived event stream: only served under the ASGI profile
+    urlpatterns.append(path('events/', async_views.dashboard_events, name='dashboard-events'))
@@ -1,66 +1,35 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
 from django.http import HttpResponseForbidden
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from django.http import HttpResponse
 import csv
 import re
-from .models import RiskAssessment, ReportConfiguration
-
-# ========= ZERO_OCCURRENCE_HELPER_START =========
-def is_zero_occurrence(value) -> bool:
-    if value is None:
-        return True
-
-    v = str(value).strip().lower()
-
-    ZERO_WORDS = [
-        "0", "0.0", "zero", "nil", "none", "no", "n/a", "",
-        "always updated", "timelines met", "on time", "no issues", "ok"
-    ]
-
-    return v in ZERO_WORDS
-# ========= ZERO_OCCURRENCE_HELPER_END =========
-
-
-# ========= UNIQUE_ID_GLOBAL_START =========
-def make_unique_reference_id(base_ref):
-    ref = base_ref
-    bump = 1
-    while RiskAssessment.objects.filter(reference_id=ref).exists():
-        ref = f"{base_ref}-{bump}"
-        bump += 1
-    return ref
-# ========= UNIQUE_ID_GLOBAL_END =========
-
-
+import zlib
+from django.db.models import Exists, OuterRef
+from .departments import derive_controls, derive_owner
+from .models import Department, ProfileRun, RiskAssessment, ReportConfiguration, ReportSnapshot, PROBABILITIES, IMPACTS
+from .ingest import allocate_reference_ids, upsert_ingested_risks
+from .bulk import approve_risks
+from .kri import is_zero_occurrence, kri_observation, parse_kri_report, parse_period
+from .observations import trailing_quarters, trend_probability
+from .snapshots import period_trends
+from .profiling import hot_functions, keep_runs, load_stats
+from .purge import close_register_cycle, purge_register
+from .conditional import register_conditional
+from .heatmap import heatmap_matrices
+from .reports import report_queryset, report_shell, report_version, snapshot_rows, stream_report
+from .search import filter_matching, search_risks
+from .themes import rank_loaded_themes, rank_themes
+from .xlsx import XlsxStream, register_sheets
 
 # ========= RISK_OWNER_SUGGEST_START =========
 def suggest_risk_owner(area_name):
-    a = (area_name or "").strip().lower()
-
-    if "microfinance" in a:
-        return "Head of Microfinance"
-    if "credit" in a:
-        return "Head of Credit"
-    if "finance" in a:
-        return "Head of Finance"
-    if a == "it" or " ict" in f" {a} " or " it " in f" {a} " or "information technology" in a:
-        return "Head of IT"
-    if "operations" in a or "teller" in a or "customer service" in a:
-        return "Head of Operations"
-    if "compliance" in a:
-        return "Compliance Officer"
-    if "audit" in a:
-        return "Internal Auditor"
-    if "treasury" in a:
-        return "Treasury Manager"
-    if "hr" in a or "human resource" in a:
-        return "Head of HR"
-    if "legal" in a:
-        return "Legal Officer"
-
-    return "Department Head"
+    department = Department.objects.lookup(area_name, create=False)
+    if department and department["owner"]:
+        return department["owner"]
+    return derive_owner(area_name)
 # ========= RISK_OWNER_SUGGEST_END =========
 
 
@@ -115,16 +84,10 @@ def score_impact_from_text(related_risk_text):
 
 
 def default_controls_for_area(area_name):
-    a = (area_name or "").lower()
-    if "teller" in a or "customer service" in a or "operations" in a:
-        return "Maker-checker, daily call-over, cash limits, CCTV monitoring, ID verification"
-    if "credit" in a or "microfinance" in a:
-        return "Approval workflow controls, KYC verification, monitoring visits, collections follow-up"
-    if "it" in a or "ict" in a:
-        return "Access control, system monitoring, change management, alerting, backups"
-    if "compliance" in a or "aml" in a:
-        return "Transaction monitoring, reporting controls, periodic compliance review"
-    return "Standard Controls"
+    department = Department.objects.lookup(area_name, create=False)
+    if department and department["controls"]:
+        return department["controls"]
+    return derive_controls(area_name)
 # ========= SMART_SCORING_END =========
 
 
@@ -133,87 +96,164 @@ def redirect_to_login(request):
     return redirect('/accounts/login/')
 
 
-# --- DASHBOARD ---
-@login_required
-def dashboard(request):
-    risks = RiskAssessment.objects.all().order_by('reference_id')
+# ========= REGISTER_FILTERS_START =========
+CSV_HEADER = [
+    'ID', 'Area', 'Description', 'Root Cause', 'Consequences', 'Risk Owner',
+    'Inherent Probability', 'Inherent Impact', 'Inherent Rating',
+    'Residual Probability', 'Residual Impact', 'Residual Rating'
+]
+CSV_FIELDS = [
+    'reference_id', 'area_name', 'description', 'caused_by', 'consequences', 'risk_owner',
+    'inherent_probability', 'inherent_impact', 'inherent_rating',
+    'residual_probability', 'residual_impact', 'residual_rating'
+]
 
 
-    selected_area = request.GET.get("area", "").strip()
-    available_areas = list(
-        RiskAssessment.objects.exclude(area_name__isnull=True)
-        .exclude(area_name__exact="")
-        .values_list("area_name", flat=True)
-        .distinct()
-    )
+def filter_register(risks, selected_area, filter_type, query=""):
+    """Area + draft/approved (+ full-text) filters shared by the dashboard, board page and async views."""
+    if query:
+        risks = filter_matching(risks, query)
+
     if selected_area:
         risks = risks.filter(area_name=selected_area)
 
-    filter_type = request.GET.get("filter", "all").strip()
     if filter_type == "draft":
         risks = risks.filter(description__startswith="[DRAFT]")
     elif filter_type == "approved":
         risks = risks.exclude(description__startswith="[DRAFT]")
+    return risks
+
+
+def available_areas_queryset():
+    """Departments that have at least one risk (an indexed semi-join, not a DISTINCT scan)."""
+    return (
+        Department.objects.filter(Exists(RiskAssessment.objects.filter(department=OuterRef("pk"))))
+        .values_list("name", flat=True)
+    )
+
+
+def get_matrix_counts(risks, risk_type):
+    matrix_grid = {p: {i: 0 for i in IMPACTS} for p in PROBABILITIES}
+    for r in risks:
+        if risk_type == 'inherent':
+            p, i = r.inherent_probability, r.inherent_impact
+        else:
+            p, i = r.residual_probability, r.residual_impact
+
+        if p in matrix_grid and i in matrix_grid[p]:
+            matrix_grid[p][i] += 1
+    return matrix_grid
+# ========= REGISTER_FILTERS_END =========
+
 
-    probabilities = ['Very High', 'High', 'Medium', 'Low', 'Very Low']
-    impacts = ['Very Low', 'Low', 'Medium', 'High', 'Very High']
+# --- DASHBOARD ---
+@login_required
+@register_conditional(csrf=True)
+def dashboard(request):
+    risks = RiskAssessment.objects.all().order_by('reference_id')
 
-    def get_matrix_counts(risk_type):
-        matrix_grid = {p: {i: 0 for i in impacts} for p in probabilities}
-        for r in risks:
-            if risk_type == 'inherent':
-                p, i = r.inherent_probability, r.inherent_impact
-            else:
-                p, i = r.residual_probability, r.residual_impact
+    selected_area = request.GET.get("area", "").strip()
+    available_areas = list(available_areas_queryset())
 
-            if p in matrix_grid and i in matrix_grid[p]:
-                matrix_grid[p][i] += 1
-        return matrix_grid
+    filter_type = request.GET.get("filter", "all").strip()
+    query = request.GET.get("q", "").strip()
+    risks = filter_register(risks, selected_area, filter_type, query)
+
+    if query:
+        # search matches are not materialised per heatmap cell
+        counts = {
+            'total_risks': risks.count(),
+            'critical_risks': risks.filter(residual_rating='Critical').count(),
+            'inherent_matrix': get_matrix_counts(risks, 'inherent'),
+            'residual_matrix': get_matrix_counts(risks, 'residual'),
+        }
+    else:
+        counts = heatmap_matrices(selected_area, filter_type)
 
     context = {
         'risks': risks,
-        'total_risks': risks.count(),
-        'critical_risks': risks.filter(residual_rating='Critical').count(),
+        **counts,
         'user': request.user,
-        'probabilities': probabilities,
-        'impacts': impacts,
-        'inherent_matrix': get_matrix_counts('inherent'),
-        'residual_matrix': get_matrix_counts('residual'),
+        'probabilities': PROBABILITIES,
+        'impacts': IMPACTS,
         'available_areas': available_areas,
         'selected_area': selected_area,
         'filter_type': filter_type,
+        'query': query,
+        'period_trends': period_trends(selected_area, filter_type),
     }
     return render(request, 'risks/dashboard.html', context)
 
 
+# --- SEARCH ---
+@login_required
+def search_register(request):
+    """Ranked full-text search over the register narratives, as JSON."""
+    query = request.GET.get("q", "").strip()
+    try:
+        limit = min(max(int(request.GET.get("limit", 20)), 1), 200)
+    except ValueError:
+        limit = 20
+
+    risks = filter_register(
+        RiskAssessment.objects.all(),
+        request.GET.get("area", "").strip(),
+        request.GET.get("filter", "all").strip(),
+    )
+    results = [
+        {
+            "id": r.pk,
+            "reference_id": r.reference_id,
+            "area_name": r.area_name,
+            "description": r.description,
+            "residual_rating": r.residual_rating,
+            "rank": r.search_rank,
+        }
+        for r in search_risks(query, risks, limit=limit)
+    ]
+    return JsonResponse({"query": query, "count": len(results), "results": results})
+
+
 # --- EXPORT CSV ---
 @login_required
+@register_conditional()
 def export_risks_csv(request):
     response = HttpResponse(content_type='text/csv')
     response['Content-Disposition'] = 'attachment; filename="risk_register.csv"'
     writer = csv.writer(response)
-    writer.writerow(['ID', 'Area', 'Description', 'Root Cause', 'Consequences', 'Risk Owner', 'Inherent Probability', 'Inherent Impact', 'Inherent Rating', 'Residual Probability', 'Residual Impact', 'Residual Rating'])
-
-    for risk in RiskAssessment.objects.all().order_by('-created_at'):
-        writer.writerow([
-            risk.reference_id,
-            risk.area_name,
-            risk.description,
-            risk.caused_by,
-            risk.consequences,
-            risk.risk_owner,
-            risk.inherent_probability,
-            risk.inherent_impact,
-            risk.inherent_rating,
-            risk.residual_probability,
-            risk.residual_impact,
-            risk.residual_rating
-        ])
+    writer.writerow(CSV_HEADER)
+
+    for row in RiskAssessment.objects.all().order_by('-created_at').values_list(*CSV_FIELDS):
+        writer.writerow(row)
+    return response
+
+
+# --- EXPORT XLSX ---
+XLSX_RATING_COLUMNS = [CSV_FIELDS.index('inherent_rating'), CSV_FIELDS.index('residual_rating')]
+XLSX_WIDTHS = {0: 24, 2: 60, 3: 40, 4: 40}
+
+
+def xlsx_response(streaming_content):
+    response = StreamingHttpResponse(
+        streaming_content,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+    response['Content-Disposition'] = 'attachment; filename="risk_register.xlsx"'
     return response
 
 
+@login_required
+@register_conditional()
+def export_risks_xlsx(request):
+    """The register as a workbook with one sheet per area, streamed while it is written."""
+    rows = report_queryset().values_list(*CSV_FIELDS).iterator(chunk_size=2000)
+    stream = XlsxStream(CSV_HEADER, rating_columns=XLSX_RATING_COLUMNS, widths=XLSX_WIDTHS)
+    return xlsx_response(register_sheets(rows, stream, area_column=CSV_FIELDS.index('area_name')))
+
+
 # --- OFFICIAL REPORT ---
 @login_required
+@register_conditional(csrf=True)
 def official_report(request):
     if not request.user.is_superuser and not request.user.has_perm('risks.view_reportconfiguration'):
         return HttpResponseForbidden("<h1>Access Denied</h1><p>You do not have permission to view this official document.</p>")
@@ -226,24 +266,21 @@ def official_report(request):
             config.executive_summary = new_summary
             config.save()
 
-    risks = RiskAssessment.objects.all().order_by('area_name', 'reference_id')
-
-
-    # group by area_name for headings
-    grouped = {}
-    for r in risks:
-        key = r.area_name or "UNSPECIFIED"
-        grouped.setdefault(key, []).append(r)
-
+    version = report_version(config)
+    snapshot = ReportSnapshot.objects.filter(version=version).first()
     context = {
-        'risks': risks,
-        'grouped_risks': grouped,
         'config': config,
-        'generated_at': timezone.now(),
+        'generated_at': snapshot.created_at if snapshot else timezone.now(),
         'generated_by': request.user.username,
         'is_admin': request.user.is_superuser
     }
-    return render(request, 'admin/official_report.html', context)
+    head, tail = report_shell(request, context)
+    if snapshot:
+        response = HttpResponse(head + snapshot_rows(snapshot) + tail)
+    else:
+        # first view of this version: stream while the snapshot is written
+        response = StreamingHttpResponse(stream_report(head, tail, version, config.executive_summary))
+    return response
 
 
 # ========= AI EXTRACT (Preview) =========
@@ -301,13 +338,12 @@ def ai_extract_risks(request):
 
             base_ref = f"RISK-{area_name[:12].upper().replace(' ', '-')}-{counter:03d}"
             base_ref = re.sub(r"[^A-Z0-9\-]", "", base_ref)
-            reference_id = make_unique_reference_id(base_ref)
 
             prob = score_probability_from_occurrence(occurrence)
             impact = score_impact_from_text(related_risk + " " + process)
 
             extracted.append({
-                "reference_id": reference_id,
+                "reference_id": base_ref,
                 "area_name": area_name,
                 "reporting_period": reporting_period,
                 "risk_owner": suggest_risk_owner(area_name),
@@ -331,6 +367,10 @@ def ai_extract_risks(request):
             })
             counter += 1
 
+        # one lookup per RISK-<AREA> prefix instead of an exists() per row
+        for row, reference_id in zip(extracted, allocate_reference_ids([r["reference_id"] for r in extracted])):
+            row["reference_id"] = reference_id
+
         return area_name, reporting_period, extracted
 
     context = {"raw_text": "", "area_name": "", "reporting_period": "", "results": [], "error": ""}
@@ -343,6 +383,17 @@ def ai_extract_risks(request):
             context["error"] = "Please paste your KRI table text first."
         else:
             area_name, reporting_period, results = _parse_pasted_text(raw_text)
+            trends = trailing_quarters(
+                # a preview must not register the area as a department
+                Department.objects.canonical_name(area_name, create=False),
+                as_of=parse_period(reporting_period),
+                kris=[r["source_kri"] for r in results],
+            )
+            for r in results:
+                values = trends.get(r["source_kri"])
+                if values:
+                    r["kri_trend"] = ["-" if v is None else f"{v:g}" for v in values]
+                    r["trend_probability"] = trend_probability(values, r["source_occurrence"].strip().endswith("%"))
             context["area_name"] = area_name
             context["reporting_period"] = reporting_period
             context["results"] = results
@@ -352,6 +403,15 @@ def ai_extract_risks(request):
     return render(request, "risks/ai_extract.html", context)
 
 
+def ingest_complete(request, summary):
+    """Flash the ingest summary for the dashboard to show once."""
+    messages.info(
+        request,
+        f"KRI ingest complete: {summary['inserted']} inserted, {summary['updated']} updated, "
+        f"{summary['skipped']} unchanged.",
+    )
+
+
 # ========= SAVE DRAFTS =========
 @login_required
 def ai_extract_save_drafts(request):
@@ -367,21 +427,15 @@ def ai_extract_save_drafts(request):
             return [p.strip() for p in line.split("\t") if p.strip()]
         return [p.strip() for p in re.split(r"\s{2,}", line.strip()) if p.strip()]
 
-    def _make_unique_reference_id(base_ref):
-        ref = base_ref
-        bump = 1
-        while RiskAssessment.objects.filter(reference_id=ref).exists():
-            ref = f"{base_ref}-{bump}"
-            bump += 1
-        return ref
-
     lines = [ln.strip() for ln in raw_text.splitlines() if ln.strip()]
 
     area_name = ""
+    reporting_period = ""
     for ln in lines[:5]:
         if "Reporting Period:" in ln:
-            left, _right = ln.split("Reporting Period:", 1)
+            left, right = ln.split("Reporting Period:", 1)
             area_name = left.strip()
+            reporting_period = right.strip()
             break
     if not area_name and lines:
         area_name = lines[0].strip()
@@ -394,58 +448,54 @@ def ai_extract_save_drafts(request):
 
     data_lines = lines[header_idx + 1:] if header_idx != -1 and header_idx + 1 < len(lines) else lines[1:]
 
+    rows = []
+    observations = []
     counter = 1
     for ln in data_lines:
         parts = _split_row(ln)
         if len(parts) < 4:
             continue
 
-        kri = parts[0] if len(parts) >= 1 else ""
-        kri_desc = parts[1] if len(parts) >= 2 else ""
-        related_risk = parts[2] if len(parts) >= 3 else ""
-        occurrence = parts[4] if len(parts) >= 5 else ""
         kri = parts[0] if len(parts) >= 1 else ""
         kri_desc = parts[1] if len(parts) >= 2 else ""
         related_risk = parts[2] if len(parts) >= 3 else ""
         process = parts[3] if len(parts) >= 4 else ""
         occ = parts[4] if len(parts) >= 5 else ""
 
+        observations.append(kri_observation(area_name, reporting_period, kri, process, occ))
+
         # ===== SKIP ZERO OCCURRENCE RISKS =====
         if is_zero_occurrence(occ):
             continue
         # =====================================
 
-
         base_ref = f"RISK-{area_name[:12].upper().replace(' ', '-')}-{counter:03d}"
         base_ref = re.sub(r"[^A-Z0-9\-]", "", base_ref)
-        reference_id = _make_unique_reference_id(base_ref)
 
-        prob = score_probability_from_occurrence(occurrence)
+        prob = score_probability_from_occurrence(occ)
         impact = score_impact_from_text(related_risk)
 
-        description_text = "[DRAFT] " + (related_risk.strip() or kri.strip() or "TBD")
-
-        try:
-            RiskAssessment.objects.create(
-                reference_id=make_unique_reference_id(f"RISK-{area_name[:12].upper().replace(' ', '-')}-{counter:03d}"),
-                area_name=area_name,
-                description=description_text,
-                caused_by=kri_desc.strip(),
-                consequences=related_risk.strip(),
-                risk_owner=suggest_risk_owner(area_name),
-                inherent_probability=prob,
-                inherent_impact=impact,
-                residual_probability=prob,
-                residual_impact=impact,
-                controls="Maker-checker, recovery tracking, escalation matrix, legal oversight",
-                control_owner=suggest_risk_owner(area_name),
-                updated_by=request.user
-            )
-        except Exception:
-            pass
+        rows.append({
+            "base_ref": base_ref,
+            "kri_text": f"{kri} {kri_desc}",
+            "area_name": area_name,
+            "reporting_period": reporting_period,
+            "description": "[DRAFT] " + (related_risk.strip() or kri.strip() or "TBD"),
+            "caused_by": kri_desc.strip(),
+            "consequences": related_risk.strip(),
+            "risk_owner": suggest_risk_owner(area_name),
+            "inherent_probability": prob,
+            "inherent_impact": impact,
+            "residual_probability": prob,
+            "residual_impact": impact,
+            "controls": "Maker-checker, recovery tracking, escalation matrix, legal oversight",
+            "control_owner": suggest_risk_owner(area_name),
+        })
 
         counter += 1
 
+    summary = upsert_ingested_risks(rows, user=request.user, observations=observations)
+    ingest_complete(request, summary)
     return redirect("dashboard")
 
 
@@ -460,259 +510,12 @@ def ai_extract_save_and_approve(request):
     if not raw_text or not raw_text.strip():
         return redirect("ai-extract")
 
-    import re
-
-    def split_row(line):
-        if "\t" in line:
-            return [p.strip() for p in line.split("\t") if p.strip()]
-        return [p.strip() for p in re.split(r"\s{2,}", line.strip()) if p.strip()]
-
-    def make_unique_reference_id(base_ref):
-        ref = base_ref
-        bump = 1
-        while RiskAssessment.objects.filter(reference_id=ref).exists():
-            ref = f"{base_ref}-{bump}"
-            bump += 1
-        return ref
-
-    def likelihood_from_occurrence(value):
-        v = str(value).strip().lower()
-
-        # percentage like 10%
-        if v.endswith("%"):
-            try:
-                pct = float(v.replace("%", "").strip())
-            except ValueError:
-                pct = 0.0
-            if pct <= 0:
-                return "Very Low"
-            if pct < 5:
-                return "Medium"
-            if pct < 10:
-                return "High"
-            return "Very High"
-
-        # frequency phrases
-        if any(x in v for x in ["daily", "per day", "every day"]):
-            return "Very High"
-        if any(x in v for x in ["weekly", "per week", "frequently", "often"]):
-            return "High"
-        if any(x in v for x in ["monthly", "per month"]):
-            return "Medium"
-        if any(x in v for x in ["quarterly", "per quarter"]):
-            return "Low"
-        if any(x in v for x in ["annually", "annual", "per year"]):
-            return "Low"
-
-        # numeric
-        try:
-            n = int(v)
-        except ValueError:
-            # blank/unknown text -> Medium is safer than Low
-            return "Medium"
-
-        if n <= 0:
-            return "Very Low"
-        if n == 1:
-            return "Low"
-        if 2 <= n <= 3:
-            return "Medium"
-        if 4 <= n <= 9:
-            return "High"
-        return "Very High"
-
-    def impact_from_text(text):
-        t = (text or "").lower()
-
-        very_high = [
-            "money laundering", "aml", "cft", "sanction", "regulatory", "penalty",
-            "fraud", "theft", "misappropriation", "terrorist financing",
-            "data breach", "privacy breach", "identity theft", "loss of funds"
-        ]
-        high = [
-            "legal", "contract", "reputational", "litigation", "complaint to the regulator",
-            "regulatory scrutiny", "enforcement"
-        ]
-        medium = [
-            "operational", "process", "delay", "reporting", "documentation", "control breakdown",
-            "governance", "recommendation", "overdue corrective"
-        ]
-
-        if any(k in t for k in very_high):
-            return "Very High"
-        if any(k in t for k in high):
-            return "High"
-        if any(k in t for k in medium):
-            return "Medium"
-        if any(k in t for k in ["vault", "insurance", "cash exposure", "cash vault"]):
-            return "High"
-
-        return "Medium"
-
-    def reduce_level(level):
-        order = ["Very Low", "Low", "Medium", "High", "Very High"]
-        if level not in order:
-            level = "Medium"
-        return order[max(order.index(level) - 1, 0)]
-
-    # ---------- PARSE LINES ----------
-    lines = [ln.strip() for ln in raw_text.splitlines() if ln.strip()]
-    if not lines:
-        return redirect("ai-extract")
-
-    # Parse area name safely from first line
-    first = lines[0]
-    if "Reporting Period:" in first:
-        area_name = first.split("Reporting Period:", 1)[0].strip()
-    else:
-        area_name = first.strip()
-
-    # Find header safely (no StopIteration)
-    header_idx = -1
-    for i, ln in enumerate(lines):
-        if "Key Risk Indicator" in ln:
-            header_idx = i
-            break
-
-    data_lines = lines[header_idx + 1:] if header_idx != -1 else lines[1:]
-
-    OWNER_MAP = {
-        "COMPLIANCE": "Compliance Manager",
-        "AML": "Compliance Manager",
-        "AUDIT": "Internal Auditor",
-        "CREDIT": "Head of Credit",
-        "LOAN RECOVERY": "Head of Credit",
-        "SUSU": "Head of Operations",
-        "OPERATIONAL": "Head of Operations",
-        "IT": "Head of IT",
-        "FINANCE": "Head of Finance",
-        "TREASURY": "Head of Treasury",
-    }
-
-    # ========= COORDINATOR_MAP_START =========
-    COORDINATOR_MAP = {
-        # Compliance / AML
-        "aml": "Compliance Officer",
-        "cft": "Compliance Officer",
-        "money laundering": "Compliance Officer",
-        "sanction": "Compliance Officer",
-        "regulatory": "Compliance Officer",
-        "fic": "Compliance Officer",
-        "bog": "Compliance Officer",
-
-        # Fraud / theft
-        "fraud": "Fraud & Investigations Officer",
-        "theft": "Fraud & Investigations Officer",
-        "misappropriation": "Fraud & Investigations Officer",
-        "robbery": "Security Coordinator",
-
-        # IT / systems
-        "system": "IT Support Lead",
-        "downtime": "IT Support Lead",
-        "alert": "IT Support Lead",
-        "verification system": "IT Support Lead",
-
-        # Treasury / liquidity
-        "liquidity": "Treasury Coordinator",
-        "reserve": "Treasury Coordinator",
-        "clearing": "Treasury Coordinator",
-        "settlement": "Treasury Coordinator",
-
-        # Customer / service
-        "complaint": "Customer Service Coordinator",
-        "reputational": "Customer Service Coordinator",
-
-        # HR / people
-        "staff": "HR Coordinator",
-        "training": "HR Coordinator",
-        "competency": "HR Coordinator",
-
-        "__default__": "Risk & Compliance Coordinator",
-    }
-    # ========= COORDINATOR_MAP_END =========
-
-    counter = 1
-
-    for ln in data_lines:
-        # ===== SKIP TABLE HEADER ROW =====
-        if "kri description" in ln.lower() and "related risk" in ln.lower():
-            continue
-        # ================================
-
-        parts = split_row(ln)
-        if len(parts) < 3:
-            continue
-
-        kri = parts[0] if len(parts) >= 1 else ""
-        kri_desc = parts[1] if len(parts) >= 2 else ""
-        related_risk = parts[2] if len(parts) >= 3 else ""
-        process = parts[3] if len(parts) >= 4 else ""
-        occ = parts[4] if len(parts) >= 5 else ""
-
-        # ========= OWNER_SELECT_START =========
-        owner = "Department Head"
-        for k, v in OWNER_MAP.items():
-            if k in area_name.upper():
-                owner = v
-                break
-        # ========= OWNER_SELECT_END =========
-
-        # ========= COORDINATOR_SELECT_START =========
-        combined_text = f"{kri} {kri_desc} {related_risk} {process}".lower()
-
-        coordinator = COORDINATOR_MAP.get("__default__", "Risk Coordinator")
-        for key, coord_name in COORDINATOR_MAP.items():
-            if key != "__default__" and key in combined_text:
-                coordinator = coord_name
-                break
-        # ========= COORDINATOR_SELECT_END =========
-
-        # (then continue with your skip-zero check, scoring, and create())
-
-        # ===== SKIP ZERO OCCURRENCE RISKS =====
-        if is_zero_occurrence(occ):
-            continue
-        # =====================================
-
-
-        inherent_prob = likelihood_from_occurrence(occ)
-        inherent_impact = impact_from_text(" ".join([related_risk, kri, kri_desc, process]))
-
-        residual_prob = reduce_level(inherent_prob)
-        residual_impact = reduce_level(inherent_impact)
-
-        base_ref = f"RISK-{area_name[:12].upper().replace(' ', '-')}-{counter:03d}"
-        base_ref = re.sub(r"[^A-Z0-9\-]", "", base_ref)
-        reference_id = make_unique_reference_id(base_ref)
-
-        # Safe create: never crash whole request
-        try:
-            RiskAssessment.objects.create(
-                reference_id=reference_id,
-                area_name=area_name,
-                description=related_risk or kri or "TBD",
-                caused_by=kri_desc,
-                consequences=related_risk,
-                risk_owner=owner,
-                risk_coordinator_name=coordinator,   # ✅ HERE
-                inherent_probability=inherent_prob,
-                inherent_impact=inherent_impact,
-                residual_probability=residual_prob,
-                residual_impact=residual_impact,
-                controls="Standard Controls",
-                control_owner=owner,
-                updated_by=request.user
-            )
-        except Exception:
-            pass
-
-        counter += 1
-
+    rows, observations = parse_kri_report(raw_text, with_observations=True)
+    summary = upsert_ingested_risks(rows, user=request.user, observations=observations)
+    ingest_complete(request, summary)
     return redirect("dashboard")
 
 
-
-
 @login_required
 def edit_draft_risk(request, risk_id):
     risk = get_object_or_404(RiskAssessment, id=risk_id)
@@ -752,12 +555,11 @@ def bulk_approve_drafts(request):
     if not request.user.is_staff:
         return redirect("dashboard")
 
-    drafts = RiskAssessment.objects.filter(description__startswith="[DRAFT]")
-    for risk in drafts:
-        risk.description = risk.description.replace("[DRAFT] ", "", 1)
-        risk.save()
+    approve_risks(RiskAssessment.objects.all(), request.user)
 
     return redirect("dashboard")
+
+
 # ========= EXPORT_AND_CLEAR_START =========
 @login_required
 def export_risks_csv_and_clear(request):
@@ -771,30 +573,18 @@ def export_risks_csv_and_clear(request):
     response['Content-Disposition'] = 'attachment; filename="risk_register_and_cleared.csv"'
     writer = csv.writer(response)
 
-    writer.writerow([
-        'ID', 'Area', 'Description', 'Root Cause', 'Consequences', 'Risk Owner',
-        'Inherent Probability', 'Inherent Impact', 'Inherent Rating',
-        'Residual Probability', 'Residual Impact', 'Residual Rating'
-    ])
-
-    risks_qs = RiskAssessment.objects.all().order_by('-created_at')
-    for risk in risks_qs:
-        writer.writerow([
-            risk.reference_id,
-            risk.area_name,
-            risk.description,
-            risk.caused_by,
-            risk.consequences,
-            risk.risk_owner,
-            risk.inherent_probability,
-            risk.inherent_impact,
-            risk.inherent_rating,
-            risk.residual_probability,
-            risk.residual_impact,
-            risk.residual_rating
-        ])
-
-    RiskAssessment.objects.all().delete()
+    writer.writerow(CSV_HEADER)
+
+    last_exported_id = 0
+    for pk, *row in RiskAssessment.objects.all().order_by('-created_at').values_list('pk', *CSV_FIELDS):
+        writer.writerow(row)
+        last_exported_id = max(last_exported_id, pk)
+
+    # the CSV is fully rendered into the response before anything is deleted,
+    # and risks ingested since it was read are kept for the next cycle
+    close_register_cycle(request.user)
+    if last_exported_id:
+        purge_register(up_to_id=last_exported_id)
     return response
 # ========= EXPORT_AND_CLEAR_END =========
 # ========= CLEAR_RISKS_START =========
@@ -808,7 +598,8 @@ def clear_all_risks(request):
         return redirect("dashboard")
 
     if request.method == "POST":
-        RiskAssessment.objects.all().delete()
+        close_register_cycle(request.user)
+        purge_register()
         return redirect("/?cleared=1")
 
     return redirect("dashboard")
@@ -829,49 +620,7 @@ def _rating_counts(qs, field_name):
 
 
 def _top_risk_themes(risks, limit=5):
-    keyword_map = {
-        "Fraud / Financial Crime": [
-            "fraud", "money laundering", "aml", "cft", "theft",
-            "identity theft", "misappropriation", "unauthorized"
-        ],
-        "Operational Process Breakdown": [
-            "process", "delay", "error", "breakdown", "overdue",
-            "documentation", "reconciliation", "processing"
-        ],
-        "Customer / Service Impact": [
-            "customer", "complaint", "service", "downtime",
-            "reputational", "reputation"
-        ],
-        "Regulatory / Compliance Exposure": [
-            "regulatory", "compliance", "penalty", "sanction",
-            "legal", "litigation", "breach"
-        ],
-        "Technology / Information Security": [
-            "system", "it", "ict", "data", "privacy", "breach",
-            "access", "security", "cyber", "information leakage"
-        ],
-        "Credit / Recovery Exposure": [
-            "credit", "loan", "recovery", "collections", "default"
-        ],
-    }
-
-    scores = {k: 0 for k in keyword_map.keys()}
-
-    for risk in risks:
-        combined = " ".join([
-            risk.description or "",
-            risk.caused_by or "",
-            risk.consequences or "",
-            risk.controls or "",
-        ]).lower()
-
-        for theme, words in keyword_map.items():
-            if any(word in combined for word in words):
-                scores[theme] += 1
-
-    ranked = [(theme, count) for theme, count in scores.items() if count > 0]
-    ranked.sort(key=lambda x: (-x[1], x[0]))
-    return ranked[:limit]
+    return rank_loaded_themes(risks, limit)
 
 
 def _sample_risks(risks, limit=5):
@@ -886,7 +635,8 @@ def _sample_risks(risks, limit=5):
     return ranked[:limit]
 
 
-def _build_board_narrative(area_name, risks):
+def _build_board_narrative(area_name, risks, themes=None):
+    """`themes`: ranked (theme, count) pairs if already counted by the database."""
     total = len(risks)
 
     if total == 0:
@@ -1022,7 +772,8 @@ def _build_board_narrative(area_name, risks):
         f"controls are helping management contain the department’s most significant risk drivers."
     )
 
-    themes = _top_risk_themes(risks)
+    if themes is None:
+        themes = _top_risk_themes(risks)
     sample_risks = _sample_risks(risks)
 
     return {
@@ -1042,298 +793,73 @@ def _build_board_narrative(area_name, risks):
 
 
 @login_required
+@register_conditional()
 def board_explanation(request):
     selected_area = request.GET.get("area", "").strip()
     filter_type = request.GET.get("filter", "approved").strip()
 
     risks = RiskAssessment.objects.all().order_by("area_name", "reference_id")
-
-    available_areas = list(
-        RiskAssessment.objects.exclude(area_name__isnull=True)
-        .exclude(area_name__exact="")
-        .values_list("area_name", flat=True)
-        .distinct()
-    )
-
-    if selected_area:
-        risks = risks.filter(area_name=selected_area)
-
-    if filter_type == "draft":
-        risks = risks.filter(description__startswith="[DRAFT]")
-    elif filter_type == "approved":
-        risks = risks.exclude(description__startswith="[DRAFT]")
+    available_areas = list(available_areas_queryset())
+    risks = filter_register(risks, selected_area, filter_type)
 
     risk_list = list(risks)
-    narrative = _build_board_narrative(selected_area, risk_list)
+    narrative = _build_board_narrative(selected_area, risk_list, themes=rank_themes(risks))
 
     context = {
         "selected_area": selected_area,
         "filter_type": filter_type,
         "available_areas": available_areas,
         "risks": risk_list,
+        "period_trends": period_trends(selected_area, filter_type),
         **narrative,
     }
     return render(request, "risks/board_explanation.html", context)
 # ========= BOARD_EXPLANATION_END =========
-# ========= BOARD_EXPLANATION_START =========
-def _rating_counts(qs, field_name):
-    counts = {
-        "Critical": 0,
-        "Severe": 0,
-        "Moderate": 0,
-        "Sustainable": 0,
-    }
-    for item in qs:
-        value = getattr(item, field_name, "") or ""
-        if value in counts:
-            counts[value] += 1
-    return counts
-
-
-def _top_risk_themes(risks, limit=5):
-    keyword_map = {
-        "Fraud / Financial Crime": [
-            "fraud", "money laundering", "aml", "cft", "theft",
-            "identity theft", "misappropriation", "unauthorized"
-        ],
-        "Operational Process Breakdown": [
-            "process", "delay", "error", "breakdown", "overdue",
-            "documentation", "reconciliation", "processing"
-        ],
-        "Customer / Service Impact": [
-            "customer", "complaint", "service", "downtime",
-            "reputational", "reputation"
-        ],
-        "Regulatory / Compliance Exposure": [
-            "regulatory", "compliance", "penalty", "sanction",
-            "legal", "litigation", "breach"
-        ],
-        "Technology / Information Security": [
-            "system", "it", "ict", "data", "privacy", "breach",
-            "access", "security", "cyber", "information leakage"
-        ],
-        "Credit / Recovery Exposure": [
-            "credit", "loan", "recovery", "collections", "default"
-        ],
-    }
-
-    scores = {k: 0 for k in keyword_map.keys()}
-
-    for risk in risks:
-        combined = " ".join([
-            risk.description or "",
-            risk.caused_by or "",
-            risk.consequences or "",
-            risk.controls or "",
-        ]).lower()
-
-        for theme, words in keyword_map.items():
-            if any(word in combined for word in words):
-                scores[theme] += 1
-
-    ranked = [(theme, count) for theme, count in scores.items() if count > 0]
-    ranked.sort(key=lambda x: (-x[1], x[0]))
-    return ranked[:limit]
-
-
-def _sample_risks(risks, limit=5):
-    ranked = sorted(
-        risks,
-        key=lambda r: (
-            {"Critical": 0, "Severe": 1, "Moderate": 2, "Sustainable": 3}.get(r.residual_rating, 9),
-            {"Critical": 0, "Severe": 1, "Moderate": 2, "Sustainable": 3}.get(r.inherent_rating, 9),
-            r.reference_id
-        )
-    )
-    return ranked[:limit]
-
-
-def _build_board_narrative(area_name, risks):
-    total = len(risks)
-
-    if total == 0:
-        return {
-            "executive_summary": (
-                f"No risk records are currently available for {area_name or 'the selected department'}, "
-                "so a board-ready explanation cannot yet be generated."
-            ),
-            "inherent_summary": "No inherent risk profile is available because no risks were found.",
-            "residual_summary": "No residual risk profile is available because no risks were found.",
-            "control_effectiveness": "Control effectiveness cannot be assessed until risk records are available.",
-            "board_recommendation": (
-                "Management should ensure the department’s current risk register is populated and validated "
-                "before the next board reporting cycle."
-            ),
-            "top_themes": [],
-            "sample_risks": [],
-            "inherent_counts": {"Critical": 0, "Severe": 0, "Moderate": 0, "Sustainable": 0},
-            "residual_counts": {"Critical": 0, "Severe": 0, "Moderate": 0, "Sustainable": 0},
-            "improvement_count": 0,
-            "unchanged_count": 0,
-            "worsened_count": 0,
-        }
-
-    inherent_counts = _rating_counts(risks, "inherent_rating")
-    residual_counts = _rating_counts(risks, "residual_rating")
-
-    scale = {"Sustainable": 1, "Moderate": 2, "Severe": 3, "Critical": 4}
-    improvement_count = 0
-    unchanged_count = 0
-    worsened_count = 0
-
-    for risk in risks:
-        before = scale.get(risk.inherent_rating, 0)
-        after = scale.get(risk.residual_rating, 0)
-        if after < before:
-            improvement_count += 1
-        elif after == before:
-            unchanged_count += 1
-        else:
-            worsened_count += 1
 
-    inherent_high = inherent_counts["Critical"] + inherent_counts["Severe"]
-    residual_high = residual_counts["Critical"] + residual_counts["Severe"]
 
-    area_label = area_name or "Selected Department"
+# ========= PROFILE_RUNS_START =========
+def _superuser_only(request):
+    if not request.user.is_superuser:
+        return HttpResponseForbidden("<h1>Access Denied</h1><p>Profiles are only available to administrators.</p>")
+    return None
 
-    if inherent_high >= max(1, round(total * 0.5)):
-        inherent_tone = (
-            "The inherent risk profile is elevated, with a significant share of exposures falling within the "
-            "Critical and Severe bands before controls are applied."
-        )
-    elif inherent_high > 0:
-        inherent_tone = (
-            "The inherent risk profile shows a mixed position, with some material exposures in the higher bands "
-            "before controls are applied."
-        )
-    else:
-        inherent_tone = (
-            "The inherent risk profile is comparatively contained, with exposures concentrated mainly in the "
-            "Moderate and Sustainable bands before controls are applied."
-        )
-
-    if residual_high == 0:
-        residual_tone = (
-            "After controls, the residual risk profile appears well contained, with no remaining exposures in the "
-            "Critical or Severe bands."
-        )
-    elif residual_high < inherent_high:
-        residual_tone = (
-            "After controls, the residual risk profile improves relative to the inherent position, although some "
-            "higher-risk exposures remain and still require management attention."
-        )
-    else:
-        residual_tone = (
-            "After controls, the residual risk profile remains materially elevated, indicating that existing "
-            "mitigation measures may not yet be reducing exposure to the desired level."
-        )
 
-    if improvement_count >= max(1, round(total * 0.5)):
-        effectiveness_text = (
-            "Overall, the control environment appears to be having a meaningful moderating effect on risk exposure, "
-            "as a majority of risks reduce in rating from inherent to residual position."
-        )
-    elif improvement_count > 0:
-        effectiveness_text = (
-            "The control environment is providing partial mitigation benefit, but its impact is uneven across the "
-            "department’s risk universe."
-        )
-    else:
-        effectiveness_text = (
-            "The current control environment does not yet show clear evidence of risk reduction across the portfolio, "
-            "and further strengthening may be required."
-        )
-
-    if residual_counts["Critical"] > 0:
-        recommendation = (
-            "Board attention is recommended for the remaining Critical residual exposures. Management should present "
-            "targeted remediation actions, named accountabilities, and implementation timelines for those items."
-        )
-    elif residual_counts["Severe"] > 0:
-        recommendation = (
-            "The board may note that while controls are reducing exposure, some Severe residual risks remain. "
-            "Management should continue focused monitoring and strengthen controls in the affected areas."
-        )
-    else:
-        recommendation = (
-            "The board may note that the department’s residual exposure is presently within a more manageable range. "
-            "Management should sustain the current control discipline and continue periodic monitoring."
-        )
-
-    executive_summary = (
-        f"The risk assessment for {area_label} covers {total} identified risk item"
-        f"{'' if total == 1 else 's'}. Before controls, {inherent_counts['Critical']} risk(s) were rated Critical, "
-        f"{inherent_counts['Severe']} Severe, {inherent_counts['Moderate']} Moderate, and "
-        f"{inherent_counts['Sustainable']} Sustainable. After accounting for controls, the profile moved to "
-        f"{residual_counts['Critical']} Critical, {residual_counts['Severe']} Severe, "
-        f"{residual_counts['Moderate']} Moderate, and {residual_counts['Sustainable']} Sustainable. "
-        f"This indicates that {improvement_count} risk(s) improved, {unchanged_count} remained unchanged, "
-        f"and {worsened_count} worsened between the inherent and residual positions."
-    )
-
-    inherent_summary = (
-        f"For {area_label}, the inherent risk position reflects the level of exposure that exists before the full "
-        f"effect of controls is considered. {inherent_tone} This means the department is naturally exposed to "
-        f"operational, compliance, financial, or service-related pressures that could affect performance, customer "
-        f"confidence, regulatory standing, or loss outcomes if not actively managed."
-    )
-
-    residual_summary = (
-        f"The residual risk position reflects the level of exposure that remains after existing controls and response "
-        f"measures are considered. {residual_tone} In practical terms, this shows the extent to which current "
-        f"controls are helping management contain the department’s most significant risk drivers."
-    )
+@login_required
+def profile_runs(request):
+    """Stored ?_profile traces, newest first."""
+    denied = _superuser_only(request)
+    if denied:
+        return denied
+    runs = ProfileRun.objects.select_related("user").defer("stats")
+    return render(request, "risks/profile_runs.html", {"runs": runs, "keep": keep_runs()})
 
-    themes = _top_risk_themes(risks)
-    sample_risks = _sample_risks(risks)
 
-    return {
-        "executive_summary": executive_summary,
-        "inherent_summary": inherent_summary,
-        "residual_summary": residual_summary,
-        "control_effectiveness": effectiveness_text,
-        "board_recommendation": recommendation,
-        "top_themes": themes,
-        "sample_risks": sample_risks,
-        "inherent_counts": inherent_counts,
-        "residual_counts": residual_counts,
-        "improvement_count": improvement_count,
-        "unchanged_count": unchanged_count,
-        "worsened_count": worsened_count,
+@login_required
+def profile_run_detail(request, run_id):
+    """Ranked hot functions of one trace: ?sort=tottime|cumtime, ?scope=app for this project's code only."""
+    denied = _superuser_only(request)
+    if denied:
+        return denied
+    run = get_object_or_404(ProfileRun.objects.select_related("user"), pk=run_id)
+    sort = "cumtime" if request.GET.get("sort") == "cumtime" else "tottime"
+    app_only = request.GET.get("scope") == "app"
+    context = {
+        "run": run,
+        "sort": sort,
+        "app_only": app_only,
+        "functions": hot_functions(load_stats(run), sort=sort, app_only=app_only),
     }
+    return render(request, "risks/profile_run.html", context)
 
 
 @login_required
-def board_explanation(request):
-    selected_area = request.GET.get("area", "").strip()
-    filter_type = request.GET.get("filter", "approved").strip()
-
-    risks = RiskAssessment.objects.all().order_by("area_name", "reference_id")
-
-    available_areas = list(
-        RiskAssessment.objects.exclude(area_name__isnull=True)
-        .exclude(area_name__exact="")
-        .values_list("area_name", flat=True)
-        .distinct()
-    )
-
-    if selected_area:
-        risks = risks.filter(area_name=selected_area)
-
-    if filter_type == "draft":
-        risks = risks.filter(description__startswith="[DRAFT]")
-    elif filter_type == "approved":
-        risks = risks.exclude(description__startswith="[DRAFT]")
-
-    risk_list = list(risks)
-    narrative = _build_board_narrative(selected_area, risk_list)
-
-    context = {
-        "selected_area": selected_area,
-        "filter_type": filter_type,
-        "available_areas": available_areas,
-        "risks": risk_list,
-        **narrative,
-    }
-    return render(request, "risks/board_explanation.html", context)
-# ========= BOARD_EXPLANATION_END =========
+def profile_run_download(request, run_id):
+    """The raw trace as a .prof file for pstats or snakeviz."""
+    denied = _superuser_only(request)
+    if denied:
+        return denied
+    run = get_object_or_404(ProfileRun, pk=run_id)
+    response = HttpResponse(zlib.decompress(bytes(run.stats)), content_type="application/octet-stream")
+    response["Content-Disposition"] = f'attachment; filename="profile-{run.pk}.prof"'
+    return response
+# ========= PROFILE_RUNS_END =========
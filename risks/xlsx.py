@@ -0,0 +1,324 @@
+"""
+Streaming XLSX writer.
+
+An .xlsx file is a zip of XML parts. XlsxStream writes each worksheet as
+one deflated zip entry, row by row, into a buffer that the caller drains
+after every call, so a response can send the workbook while it is being
+built. Nothing but the sheet titles is kept between rows: cells are
+written as inline strings (no shared-string table, and reference ids or
+long text are never reinterpreted by Excel), and the workbook, styles and
+content-type parts are written after the last sheet.
+
+Rating columns are coloured by conditional formatting rules, one per
+rating, using the dashboard's risk_color classes.
+"""
+import re
+import zipfile
+from xml.sax.saxutils import escape, quoteattr
+
+from .templatetags.risk_extras import risk_color
+
+
+MAX_CELL_CHARS = 32767
+MAX_SHEET_ROWS = 1048576
+WRITE_BATCH_ROWS = 500
+
+# risk_color class -> (fill, font) ARGB, the Bootstrap colours the pages use
+CLASS_COLOURS = {
+    "danger": ("FFDC3545", "FFFFFFFF"),
+    "warning": ("FFFFC107", "FF212529"),
+    "success": ("FF198754", "FFFFFFFF"),
+    "secondary": ("FF6C757D", "FFFFFFFF"),
+}
+RATINGS = ["Critical", "Severe", "Moderate", "Sustainable"]
+
+_ILLEGAL_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+_SHEET_TITLE_BAD = re.compile(r"[\[\]:*?/\\]")
+
+
+def column_letter(index):
+    """0 -> A, 25 -> Z, 26 -> AA."""
+    letters = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def sheet_title(name, used):
+    """A valid, unique (case-insensitively) worksheet name for `name`."""
+    base = " ".join(_SHEET_TITLE_BAD.sub(" ", name or "").split()).strip("'") or "Unspecified"
+    base = base[:31]
+    title, bump = base, 1
+    while title.lower() in used:
+        suffix = f" ({bump})"
+        title = base[:31 - len(suffix)] + suffix
+        bump += 1
+    used.add(title.lower())
+    return title
+
+
+def _cell(value, style=""):
+    if value is None:
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c{style} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f"<c{style}><v>{value}</v></c>"
+    text = _ILLEGAL_XML.sub("", str(value))[:MAX_CELL_CHARS]
+    return f'<c{style} t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+
+class _Sink:
+    """Write-only file for ZipFile; take() hands back what was written since the last call."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+class XlsxStream:
+    """
+    One workbook, written sheet by sheet:
+
+        stream = XlsxStream(header, rating_columns=[8, 11])
+        yield stream.open_sheet("Area")
+        for rows in batches: yield stream.write_rows(rows)
+        yield stream.close()
+
+    Every call returns the zip bytes produced so far (possibly b"").
+    """
+
+    def __init__(self, header, rating_columns=(), widths=None):
+        self.header = list(header)
+        self.rating_columns = list(rating_columns)
+        self.widths = widths or {}
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, "w", compression=zipfile.ZIP_DEFLATED)
+        self._titles = []
+        self._used = set()
+        self._entry = None
+        self._row = 0
+
+    # ---- sheets ----
+    def open_sheet(self, name):
+        self._close_sheet()
+        self._titles.append(sheet_title(name, self._used))
+        path = f"xl/worksheets/sheet{len(self._titles)}.xml"
+        self._entry = self._zip.open(path, "w", force_zip64=True)
+        cols = "".join(
+            f'<col min="{i + 1}" max="{i + 1}" width="{self.widths.get(i, 18)}" customWidth="1"/>'
+            for i in range(len(self.header))
+        )
+        self._entry.write((
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            '<sheetViews><sheetView workbookViewId="0">'
+            '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+            '</sheetView></sheetViews>'
+            f"<cols>{cols}</cols><sheetData>"
+            '<row r="1">' + "".join(_cell(h, ' s="1"') for h in self.header) + "</row>"
+        ).encode("utf-8"))
+        self._row = 1
+        return self._sink.take()
+
+    @property
+    def rows_left(self):
+        """Data rows the open sheet can still take."""
+        return MAX_SHEET_ROWS - self._row
+
+    def write_rows(self, rows):
+        if self._entry is None:
+            raise ValueError("open_sheet() before write_rows()")
+        if len(rows) > self.rows_left:
+            raise ValueError(f"Sheet {self._titles[-1]!r} is full")
+        lines = []
+        for values in rows:
+            self._row += 1
+            lines.append(f'<row r="{self._row}">' + "".join(_cell(v) for v in values) + "</row>")
+        self._entry.write("".join(lines).encode("utf-8"))
+        return self._sink.take()
+
+    def _conditional_formatting(self):
+        if not self.rating_columns or self._row < 2:
+            return ""
+        sqref = " ".join(
+            f"{column_letter(c)}2:{column_letter(c)}{self._row}" for c in self.rating_columns
+        )
+        rules = "".join(
+            f'<cfRule type="cellIs" dxfId="{dxf}" priority="{dxf + 1}" operator="equal">'
+            f'<formula>"{escape(rating)}"</formula></cfRule>'
+            for dxf, rating in enumerate(RATINGS)
+        )
+        return f'<conditionalFormatting sqref="{sqref}">{rules}</conditionalFormatting>'
+
+    def _close_sheet(self):
+        if self._entry is None:
+            return
+        last = column_letter(len(self.header) - 1)
+        self._entry.write((
+            "</sheetData>"
+            f'<autoFilter ref="A1:{last}{self._row}"/>'
+            + self._conditional_formatting()
+            + "</worksheet>"
+        ).encode("utf-8"))
+        self._entry.close()
+        self._entry = None
+
+    # ---- workbook parts ----
+    def close(self):
+        """Finish the last sheet and write the workbook parts and zip directory."""
+        head = b"" if self._titles else self.open_sheet("Register")
+        self._close_sheet()
+        for path, xml in self._package_parts():
+            self._zip.writestr(path, xml)
+        self._zip.close()
+        return head + self._sink.take()
+
+    def _package_parts(self):
+        sheets = range(1, len(self._titles) + 1)
+        yield "[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            + "".join(
+                f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                for n in sheets
+            )
+            + "</Types>"
+        )
+        yield "_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="xl/workbook.xml"/>'
+            "</Relationships>"
+        )
+        yield "xl/workbook.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+            + "".join(
+                f'<sheet name={quoteattr(title)} sheetId="{n}" r:id="rId{n}"/>'
+                for n, title in zip(sheets, self._titles)
+            )
+            + "</sheets></workbook>"
+        )
+        yield "xl/_rels/workbook.xml.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + "".join(
+                f'<Relationship Id="rId{n}" '
+                'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                f'Target="worksheets/sheet{n}.xml"/>'
+                for n in sheets
+            )
+            + f'<Relationship Id="rId{len(self._titles) + 1}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+            'Target="styles.xml"/>'
+            "</Relationships>"
+        )
+        yield "xl/styles.xml", self._styles()
+
+    def _styles(self):
+        dxfs = "".join(
+            f'<dxf><font><color rgb="{CLASS_COLOURS[risk_color(rating)][1]}"/></font>'
+            f'<fill><patternFill patternType="solid"><bgColor rgb="{CLASS_COLOURS[risk_color(rating)][0]}"/>'
+            "</patternFill></fill></dxf>"
+            for rating in RATINGS
+        )
+        return (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+            '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+            '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+            '<fill><patternFill patternType="gray125"/></fill></fills>'
+            '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+            '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+            '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+            '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+            '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+            f'<dxfs count="{len(RATINGS)}">{dxfs}</dxfs>'
+            "</styleSheet>"
+        )
+
+
+class _SheetSplitter:
+    """Groups area-ordered rows into sheets: a new sheet per area, or when one fills up."""
+
+    _NO_AREA = object()
+
+    def __init__(self, stream, area_column, batch_rows):
+        self.stream = stream
+        self.area_column = area_column
+        self.batch_rows = batch_rows
+        self.area = self._NO_AREA
+        self.batch = []
+
+    def add(self, row):
+        """Bytes ready after adding `row` (usually b"")."""
+        out = b""
+        area = row[self.area_column]
+        if area != self.area or len(self.batch) >= self.stream.rows_left:
+            out += self.flush()
+            self.area = area
+            out += self.stream.open_sheet(area)
+        self.batch.append(row)
+        if len(self.batch) >= self.batch_rows:
+            out += self.flush()
+        return out
+
+    def flush(self):
+        batch, self.batch = self.batch, []
+        return self.stream.write_rows(batch) if batch else b""
+
+    def close(self):
+        return self.flush() + self.stream.close()
+
+
+def register_sheets(rows, stream, area_column=1, batch_rows=WRITE_BATCH_ROWS):
+    """
+    Bytes of a workbook with one sheet per area, from `rows` (value tuples)
+    ordered by area. Yields as the zip fills up.
+    """
+    splitter = _SheetSplitter(stream, area_column, batch_rows)
+    for row in rows:
+        chunk = splitter.add(row)
+        if chunk:
+            yield chunk
+    yield splitter.close()
+
+
+async def aregister_sheets(rows, stream, area_column=1, batch_rows=WRITE_BATCH_ROWS):
+    """register_sheets for an async iterator of rows."""
+    splitter = _SheetSplitter(stream, area_column, batch_rows)
+    async for row in rows:
+        chunk = splitter.add(row)
+        if chunk:
+            yield chunk
+    yield splitter.close()